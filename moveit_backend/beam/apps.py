@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BeamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'beam'
+
+    def ready(self):
+        import beam.signals
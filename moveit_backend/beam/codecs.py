@@ -0,0 +1,170 @@
+import base64
+import datetime
+import json
+import zlib
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON = 'moveit.json'
+MSGPACK = 'moveit.msgpack'
+
+# First byte of every msgpack frame: how the rest of it is compressed.
+RAW = 0
+DEFLATE = 1
+ZSTD = 2
+
+
+class FrameError(ValueError):
+    pass
+
+
+def json_default(value):
+    """
+    JSON for what msgpack clients can send but JSON cannot hold: bytes
+    become base64 text and timestamps ISO 8601 strings.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def as_json(value):
+    # `value` as JSON clients receive it, e.g. for storing in the database.
+    return json.loads(json.dumps(value, default=json_default))
+
+
+def reject_ext(code, data):
+    raise FrameError(f"Unsupported msgpack extension type {code}.")
+
+
+class JsonCodec:
+    """
+    Text frames. Uses orjson when it is installed, which encodes several
+    times faster than the json module.
+
+    Messages relayed from msgpack clients may hold bytes; JSON clients
+    get them as base64 (see json_default).
+    """
+    name = JSON
+    binary = False
+
+    def encode(self, message):
+        if orjson is not None:
+            return orjson.dumps(message, default=json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(message, default=json_default)
+
+    def decode(self, data):
+        if not isinstance(data, str):
+            raise FrameError("Expected a text frame.")
+        try:
+            if orjson is not None:
+                return orjson.loads(data)
+            return json.loads(data)
+        except ValueError as e:
+            raise FrameError(str(e))
+
+
+class MsgpackCodec:
+    """
+    Binary frames: a one-byte compression flag (RAW, DEFLATE or ZSTD)
+    followed by the msgpack-encoded message.
+
+    Frames of at least `compress_threshold` bytes are compressed with
+    `compression` ('deflate', or 'zstd' when zstandard is installed);
+    clients may send frames with any flag. Decompressed frames larger
+    than `max_frame_size` are rejected, as are extension types other
+    than timestamps, which decode to datetimes.
+    """
+    name = MSGPACK
+    binary = True
+
+    def __init__(self, compression='deflate', compress_threshold=1024, max_frame_size=16 * 1024 * 1024):
+        if compression == 'zstd' and zstandard is None:
+            compression = 'deflate'
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.max_frame_size = max_frame_size
+
+    def compress(self, body):
+        if self.compression is None or len(body) < self.compress_threshold:
+            return bytes([RAW]) + body
+        if self.compression == 'zstd':
+            return bytes([ZSTD]) + zstandard.ZstdCompressor().compress(body)
+        return bytes([DEFLATE]) + zlib.compress(body)
+
+    def decompress(self, data):
+        flag, body = data[0], data[1:]
+        if flag == RAW:
+            return body
+        if flag == DEFLATE:
+            decompressor = zlib.decompressobj()
+            body = decompressor.decompress(body, self.max_frame_size)
+            if decompressor.unconsumed_tail:
+                raise FrameError("Frame too large.")
+            return body
+        if flag == ZSTD and zstandard is not None:
+            try:
+                return zstandard.ZstdDecompressor().decompress(body, max_output_size=self.max_frame_size)
+            except zstandard.ZstdError as e:
+                raise FrameError(str(e))
+        raise FrameError(f"Unsupported frame flag {flag}.")
+
+    def encode(self, message):
+        return self.compress(msgpack.packb(message, use_bin_type=True))
+
+    def decode(self, data):
+        if not isinstance(data, bytes) or not data:
+            raise FrameError("Expected a binary frame.")
+        try:
+            return msgpack.unpackb(self.decompress(data), raw=False, timestamp=3, ext_hook=reject_ext)
+        except (zlib.error, ValueError, msgpack.UnpackException) as e:
+            raise FrameError(str(e))
+
+
+_codecs = None
+
+
+def get_codecs():
+    global _codecs
+    if _codecs is None:
+        _codecs = {JSON: JsonCodec()}
+        if msgpack is not None:
+            _codecs[MSGPACK] = MsgpackCodec(**getattr(settings, "BEAM_MSGPACK_FRAMES", {}))
+    return _codecs
+
+
+def negotiate_codec(subprotocols):
+    """
+    The codec for the first WebSocket subprotocol the client offered that
+    the server supports, and the subprotocol to accept (None when the
+    client offered none). Clients that offer nothing get JSON.
+    """
+    codecs = get_codecs()
+    for subprotocol in subprotocols or []:
+        if subprotocol in codecs:
+            return codecs[subprotocol], subprotocol
+    return codecs[JSON], None
+
+
+def encode_frames(message):
+    """
+    `message` encoded once for every codec, for group events whose
+    recipients forward the frame for their own codec as-is.
+    """
+    return {name: codec.encode(message) for name, codec in get_codecs().items()}
@@ -1,77 +1,439 @@
-import json
+import asyncio
+import base64
 import random
+import re
 import string
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+import time
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .codecs import FrameError, as_json, encode_frames, negotiate_codec
 from .models import Beam
+from .permissions import get_role_resolver
+from .presence import get_presence_backend
+from .ratelimit import connection_rate_limits, get_beam_rate_limits
+from .replay import get_replay_backend
+from .signals import get_beam_group_name
+from .tokens import BeamTokenError, token_role, verify_beam_token
+from .transfers import TransferError, get_transfer_store
+from .writer import get_clipboard_writer
+from .metrics import metrics
 from note.models import Note
 
+# Note types a chunked transfer can be saved as.
+TRANSFER_NOTE_TYPES = ("text", "image", "audio", "video")
+
+# Broadcast types a lagging socket may skip (see beam_frame). Presence is
+# coalesced into one snapshot; clipboards are always delivered.
+PRESENCE_TYPES = ("presence_join", "presence_leave")
+UNDROPPABLE_TYPES = ("rec_clipboard",)
+
+# Types only the server sends. Other unknown types are relayed to the beam
+# as they are, but these would let a member forge presence, clipboards or
+# beam state on everyone else's screen.
+SERVER_TYPES = frozenset((
+    "auth_failed", "auth_success", "authed_users", "beam_deleted",
+    "clipboard_replay", "invalid_frame", "permission_denied",
+    "presence_join", "presence_leave", "rate_limited", "rec_clipboard",
+    "transfer_ack", "transfer_error", "transfer_ready", "unsubscribed",
+))
+
+# Beam ids accepted by BeamMultiplexConsumer, as in beam/routing.py.
+BEAM_ID = re.compile(r'^[\w\-]{1,255}$')
+
 NICKNAMES = [
     "PixelPenguin", "CodeCactus", "QuantumKoala", "BitBunny", "HexHawk",
     "NeonNarwhal", "LogicLynx", "DebugDuck", "SyncSquirrel", "ByteBear"
 ]
 
-AUTHED_USERS = {}
+class BeamConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        # Clients pick the wire format with a WebSocket subprotocol; see
+        # beam.codecs.
+        self.codec, subprotocol = negotiate_codec(self.scope.get("subprotocols"))
+        self.open_beam(self.scope["url_route"]["kwargs"]["beam_id"])
 
-class BeamConsumer(WebsocketConsumer):
-    def connect(self):
-        self.beam_id = self.scope["url_route"]["kwargs"]["beam_id"]
-        self.beam_group_name = f"beam_channel_{self.beam_id}"
+        await self.accept(subprotocol)
+
+    def open_beam(self, beam_id):
+        self.beam_id = beam_id
+        self.beam_group_name = get_beam_group_name(self.beam_id)
+        self.beam_pk = None
+        self.role = None
+        # Claims of the beam token the socket joined with, if any; see
+        # resolve_token().
+        self.token = None
         self.client_id = None
         self.nickname = None
+        self.presence = get_presence_backend()
+        self.writer = get_clipboard_writer()
+        self.transfers = get_transfer_store()
+        # Transfers this socket started and has not finished.
+        self.transfer_ids = set()
+        self.replay = get_replay_backend()
+        self.user_info = None
+        self.heartbeat_task = None
+        self.rate_limits = connection_rate_limits()
+        self.beam_rate_limits = get_beam_rate_limits()
+        self.max_lag = getattr(settings, "BEAM_BACKPRESSURE", {}).get("max_lag", 2.0)
+        self.presence_stale = False
+
+    async def dispatch(self, message):
+        try:
+            await super().dispatch(message)
+        except StopConsumer:
+            raise
+        except Exception:
+            # The consumer dies with the exception and never sees
+            # websocket.disconnect, so leave here; otherwise its heartbeat
+            # would keep a ghost member in the beam.
+            await self.leave_beam()
+            raise
+
+    async def disconnect(self, close_code):
+        await self.leave_beam()
 
-        self.accept()
+    async def leave_beam(self):
+        # Safe to call more than once.
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
 
-    def disconnect(self, close_code):
-        if self.client_id and self.beam_id in AUTHED_USERS:
-            AUTHED_USERS[self.beam_id] = [
-                user for user in AUTHED_USERS[self.beam_id]
-                if user["client_id"] != self.client_id
-            ]
-            if not AUTHED_USERS[self.beam_id]:
-                del AUTHED_USERS[self.beam_id]
+        client_id, self.client_id = self.client_id, None
+        if client_id:
+            version = await self.presence.leave(self.beam_id, client_id)
+            if version is not None:
+                await self.broadcast({
+                    "type": "presence_leave",
+                    "client_id": client_id,
+                    "version": version
+                })
 
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_discard(
             self.beam_group_name,
-            {
-                "type": "auth.users",
-                "users": AUTHED_USERS.get(self.beam_id, [])
-            }
+            self.channel_name
         )
 
-        async_to_sync(self.channel_layer.group_discard)(
+    async def send_message(self, message):
+        # Every frame names its beam, for sockets multiplexing several.
+        await self.send_frame(self.codec.encode({**message, "beam": self.beam_id}))
+
+    async def broadcast(self, message, skip=None):
+        """
+        Send `message` to every socket in the beam, except the one whose
+        client_id is `skip`.
+
+        The message is encoded here, once per codec; recipients only
+        forward the frame for their own codec (see beam_frame).
+        """
+        await self.channel_layer.group_send(
             self.beam_group_name,
-            self.channel_name
+            {
+                "type": "beam.frame",
+                "beam": self.beam_id,
+                "frames": encode_frames({**message, "beam": self.beam_id}),
+                "skip": skip,
+                "kind": message["type"],
+                "sent_at": time.time()
+            }
         )
 
+    async def broadcast_clipboard(self, outbound):
+        await self.broadcast(outbound)
+        # Kept for sockets that join later; see send_replay.
+        await self.replay.append(self.beam_id, outbound)
+
+    async def send_replay(self):
+        # One frame with the beam's recent clipboards, so joining costs a
+        # cache read rather than a beam_notes query.
+        await self.send_message({
+            "type": "clipboard_replay",
+            "message": await self.replay.recent(self.beam_id)
+        })
+
+    async def send_frame(self, frame):
+        if self.codec.binary:
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def keep_presence_alive(self):
+        interval = max(self.presence.ttl / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            await self.presence.heartbeat(self.beam_id, self.client_id)
+            if self.presence_stale:
+                await self.send_presence_snapshot()
+            # Members whose worker died without a disconnect expire here;
+            # whichever live socket notices first announces them.
+            for client_id, version in await self.presence.prune(self.beam_id):
+                await self.broadcast({
+                    "type": "presence_leave",
+                    "client_id": client_id,
+                    "version": version
+                })
+
+    async def send_presence_snapshot(self):
+        self.presence_stale = False
+        members, version = await self.presence.snapshot(self.beam_id)
+        await self.send_message({
+            "type": "authed_users",
+            "users": members,
+            "version": version
+        })
+
     @database_sync_to_async
-    def auth_connection(self, beam_key=None):
-        return Beam.objects.filter(beam_id=self.beam_id).exists()
-    
+    def load_beam(self):
+        # Signed-in users joining without a token: their own role, resolved
+        # once per connection and refreshed when beam.signals reports that
+        # the beam or its shares changed.
+        beam_pk = Beam.objects.filter(beam_id=self.beam_id).values_list('pk', flat=True).first()
+        if beam_pk is None:
+            return False
+
+        self.beam_pk = beam_pk
+        self.role = get_role_resolver().role(self.scope['user'].id, self.beam_pk)
+        return self.role is not None
+
     @database_sync_to_async
-    def save_clipboard(self, content, content_type, user):
+    def resolve_token(self):
+        # A token grants at most the current role of the user it was
+        # issued to: nothing once their access is revoked, read once they
+        # are down to read. Refreshed like load_beam()'s roles.
+        role = get_role_resolver().role(self.token["issued_to"], self.beam_pk)
+        if role is None:
+            self.role = None
+        elif 'read' in (token_role(role), self.token["role"]):
+            self.role = 'read'
+        else:
+            self.role = 'write'
+        return self.role is not None
+
+    def can_post(self):
+        return self.client_id is not None and self.role != 'read'
+
+    async def deny(self, res_type):
+        await self.send_message({
+            "type": "permission_denied",
+            "message": res_type
+        })
+
+    async def reject_frame(self, detail):
+        await self.send_message({
+            "type": "invalid_frame",
+            "message": detail
+        })
+
+    def allow(self, res_type):
+        """
+        Take a token for `res_type` from this socket's buckets and, once
+        it has joined, from its beam's (see beam.ratelimit).
+        """
+        if not self.rate_limits.allow(res_type):
+            metrics.incr("beam.rate_limited.connection")
+            return False
+        if self.client_id and not self.beam_rate_limits.allow(self.beam_id, res_type):
+            metrics.incr("beam.rate_limited.beam")
+            return False
+        return True
+
+    async def auth_connection(self, beam_token=None):
+        """
+        Joining takes a beam token (see beam.tokens), checked against the
+        cached role of the user it was issued to. Signed-in owners and
+        share recipients may join by beam id alone; anyone else is turned
+        away.
+        """
         try:
-            beam = Beam.objects.get(beam_id=self.beam_id)
-            if content_type != 'lexi_note':
-                note = Note.objects.create(
-                    user=user,
-                    beam=beam,
-                    content=content,
-                    note_type=content_type
-                )
-            else:
-                note = Note.objects.create(
-                    user=user,
-                    beam=beam,
-                    title=content['title'],
-                    json_content=content['content'],
-                    note_type='lexi_note'
-                )
+            claims = verify_beam_token(beam_token, self.beam_id)
+        except BeamTokenError:
+            if not self.scope['user'].is_authenticated:
+                return False
+            return await self.load_beam()
+
+        self.beam_pk = claims["beam_pk"]
+        self.token = claims
+        if claims["issued_to"] is None:
+            self.role = claims["role"]
+            return True
+        return await self.resolve_token()
+
+    async def save_clipboard(self, content, content_type, user):
+        # Bytes from msgpack clients are stored as the base64 JSON clients
+        # were sent.
+        content = as_json(content)
+        if content_type != 'lexi_note':
+            note = Note(
+                user=user,
+                content=content,
+                note_type=content_type
+            )
+        else:
+            note = Note(
+                user=user,
+                title=content['title'],
+                json_content=content['content'],
+                note_type='lexi_note'
+            )
+
+        note.beam_id = self.beam_pk
+        await self.writer.add(note)
+
+    async def get_sender_info(self):
+        user = self.scope['user']
+        # Include user information for authenticated users
+        if user.is_authenticated and self.user_info is None:
+            self.user_info = await self.get_user_info(user)
+        return self.user_info
+
+    async def run_transfer(self, method, *args):
+        # File I/O runs off the event loop and off the database thread, so
+        # chunks never hold up other sockets' traffic.
+        return await sync_to_async(method, thread_sensitive=False)(self.beam_pk, *args)
+
+    async def transfer_error(self, transfer_id, error):
+        await self.send_message({
+            "type": "transfer_error",
+            "message": {
+                "transfer_id": transfer_id,
+                "detail": str(error)
+            }
+        })
 
-            return note
-        except Beam.DoesNotExist:
-            return None
+    async def start_transfer(self, message, extra):
+        """
+        transfer_start: {"transfer_id", "size", "name"}, extra is the note
+        type. Answers transfer_ready with the byte offset to continue from,
+        so sending transfer_start again after a reconnect resumes.
+        """
+        if not isinstance(message, dict):
+            message = {}
+        transfer_id = message.get("transfer_id")
+        user = self.scope['user']
+        try:
+            if transfer_id not in self.transfer_ids and len(self.transfer_ids) >= self.transfers.max_open_per_socket:
+                # Some may have been finished elsewhere or expired.
+                self.transfer_ids = await self.run_transfer(self.transfers.still_open, self.transfer_ids)
+                if len(self.transfer_ids) >= self.transfers.max_open_per_socket:
+                    raise TransferError(f"At most {self.transfers.max_open_per_socket} transfers at a time.")
+            info = await self.run_transfer(
+                self.transfers.start,
+                transfer_id,
+                message.get("size"),
+                message.get("name"),
+                extra if extra in TRANSFER_NOTE_TYPES else "text",
+                user.id if user.is_authenticated else None
+            )
+        except TransferError as e:
+            await self.transfer_error(transfer_id, e)
+            return
+
+        self.transfer_ids.add(transfer_id)
+        await self.send_message({
+            "type": "transfer_ready",
+            "message": {
+                "transfer_id": transfer_id,
+                "received": info["received"],
+                "chunk_size": self.transfers.chunk_size,
+                "window": self.transfers.window
+            }
+        })
+
+    async def receive_chunk(self, message):
+        """
+        transfer_chunk: {"transfer_id", "offset", "data"}, data being bytes
+        (msgpack) or base64 (JSON). Every chunk is acknowledged with the
+        bytes received so far; clients keep at most `window` chunks
+        unacknowledged.
+        """
+        if not isinstance(message, dict):
+            message = {}
+        transfer_id = message.get("transfer_id")
+        offset = message.get("offset")
+        data = message.get("data")
+        try:
+            if isinstance(data, str):
+                data = base64.b64decode(data, validate=True)
+            if not isinstance(data, bytes) or not isinstance(offset, int):
+                raise TransferError("A chunk needs an integer offset and data.")
+            if len(data) > self.transfers.chunk_size:
+                raise TransferError(f"Chunks are limited to {self.transfers.chunk_size} bytes.")
+            info = await self.run_transfer(self.transfers.write, transfer_id, offset, data)
+            await self.send_message({
+                "type": "transfer_ack",
+                "message": {
+                    "transfer_id": transfer_id,
+                    "received": info["received"]
+                }
+            })
+            if info["received"] == info["size"]:
+                await self.complete_transfer(transfer_id)
+        except (TransferError, ValueError) as e:
+            await self.transfer_error(transfer_id, e)
+
+    async def complete_transfer(self, transfer_id):
+        info = await self.run_transfer(self.transfers.finish, transfer_id)
+        self.transfer_ids.discard(transfer_id)
+        url = self.absolute_url(default_storage.url(info["file"]))
+        metrics.incr("beam.transfers.completed")
+        metrics.incr("beam.transfers.bytes", info["size"])
+
+        outbound = {
+            "type": "rec_clipboard",
+            "message": url,
+            "extra": info["content_type"],
+            "transfer": {
+                "name": info["name"],
+                "size": info["size"]
+            }
+        }
+        user_info = await self.get_sender_info()
+        if user_info:
+            outbound["user"] = user_info
+        await self.broadcast_clipboard(outbound)
+
+        user = self.scope['user']
+        if user.is_authenticated:
+            note = Note(
+                user=user,
+                title=info["name"],
+                attachment=info["file"],
+                note_type=info["content_type"]
+            )
+            note.beam_id = self.beam_pk
+            await self.writer.add(note)
+
+    def absolute_url(self, url):
+        if "://" in url:
+            return url
+        headers = dict(self.scope.get("headers", []))
+        host = headers.get(b"host", b"").decode("latin1")
+        if not host:
+            return url
+        scheme = "https" if self.scope.get("scheme") in ("wss", "https") else "http"
+        return f"{scheme}://{host}{url}"
+
+    @database_sync_to_async
+    def get_user_info(self, user):
+        user_info = {
+            "id": user.id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "email": user.email
+        }
+
+        # Add profile picture if available
+        try:
+            if hasattr(user, 'profile') and user.profile.profile_picture:
+                user_info["profile_picture"] = user.profile.profile_picture.url
+        except:
+            pass
+
+        return user_info
 
     def assign_client_id(self):
         return ''.join(random.choices(string.ascii_letters + string.digits, k=8))
@@ -79,165 +441,313 @@ class BeamConsumer(WebsocketConsumer):
     def assign_random_nickname(self):
         return random.choice(NICKNAMES)
 
-    def receive(self, text_data):
-        res = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            res = self.codec.decode(bytes_data if self.codec.binary else text_data)
+        except FrameError:
+            await self.close(code=1007)
+            return
+        await self.handle_message(res)
+
+    async def handle_message(self, res):
+        if not isinstance(res, dict) or not isinstance(res.get("type"), str) or "message" not in res:
+            await self.reject_frame("Frames are objects with a string \"type\" and a \"message\".")
+            return
         res_type = res["type"]
         message  = res["message"]
         extra    = res.get("extra")
 
+        if res_type in SERVER_TYPES:
+            await self.reject_frame(f"\"{res_type}\" frames are sent by the server only.")
+            return
+
+        if not self.allow(res_type):
+            await self.send_message({
+                "type": "rate_limited",
+                "message": res_type
+            })
+            return
+
         if res_type == 'auth':
-            authed = async_to_sync(self.auth_connection)(message)
+            if self.client_id:
+                return
+
+            authed = await self.auth_connection(message)
             if authed:
                 self.client_id = self.assign_client_id()
                 self.nickname = self.assign_random_nickname()
-
-                if self.beam_id not in AUTHED_USERS:
-                    AUTHED_USERS[self.beam_id] = []
-
-                AUTHED_USERS[self.beam_id].append({
+                member = {
                     "client_id": self.client_id,
                     "nickname": self.nickname
-                })
+                }
+
+                version = await self.presence.join(self.beam_id, self.client_id, member)
+                self.heartbeat_task = asyncio.create_task(self.keep_presence_alive())
 
-                async_to_sync(self.channel_layer.group_add)(
+                await self.channel_layer.group_add(
                     self.beam_group_name,
                     self.channel_name
                 )
 
-                self.send(text_data=json.dumps({
+                await self.send_message({
                     "type": "auth_success",
-                    "message": {
-                        "client_id": self.client_id,
-                        "nickname": self.nickname
-                    }
-                }))
+                    "message": member
+                })
 
-                async_to_sync(self.channel_layer.group_send)(
-                    self.beam_group_name,
-                    {
-                        "type": "auth.users",
-                        "users": AUTHED_USERS[self.beam_id]
-                    }
-                )
+                # The new member gets the full list once; everyone else only
+                # hears about the member that joined.
+                await self.send_presence_snapshot()
+                await self.send_replay()
+
+                await self.broadcast({
+                    "type": "presence_join",
+                    "member": member,
+                    "version": version
+                }, skip=self.client_id)
             else:
-                self.send(text_data=json.dumps({
+                await self.send_message({
                     "type": "auth_failed",
                     "message": "Beaming failed!"
-                }))
-                self.close()
+                })
+                await self.close()
 
+        elif res_type == 'presence_sync':
+            # Sent by clients that saw a gap in presence versions.
+            if self.client_id:
+                await self.send_presence_snapshot()
+        elif res_type == 'save_beam':
+            # Only the sender claims the beam; broadcasting this made every
+            # member's socket rewrite the owner with its own user.
+            if self.scope['user'].is_authenticated and self.client_id:
+                if not await self.connect_user_with_beam_db(message):
+                    await self.deny(res_type)
+        elif not self.can_post():
+            await self.deny(res_type)
         elif res_type == 'message':
-            async_to_sync(self.channel_layer.group_send)(
-                self.beam_group_name,
-                {
-                    "type": "beam.message",
-                    "message": message
-                }
-            )
+            await self.broadcast({
+                "type": "message",
+                "message": message
+            })
+        elif res_type == 'transfer_start':
+            await self.start_transfer(message, extra)
+        elif res_type == 'transfer_chunk':
+            await self.receive_chunk(message)
         elif res_type == 'share_clipboard':
-            user_info = None
-            if self.scope['user'].is_authenticated:
-                note = async_to_sync(self.save_clipboard)(message, extra, self.scope['user'])
-                if note:
-                    print(f"Saved clipboard as note: {note.id}")
-                    # Include user information for authenticated users
-                    user_info = {
-                        "id": self.scope['user'].id,
-                        "username": self.scope['user'].username,
-                        "first_name": self.scope['user'].first_name,
-                        "last_name": self.scope['user'].last_name,
-                        "email": self.scope['user'].email
-                    }
-                    
-                    # Add profile picture if available
-                    try:
-                        if hasattr(self.scope['user'], 'profile') and self.scope['user'].profile.profile_picture:
-                            user_info["profile_picture"] = self.scope['user'].profile.profile_picture.url
-                    except:
-                        pass
-                else:
-                    print("Failed to save clipboard as note")
-            
-            async_to_sync(self.channel_layer.group_send)(
-                self.beam_group_name,
-                {
-                    "type": "share_clipboard",
-                    "message": message,
-                    "extra": extra,
-                    "is_original_sender": False,
-                    "user_info": user_info
-                }
-            )
+            if extra == 'lexi_note' and not (isinstance(message, dict) and {'title', 'content'} <= message.keys()):
+                await self.reject_frame("A lexi_note needs a title and content.")
+                return
+            user = self.scope['user']
+            outbound = {
+                "type": "rec_clipboard",
+                "message": message,
+                "extra": extra
+            }
+            user_info = await self.get_sender_info()
+            if user_info:
+                outbound["user"] = user_info
+
+            # Fan out first; the note is persisted by the write-behind queue.
+            await self.broadcast_clipboard(outbound)
+
+            if user.is_authenticated:
+                await self.save_clipboard(message, extra, user)
+        elif res_type == 'delete_note':
+            await self.replay.discard(self.beam_id, message)
+            await self.broadcast({
+                "type": res_type,
+                "message": message,
+                "extra": extra
+            })
         else:
-            async_to_sync(self.channel_layer.group_send)(
-                self.beam_group_name,
-                {
-                    "type": res_type,
-                    "message": message,
-                    "extra": extra,
-                }
-            )
+            await self.broadcast({
+                "type": res_type,
+                "message": message,
+                "extra": extra
+            })
 
     @database_sync_to_async
     def connect_user_with_beam_db(self, beam_name):
-        beam = Beam.objects.get(beam_id=self.beam_id)
-        beam.user = self.scope['user']
+        # Unclaimed beams go to whoever saves them; claimed ones can only be
+        # renamed by their owner.
+        user = self.scope['user']
+        beam = Beam.objects.filter(pk=self.beam_pk).first()
+        if beam is None or beam.user_id not in (None, user.id):
+            return False
+        beam.user = user
         beam.beam_name = beam_name
-        print(beam.user)
-        beam.save()
-    
-    def save_beam(self, event):
-        print("Connecting user to beam ....")
-        async_to_sync(self.connect_user_with_beam_db)(event['message'])
-
-    def beam_message(self, event):
-        self.send(text_data=json.dumps({
-            "type": "message",
-            "message": event["message"]
-        }))
-
-    def share_clipboard(self, event):
-        print(self.scope['user'])
-        content = event.get("message")
-        content_type = event.get("extra", "text")
-        is_original_sender = event.get("is_original_sender", False)
-        user_info = event.get("user_info", None)
-        
-        if is_original_sender and self.scope['user'].is_authenticated:
-            note = async_to_sync(self.save_clipboard)(content, content_type, self.scope['user'])
-            if note:
-                print(f"Saved clipboard as note: {note.id}")
+        beam.save(update_fields=['user', 'beam_name'])
+        return True
+
+    async def beam_changed(self, event):
+        if event["deleted"]:
+            await self.send_message({
+                "type": "beam_deleted",
+                "message": self.beam_id
+            })
+            await self.close()
+        else:
+            # Another process changed the beam or its shares; its role
+            # entries in this process's cache are stale too.
+            get_role_resolver().forget_local(self.beam_pk)
+            if self.token is None:
+                allowed = await self.load_beam()
+            elif self.token["issued_to"] is not None:
+                allowed = await self.resolve_token()
             else:
-                print("Failed to save clipboard as note")
-        
-        response_data = {
-            "type": "rec_clipboard",
-            "message": content,
-            "extra": content_type
-        }
-        
-        # Include user information if available (note is by authenticated user)
-        if user_info:
-            response_data["user"] = user_info
-        
-        self.send(text_data=json.dumps(response_data))
+                allowed = True
+            if not allowed:
+                # The user's own access, or the token issuer's, was revoked.
+                await self.deny("auth")
+                await self.close()
 
-    def auth_users(self, event):
-        self.send(text_data=json.dumps({
-            "type": "authed_users",
-            "users": event["users"]
-        }))
-
-    def __getattr__(self, name):
-        if name.startswith("_") or name in self.__dict__:
-            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
-        
-        def handler(event):
-            print("Unlisted:")
-            print(event)
-            self.send(text_data=json.dumps({
-                "type": name,
-                "message": event.get("message"),
-                "extra": event.get("extra", None)
-            }))
-        return handler
\ No newline at end of file
+    async def beam_frame(self, event):
+        if event["skip"] is not None and event["skip"] == self.client_id:
+            return
+        # Events wait in this socket's channel-layer queue (bounded by the
+        # layer's capacity) while it is busy. Once it falls more than
+        # max_lag seconds behind, transient frames are dropped and presence
+        # changes are folded into a single snapshot so it can catch up.
+        kind = event["kind"]
+        if kind not in UNDROPPABLE_TYPES and time.time() - event["sent_at"] > self.max_lag:
+            if kind in PRESENCE_TYPES:
+                self.presence_stale = True
+                metrics.incr("beam.frames.coalesced")
+            else:
+                metrics.incr("beam.frames.dropped")
+            return
+        if self.presence_stale:
+            await self.send_presence_snapshot()
+        await self.send_frame(event["frames"][self.codec.name])
+
+
+class BeamSubscription(BeamConsumer):
+    """
+    One beam of a BeamMultiplexConsumer connection: a BeamConsumer that
+    writes to the connection's socket and receives through its channel.
+    Closing it only unsubscribes.
+    """
+
+    def __init__(self, connection, beam_id):
+        super().__init__()
+        self.connection = connection
+        self.scope = connection.scope
+        self.channel_layer = connection.channel_layer
+        self.channel_name = connection.channel_name
+        self.codec = connection.codec
+        self.open_beam(beam_id)
+        # Rate limits are per socket, not per subscription.
+        self.rate_limits = connection.rate_limits
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        await self.connection.send(text_data=text_data, bytes_data=bytes_data)
+
+    async def close(self, code=None, reason=None):
+        await self.connection.unsubscribe(self.beam_id)
+
+
+class BeamMultiplexConsumer(AsyncWebsocketConsumer):
+    """
+    One socket for many beams. Clients send {"type": "subscribe", "beam":
+    <beam_id>, "message": <beam token>} and "unsubscribe" likewise; every
+    other frame, in either direction, is a BeamConsumer frame tagged with
+    its "beam".
+
+    The connection's channel joins each subscribed beam's group, and the
+    group events, which name their beam, are handed to that beam's
+    BeamSubscription.
+    """
+
+    async def connect(self):
+        self.codec, subprotocol = negotiate_codec(self.scope.get("subprotocols"))
+        self.rate_limits = connection_rate_limits()
+        self.max_beams = getattr(settings, "BEAM_MULTIPLEX", {}).get("max_beams", 50)
+        self.beams = {}
+        await self.accept(subprotocol)
+
+    async def dispatch(self, message):
+        try:
+            await super().dispatch(message)
+        except StopConsumer:
+            raise
+        except Exception:
+            # As in BeamConsumer.dispatch: leave every beam before dying.
+            await self.disconnect(None)
+            raise
+
+    async def disconnect(self, close_code):
+        for subscription in list(self.beams.values()):
+            await subscription.leave_beam()
+        self.beams.clear()
+
+    async def send_message(self, message):
+        data = self.codec.encode(message)
+        if self.codec.binary:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    async def subscribe(self, beam_id, beam_token):
+        if beam_id in self.beams:
+            return
+        if len(self.beams) >= self.max_beams:
+            await self.send_message({
+                "type": "auth_failed",
+                "beam": beam_id,
+                "message": f"At most {self.max_beams} beams per connection."
+            })
+            return
+        subscription = self.beams[beam_id] = BeamSubscription(self, beam_id)
+        # A failed auth closes, i.e. unsubscribes, the subscription.
+        await subscription.handle_message({"type": "auth", "message": beam_token})
+        if subscription.client_id is None and self.beams.get(beam_id) is subscription:
+            # Not joined, e.g. rate limited: don't hold a slot for it.
+            await self.unsubscribe(beam_id)
+
+    async def unsubscribe(self, beam_id):
+        subscription = self.beams.pop(beam_id, None)
+        if subscription is not None:
+            await subscription.leave_beam()
+            await self.send_message({
+                "type": "unsubscribed",
+                "beam": beam_id
+            })
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            res = self.codec.decode(bytes_data if self.codec.binary else text_data)
+        except FrameError:
+            await self.close(code=1007)
+            return
+        if not isinstance(res, dict) or not isinstance(res.get("type"), str):
+            await self.send_message({
+                "type": "invalid_frame",
+                "message": "Frames are objects with a string \"type\"."
+            })
+            return
+        beam_id = res.get("beam")
+        if not isinstance(beam_id, str) or not BEAM_ID.match(beam_id):
+            await self.close(code=1007)
+            return
+
+        if res["type"] == "subscribe":
+            await self.subscribe(beam_id, res.get("message"))
+        elif res["type"] == "unsubscribe":
+            await self.unsubscribe(beam_id)
+        elif beam_id in self.beams:
+            await self.beams[beam_id].handle_message(res)
+        else:
+            await self.send_message({
+                "type": "permission_denied",
+                "beam": beam_id,
+                "message": res["type"]
+            })
+
+    async def beam_frame(self, event):
+        subscription = self.beams.get(event["beam"])
+        if subscription is not None:
+            await subscription.beam_frame(event)
+
+    async def beam_changed(self, event):
+        subscription = self.beams.get(event["beam"])
+        if subscription is not None:
+            await subscription.beam_changed(event)
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from channels_redis.core import RedisChannelLayer
+
+# Channels the current group_send() already served in memory.
+_delivered = ContextVar("delivered", default=frozenset())
+# Channel whose receive() the current task is running.
+_receiving = ContextVar("receiving", default=None)
+
+
+class HybridChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer that hands messages for channels of this process
+    straight to their receive buffers, so only members on other workers
+    cost Redis traffic.
+
+    Group membership is still written to Redis, where other workers read
+    it; this process additionally remembers which members are its own.
+    group_send() delivers to those in memory and leaves them out of the
+    Redis fan-out. When a beam's members share a worker (see "Running
+    several workers" in the README), a broadcast costs one read of the
+    group and no message writes or pops.
+
+    A local member that was sent something through Redis (its consumer
+    wasn't receiving, or the sender ran on another loop) keeps getting
+    its messages through Redis until those are popped, so it sees them in
+    the order they were sent. Local memberships expire after
+    `group_expiry` like the ones in Redis.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # group -> {channel: time.time() it joined}
+        self.local_groups = {}
+        # channel -> (messages on their way through Redis, time.monotonic()
+        # of the last one). Senders on other threads update it too.
+        self.redis_pending = {}
+        self.redis_pending_lock = threading.Lock()
+        # The process's pending pop from Redis, kept across receive_single()
+        # calls so a local delivery can interrupt the wait without losing it.
+        self.pop_task = None
+        self.popping = None
+        self.wakeup = None
+
+    def is_local(self, channel):
+        return "!" in channel and self.non_local_name(channel).endswith(self.client_prefix + "!")
+
+    def sent_through_redis(self, channel, count=1):
+        with self.redis_pending_lock:
+            pending, _ = self.redis_pending.get(channel, (0, 0))
+            if pending + count > 0:
+                self.redis_pending[channel] = (pending + count, time.monotonic())
+            else:
+                self.redis_pending.pop(channel, None)
+
+    def waits_on_redis(self, channel):
+        with self.redis_pending_lock:
+            pending, sent_at = self.redis_pending.get(channel, (0, 0))
+            if pending and time.monotonic() - sent_at > self.expiry:
+                # Whatever is left expired in Redis, or was dropped there
+                # for capacity; it will never be popped.
+                del self.redis_pending[channel]
+                return False
+            return pending > 0
+
+    def deliver_locally(self, channel, message):
+        if self.receive_event_loop is not asyncio.get_running_loop():
+            # e.g. async_to_sync() from a view thread, or no consumer is
+            # receiving right now; the buffers belong to the receiving loop.
+            return False
+        if self.waits_on_redis(channel):
+            # Overtaking what's still in Redis would reorder the channel.
+            return False
+        # receive() drops a buffer whenever it empties, so a consumer busy
+        # with its last message has none; like the Redis path, this starts
+        # a new one for its next receive(). Bounded the same way too: the
+        # oldest message is dropped when a consumer falls `capacity`
+        # messages behind.
+        self.receive_buffer[channel].put_nowait(dict(message))
+        if channel == self.popping:
+            # It only looks at its buffer once the pop returns.
+            self.wakeup.set()
+        return True
+
+    async def receive(self, channel):
+        token = _receiving.set(channel)
+        try:
+            return await super().receive(channel)
+        except asyncio.CancelledError:
+            # The consumer stopped; nothing more will be popped for it.
+            with self.redis_pending_lock:
+                self.redis_pending.pop(channel, None)
+            if self.receive_count == 0 and self.pop_task is not None:
+                # The last consumer left; a popped message waits in the
+                # backup queue for the next pop, as with the stock layer.
+                self.pop_task.cancel()
+                self.pop_task = None
+            raise
+        finally:
+            _receiving.reset(token)
+
+    async def receive_single(self, channel):
+        if "!" not in channel:
+            return await super().receive_single(channel)
+        if self.pop_task is None:
+            self.pop_task = asyncio.ensure_future(super().receive_single(channel))
+        self.popping = _receiving.get()
+        self.wakeup = asyncio.Event()
+        wakeup = asyncio.ensure_future(self.wakeup.wait())
+        try:
+            await asyncio.wait([self.pop_task, wakeup], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            wakeup.cancel()
+            self.popping = None
+        if not self.pop_task.done():
+            # Woken by a local delivery; receive() finds it in the buffer.
+            return [], None
+        pop_task, self.pop_task = self.pop_task, None
+        message_channel, message = pop_task.result()
+        for channel in message_channel if isinstance(message_channel, list) else [message_channel]:
+            self.sent_through_redis(channel, -1)
+        return message_channel, message
+
+    async def send(self, channel, message):
+        if self.is_local(channel):
+            if self.deliver_locally(channel, message):
+                return
+            self.sent_through_redis(channel)
+        await super().send(channel, message)
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        if self.is_local(channel):
+            self.local_groups.setdefault(group, {})[channel] = time.time()
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        members = self.local_groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.local_groups[group]
+
+    def local_members(self, group):
+        members = self.local_groups.get(group)
+        if not members:
+            return ()
+        # Channels that never left, e.g. their worker thread died, drop
+        # out after group_expiry as they do in Redis.
+        cutoff = time.time() - self.group_expiry
+        for channel in [channel for channel, joined in members.items() if joined < cutoff]:
+            del members[channel]
+        if not members:
+            del self.local_groups[group]
+        return list(members)
+
+    async def group_send(self, group, message):
+        # Members that can't be served in memory get the message through
+        # Redis; only group_discard() and group_expiry remove them.
+        members = self.local_members(group)
+        delivered = {channel for channel in members if self.deliver_locally(channel, message)}
+        for channel in members:
+            if channel not in delivered:
+                self.sent_through_redis(channel)
+        token = _delivered.set(delivered)
+        try:
+            await super().group_send(group, message)
+        finally:
+            _delivered.reset(token)
+
+    def _map_channel_keys_to_connection(self, channel_names, message):
+        # Only used by group_send(); skips the members it served in memory.
+        delivered = _delivered.get()
+        return super()._map_channel_keys_to_connection(
+            [channel for channel in channel_names if channel not in delivered],
+            message
+        )
+
+    async def close_pools(self):
+        if self.pop_task is not None:
+            self.pop_task.cancel()
+            self.pop_task = None
+        await super().close_pools()
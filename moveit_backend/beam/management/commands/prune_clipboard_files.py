@@ -0,0 +1,43 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from note.models import Note
+
+DIRECTORY = 'clipboard'
+
+
+class Command(BaseCommand):
+    help = 'Delete stored clipboard files that no note refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=getattr(settings, 'BEAM_CLIPBOARD_FILE_RETENTION_HOURS', 24),
+            help='Keep files from the last HOURS hours, which pastes may still link to '
+                 '(default: BEAM_CLIPBOARD_FILE_RETENTION_HOURS).'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        try:
+            _, files = default_storage.listdir(DIRECTORY)
+        except FileNotFoundError:
+            files = []
+
+        names = [f"{DIRECTORY}/{name}" for name in files]
+        referenced = set()
+        # Chunked so the IN list stays within database parameter limits.
+        for start in range(0, len(names), 500):
+            referenced.update(Note.objects.filter(
+                attachment__in=names[start:start + 500]
+            ).values_list('attachment', flat=True))
+
+        deleted = 0
+        for name in names:
+            if name not in referenced and default_storage.get_modified_time(name) < cutoff:
+                default_storage.delete(name)
+                deleted += 1
+        self.stdout.write(f"Deleted {deleted} unreferenced clipboard files older than {cutoff.isoformat()}.")
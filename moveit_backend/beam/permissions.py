@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from .models import Beam, BeamShare
+
+OWNER = 'owner'
+# Roles that may post to a beam and manage its shares, respectively.
+WRITE_ROLES = {OWNER, 'admin', 'write'}
+MANAGE_ROLES = {OWNER, 'admin'}
+
+
+class RoleResolver:
+    """
+    Resolves a user's role in a beam: 'owner', a BeamShare share_type, or
+    None when the user has no access of their own.
+
+    Lookups go through a small per-process LRU, then the shared Django
+    cache, then one indexed query. The LRU holds {user_id: entry} per
+    beam, so forget_local() drops a beam's entries in one step and the
+    least recently used beam is evicted whole once it holds more than
+    `local_size` entries. Shared entries are tagged with the
+    beam's cache version, which invalidate() bumps when the beam or one of
+    its shares changes, so every process drops them at once; local
+    entries in other processes expire after `local_ttl` seconds.
+    """
+
+    def __init__(self, ttl=300, local_ttl=5, local_size=10000):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.local = OrderedDict()
+        self.local_count = 0
+        self.lock = threading.Lock()
+
+    def version_key(self, beam_pk):
+        return f"beam_roles:version:{beam_pk}"
+
+    def role_key(self, beam_pk, user_id):
+        return f"beam_roles:{beam_pk}:{user_id}"
+
+    def get_local(self, beam_pk, user_id):
+        with self.lock:
+            entries = self.local.get(beam_pk)
+            entry = entries.get(user_id) if entries else None
+            if entry is None:
+                return False, None
+            expires_at, role = entry
+            if expires_at < time.monotonic():
+                del entries[user_id]
+                self.local_count -= 1
+                return False, None
+            self.local.move_to_end(beam_pk)
+            return True, role
+
+    def set_local(self, beam_pk, user_id, role):
+        with self.lock:
+            entries = self.local.setdefault(beam_pk, {})
+            if user_id not in entries:
+                self.local_count += 1
+            entries[user_id] = (time.monotonic() + self.local_ttl, role)
+            self.local.move_to_end(beam_pk)
+            while self.local_count > self.local_size and len(self.local) > 1:
+                _, evicted = self.local.popitem(last=False)
+                self.local_count -= len(evicted)
+
+    def lookup(self, user_id, beam_pk):
+        # BeamShare's unique (beam, shared_with) index serves the subquery.
+        beam = Beam.objects.filter(pk=beam_pk).annotate(
+            share_type=Subquery(
+                BeamShare.objects.filter(
+                    beam=OuterRef('pk'),
+                    shared_with_id=user_id
+                ).values('share_type')[:1]
+            )
+        ).values('user_id', 'share_type').first()
+        if beam is None:
+            return None
+        if beam['user_id'] == user_id:
+            return OWNER
+        return beam['share_type']
+
+    def role(self, user_id, beam_pk):
+        if user_id is None or beam_pk is None:
+            return None
+
+        hit, role = self.get_local(beam_pk, user_id)
+        if hit:
+            return role
+
+        version_key = self.version_key(beam_pk)
+        role_key = self.role_key(beam_pk, user_id)
+        cached = cache.get_many([version_key, role_key])
+        version = cached.get(version_key, 0)
+        entry = cached.get(role_key)
+        if entry is not None and entry[0] == version:
+            role = entry[1]
+        else:
+            role = self.lookup(user_id, beam_pk)
+            # Tagged with the version read before the query: if the beam
+            # changed meanwhile, the entry is already stale and ignored.
+            cache.set(role_key, (version, role), self.ttl)
+
+        self.set_local(beam_pk, user_id, role)
+        return role
+
+    def forget_local(self, beam_pk):
+        with self.lock:
+            self.local_count -= len(self.local.pop(beam_pk, ()))
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+            self.local_count = 0
+
+    def invalidate(self, beam_pk):
+        key = self.version_key(beam_pk)
+        # add() is a no-op when the key exists, so incr() never misses it.
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+        self.forget_local(beam_pk)
+
+
+_resolver = None
+
+
+def get_role_resolver():
+    global _resolver
+    if _resolver is None:
+        _resolver = RoleResolver(**getattr(settings, "BEAM_ROLE_CACHE", {}))
+    return _resolver
+
+
+def get_beam_role(user_id, beam_pk):
+    return get_role_resolver().role(user_id, beam_pk)
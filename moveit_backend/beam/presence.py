@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+import weakref
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_PRESENCE_TTL = 60
+
+
+class BasePresenceBackend:
+    """
+    Tracks which clients are connected to which beam, cluster-wide.
+
+    Members carry an expiry that connections refresh through heartbeat();
+    members whose worker died before disconnect() age out after `ttl`
+    seconds and are returned by prune() so the caller can announce them.
+    snapshot() and count() leave expired members out without removing
+    them: only prune() changes the version, and its caller announces it.
+
+    Every change to a beam's member list bumps that beam's presence
+    version. join() and leave() return the new version (leave() returns
+    None when the client was already gone) and prune() returns
+    (client_id, version) pairs, so each delta a client receives can be
+    checked for gaps against the version in snapshot().
+    """
+
+    def __init__(self, ttl=DEFAULT_PRESENCE_TTL, **kwargs):
+        self.ttl = ttl
+
+    async def join(self, beam_id, client_id, member):
+        raise NotImplementedError
+
+    async def leave(self, beam_id, client_id):
+        raise NotImplementedError
+
+    async def heartbeat(self, beam_id, client_id):
+        raise NotImplementedError
+
+    async def prune(self, beam_id):
+        raise NotImplementedError
+
+    async def snapshot(self, beam_id):
+        raise NotImplementedError
+
+    async def members(self, beam_id):
+        members, _ = await self.snapshot(beam_id)
+        return members
+
+    async def count(self, beam_id):
+        raise NotImplementedError
+
+
+class InMemoryPresenceBackend(BasePresenceBackend):
+    """
+    Process-local presence, for tests and single-worker development.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.beams = {}
+        self.versions = {}
+
+    def _bump(self, beam_id):
+        self.versions[beam_id] = self.versions.get(beam_id, 0) + 1
+        return self.versions[beam_id]
+
+    async def join(self, beam_id, client_id, member):
+        self.beams.setdefault(beam_id, {})[client_id] = (member, time.time() + self.ttl)
+        return self._bump(beam_id)
+
+    async def leave(self, beam_id, client_id):
+        beam = self.beams.get(beam_id, {})
+        removed = beam.pop(client_id, None) is not None
+        if not beam:
+            self.beams.pop(beam_id, None)
+        return self._bump(beam_id) if removed else None
+
+    async def heartbeat(self, beam_id, client_id):
+        beam = self.beams.get(beam_id, {})
+        if client_id in beam:
+            beam[client_id] = (beam[client_id][0], time.time() + self.ttl)
+
+    async def prune(self, beam_id):
+        now = time.time()
+        beam = self.beams.get(beam_id, {})
+        expired = [client_id for client_id, (_, expires_at) in beam.items() if expires_at <= now]
+        for client_id in expired:
+            del beam[client_id]
+        if not beam:
+            self.beams.pop(beam_id, None)
+        return [(client_id, self._bump(beam_id)) for client_id in expired]
+
+    def _live(self, beam_id):
+        now = time.time()
+        return [member for member, expires_at in self.beams.get(beam_id, {}).values() if expires_at > now]
+
+    async def snapshot(self, beam_id):
+        return self._live(beam_id), self.versions.get(beam_id, 0)
+
+    async def count(self, beam_id):
+        return len(self._live(beam_id))
+
+
+class RedisPresenceBackend(BasePresenceBackend):
+    """
+    Presence shared by every worker through Redis.
+
+    Each beam keeps a hash of client_id -> member JSON and a sorted set of
+    client_id scored by expiry time, so join, leave and heartbeat are O(1)
+    hash writes plus an O(log N) sorted-set update.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, prefix="beam_presence", **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        # Connections are bound to the event loop that opened them, and sync
+        # views reach the backend through async_to_sync on their own loop.
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            import redis.asyncio as redis
+            self._clients[loop] = redis.Redis(host=self.host, port=self.port, db=self.db)
+        return self._clients[loop]
+
+    def _keys(self, beam_id):
+        return (
+            f"{self.prefix}:{beam_id}:members",
+            f"{self.prefix}:{beam_id}:expiry",
+            f"{self.prefix}:{beam_id}:version",
+        )
+
+    async def join(self, beam_id, client_id, member):
+        members_key, expiry_key, version_key = self._keys(beam_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(members_key, client_id, json.dumps(member))
+            pipe.zadd(expiry_key, {client_id: time.time() + self.ttl})
+            pipe.incr(version_key)
+            # The keys themselves outlive every member by one TTL, so a beam
+            # abandoned by crashed workers is eventually dropped by Redis.
+            pipe.expire(members_key, self.ttl * 2)
+            pipe.expire(expiry_key, self.ttl * 2)
+            pipe.expire(version_key, self.ttl * 2)
+            _, _, version, *_ = await pipe.execute()
+        return version
+
+    async def leave(self, beam_id, client_id):
+        members_key, expiry_key, version_key = self._keys(beam_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hdel(members_key, client_id)
+            pipe.zrem(expiry_key, client_id)
+            removed, _ = await pipe.execute()
+        if not removed:
+            return None
+        return await self.client.incr(version_key)
+
+    async def heartbeat(self, beam_id, client_id):
+        members_key, expiry_key, version_key = self._keys(beam_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(expiry_key, {client_id: time.time() + self.ttl}, xx=True)
+            pipe.expire(members_key, self.ttl * 2)
+            pipe.expire(expiry_key, self.ttl * 2)
+            pipe.expire(version_key, self.ttl * 2)
+            await pipe.execute()
+
+    async def prune(self, beam_id):
+        members_key, expiry_key, version_key = self._keys(beam_id)
+        now = time.time()
+        expired = await self.client.zrangebyscore(expiry_key, "-inf", now)
+        if not expired:
+            return []
+        # Several workers may notice the same expiry; ZREM tells each one
+        # which members it actually removed, so every leave is counted once.
+        async with self.client.pipeline(transaction=True) as pipe:
+            for client_id in expired:
+                pipe.zrem(expiry_key, client_id)
+            removed = [
+                client_id for client_id, count in zip(expired, await pipe.execute()) if count
+            ]
+        if not removed:
+            return []
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hdel(members_key, *removed)
+            pipe.incrby(version_key, len(removed))
+            _, version = await pipe.execute()
+        first = version - len(removed) + 1
+        return [
+            (client_id.decode(), first + offset) for offset, client_id in enumerate(removed)
+        ]
+
+    async def snapshot(self, beam_id):
+        members_key, expiry_key, version_key = self._keys(beam_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(members_key)
+            pipe.zrangebyscore(expiry_key, f"({time.time()}", "+inf")
+            pipe.get(version_key)
+            members, live, version = await pipe.execute()
+        return [json.loads(members[client_id]) for client_id in live if client_id in members], int(version or 0)
+
+    async def count(self, beam_id):
+        _, expiry_key, _ = self._keys(beam_id)
+        return await self.client.zcount(expiry_key, f"({time.time()}", "+inf")
+
+
+_backend = None
+
+
+def get_presence_backend():
+    global _backend
+    if _backend is None:
+        config = getattr(settings, "BEAM_PRESENCE", {})
+        backend_class = import_string(config.get("BACKEND", "beam.presence.InMemoryPresenceBackend"))
+        _backend = backend_class(**config.get("CONFIG", {}))
+    return _backend
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per second on average and bursts of up to
+    `burst` events.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimits:
+    """
+    Token buckets per event type, built from a {type: (rate, burst)}
+    mapping. Types without their own entry share the "default" bucket,
+    so a client cannot get fresh buckets by inventing event types.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.buckets = {}
+
+    def allow(self, event_type):
+        key = event_type if event_type in self.limits else "default"
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if key not in self.limits:
+                return True
+            bucket = self.buckets[key] = TokenBucket(*self.limits[key])
+        return bucket.take()
+
+
+class BeamRateLimits:
+    """
+    RateLimits for every beam this process serves, shared by all its
+    sockets, so one beam cannot monopolise a worker. Beams are evicted
+    least recently used beyond `max_beams`.
+    """
+
+    def __init__(self, limits, max_beams=10000):
+        self.limits = limits
+        self.max_beams = max_beams
+        self.beams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, beam_id, event_type):
+        with self.lock:
+            limits = self.beams.get(beam_id)
+            if limits is None:
+                limits = self.beams[beam_id] = RateLimits(self.limits)
+                while len(self.beams) > self.max_beams:
+                    self.beams.popitem(last=False)
+            else:
+                self.beams.move_to_end(beam_id)
+            return limits.allow(event_type)
+
+
+_beam_limits = None
+
+
+def get_rate_limit_config():
+    return getattr(settings, "BEAM_RATE_LIMITS", {})
+
+
+def connection_rate_limits():
+    return RateLimits(get_rate_limit_config().get("connection", {}))
+
+
+def get_beam_rate_limits():
+    global _beam_limits
+    if _beam_limits is None:
+        _beam_limits = BeamRateLimits(get_rate_limit_config().get("beam", {}))
+    return _beam_limits
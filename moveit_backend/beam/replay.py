@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+import weakref
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .codecs import json_default
+
+
+class BaseReplayBackend:
+    """
+    The last `size` rec_clipboard messages of every beam, replayed to
+    sockets when they join so late joiners catch up without a database
+    query.
+
+    Messages older than `max_age` seconds are not replayed, and messages
+    whose JSON is larger than `max_bytes` are not kept at all.
+    """
+
+    def __init__(self, size=50, max_age=24 * 3600, max_bytes=64 * 1024, **kwargs):
+        self.size = size
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    def _entry(self, message):
+        entry = json.dumps({"at": time.time(), "message": message}, default=json_default)
+        if len(entry) > self.max_bytes:
+            return None
+        return entry
+
+    def _live(self, entries):
+        cutoff = time.time() - self.max_age
+        entries = [json.loads(entry) for entry in entries]
+        return [entry["message"] for entry in entries if entry["at"] >= cutoff]
+
+    async def append(self, beam_id, message):
+        raise NotImplementedError
+
+    async def recent(self, beam_id):
+        """
+        The beam's buffered messages, oldest first.
+        """
+        raise NotImplementedError
+
+    async def discard(self, beam_id, content):
+        """
+        Drop buffered messages whose content is `content`, as delete_note
+        does on clients.
+        """
+        raise NotImplementedError
+
+
+class InMemoryReplayBackend(BaseReplayBackend):
+    """
+    Process-local replay buffers, for tests and single-worker development.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.beams = {}
+
+    async def append(self, beam_id, message):
+        entry = self._entry(message)
+        if entry is not None:
+            self.beams.setdefault(beam_id, deque(maxlen=self.size)).append(entry)
+
+    async def recent(self, beam_id):
+        return self._live(self.beams.get(beam_id, ()))
+
+    async def discard(self, beam_id, content):
+        beam = self.beams.get(beam_id)
+        if beam:
+            kept = [entry for entry in beam if json.loads(entry)["message"].get("message") != content]
+            self.beams[beam_id] = deque(kept, maxlen=self.size)
+
+
+class RedisReplayBackend(BaseReplayBackend):
+    """
+    Replay buffers shared by every worker, one capped Redis list per beam.
+    Appending is a single pipelined RPUSH + LTRIM and catching up a single
+    LRANGE; the list expires `max_age` after the last paste.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, prefix="beam_replay", **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        # Connections are bound to the event loop that opened them.
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            import redis.asyncio as redis
+            self._clients[loop] = redis.Redis(host=self.host, port=self.port, db=self.db)
+        return self._clients[loop]
+
+    def _key(self, beam_id):
+        return f"{self.prefix}:{beam_id}"
+
+    async def append(self, beam_id, message):
+        entry = self._entry(message)
+        if entry is None:
+            return
+        key = self._key(beam_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, entry)
+            pipe.ltrim(key, -self.size, -1)
+            pipe.expire(key, int(self.max_age))
+            await pipe.execute()
+
+    async def recent(self, beam_id):
+        return self._live(await self.client.lrange(self._key(beam_id), 0, -1))
+
+    async def discard(self, beam_id, content):
+        key = self._key(beam_id)
+        entries = await self.client.lrange(key, 0, -1)
+        matching = [entry for entry in entries if json.loads(entry)["message"].get("message") == content]
+        if matching:
+            async with self.client.pipeline(transaction=True) as pipe:
+                for entry in matching:
+                    pipe.lrem(key, 0, entry)
+                await pipe.execute()
+
+
+_backend = None
+
+
+def get_replay_backend():
+    global _backend
+    if _backend is None:
+        config = getattr(settings, "BEAM_REPLAY", {})
+        backend_class = import_string(config.get("BACKEND", "beam.replay.InMemoryReplayBackend"))
+        _backend = backend_class(**config.get("CONFIG", {}))
+    return _backend
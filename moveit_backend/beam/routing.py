@@ -4,4 +4,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/beam/(?P<beam_id>[\w\-]+)/$", consumers.BeamConsumer.as_asgi()),
+    re_path(r"ws/beams/$", consumers.BeamMultiplexConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
 from .models import Beam, BeamShare
 from my_auth.models import Profile
+from my_auth.serializers import UserRows, row_datetime_field
+from .permissions import OWNER, get_beam_role
+from .tokens import issue_beam_token
 
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
@@ -23,10 +27,24 @@ class UserSerializer(serializers.ModelSerializer):
 
 class BeamSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    beam_token = serializers.SerializerMethodField()
     
     class Meta:
         model = Beam
-        fields = ['beam_id', 'beam_key', 'beam_name', 'user', 'created_at']
+        fields = ['beam_id', 'beam_key', 'beam_token', 'beam_name', 'user', 'created_at']
+
+    def get_beam_token(self, obj):
+        # Carries the requester's current role. Ownerless beams are only
+        # rendered for the anonymous creator, whose token is all the
+        # access there is.
+        if obj.user_id is None:
+            return issue_beam_token(obj.beam_id, obj.pk, 'write')
+        request = self.context.get('request')
+        user_id = request.user.id if request else None
+        role = OWNER if obj.user_id == user_id else get_beam_role(user_id, obj.pk)
+        if role is None:
+            return None
+        return issue_beam_token(obj.beam_id, obj.pk, role, user_id)
 
 class BeamShareSerializer(serializers.ModelSerializer):
     beam = BeamSerializer(read_only=True)
@@ -38,6 +56,70 @@ class BeamShareSerializer(serializers.ModelSerializer):
         fields = ['id', 'beam', 'shared_by', 'shared_with', 'share_type', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+class BeamShareRows:
+    """
+    Read-only fast path for BeamShareSerializer on list endpoints.
+
+    Renders the same output from .values(*BeamShareRows.columns) rows:
+    the beam, its owner, both users and their profiles come from one
+    query, and each user block is built once per response.
+
+    Beam tokens carry the requester's current role: the share's own
+    share_type for the user the beam was shared with (`shared_with`),
+    otherwise ownership of the beam or the requester_role() column.
+    """
+    columns = [
+        'id', 'share_type', 'created_at', 'beam_id',
+        'beam__beam_id', 'beam__beam_key', 'beam__beam_name', 'beam__created_at',
+        *UserRows.columns('beam__user__'),
+        *UserRows.columns('shared_by__'),
+        *UserRows.columns('shared_with__'),
+    ]
+
+    def __init__(self, request=None, shared_with=False):
+        self.users = UserRows(request)
+        self.datetime = row_datetime_field()
+        self.user_id = request.user.id if request else None
+        self.shared_with = shared_with
+
+    @staticmethod
+    def requester_role(user):
+        # The share_type of `user`'s own share of each row's beam, if any.
+        return Subquery(
+            BeamShare.objects.filter(beam=OuterRef('beam'), shared_with=user).values('share_type')[:1]
+        )
+
+    def token(self, row):
+        if self.shared_with:
+            role = row['share_type']
+        elif row['beam__user__id'] == self.user_id:
+            role = OWNER
+        else:
+            role = row['requester_role']
+        if role is None:
+            return None
+        return issue_beam_token(row['beam__beam_id'], row['beam_id'], role, self.user_id)
+
+    def render(self, row):
+        return {
+            'id': row['id'],
+            'beam': {
+                'beam_id': row['beam__beam_id'],
+                'beam_key': row['beam__beam_key'],
+                'beam_token': self.token(row),
+                'beam_name': row['beam__beam_name'],
+                'user': self.users.render(row, 'beam__user__'),
+                'created_at': self.datetime.to_representation(row['beam__created_at']),
+            },
+            'shared_by': self.users.render(row, 'shared_by__'),
+            'shared_with': self.users.render(row, 'shared_with__'),
+            'share_type': row['share_type'],
+            'created_at': self.datetime.to_representation(row['created_at']),
+        }
+
+    def render_many(self, rows):
+        return [self.render(row) for row in rows]
+
 class CreateBeamShareSerializer(serializers.ModelSerializer):
     class Meta:
         model = BeamShare
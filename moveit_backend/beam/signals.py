@@ -0,0 +1,58 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Beam, BeamShare
+from .permissions import get_role_resolver
+
+
+def get_beam_group_name(beam_id):
+    return f"beam_channel_{beam_id}"
+
+
+def broadcast_beam_change(beam_id, deleted=False):
+    """
+    Tell every socket connected to the beam that its cached Beam row is
+    stale, once the surrounding transaction has committed.
+    """
+    def send():
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                get_beam_group_name(beam_id),
+                {
+                    "type": "beam.changed",
+                    "beam": beam_id,
+                    "deleted": deleted
+                }
+            )
+        except Exception as e:
+            print(f"Failed to broadcast change of beam {beam_id}: {e}")
+
+    transaction.on_commit(send)
+
+
+def invalidate_beam_roles(beam_pk):
+    # Registered before the broadcast, so sockets reloading on
+    # beam.changed already resolve the new roles.
+    transaction.on_commit(lambda: get_role_resolver().invalidate(beam_pk))
+
+
+@receiver(post_save, sender=Beam)
+def beam_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_beam_roles(instance.pk)
+        broadcast_beam_change(instance.beam_id)
+
+
+@receiver(post_delete, sender=Beam)
+def beam_deleted(sender, instance, **kwargs):
+    invalidate_beam_roles(instance.pk)
+    broadcast_beam_change(instance.beam_id, deleted=True)
+
+
+@receiver(post_save, sender=BeamShare)
+@receiver(post_delete, sender=BeamShare)
+def beam_share_changed(sender, instance, **kwargs):
+    invalidate_beam_roles(instance.beam_id)
+    broadcast_beam_change(instance.beam.beam_id)
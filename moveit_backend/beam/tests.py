@@ -1,3 +1,733 @@
-from django.test import TestCase
+import asyncio
+import base64
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from channels_redis.core import RedisChannelLayer
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from my_auth.models import Profile
+from note.models import Note
+from .codecs import JSON, MSGPACK, FrameError, JsonCodec, MsgpackCodec, encode_frames, msgpack
+from .consumers import BeamConsumer, BeamMultiplexConsumer
+from .layers import HybridChannelLayer
+from .models import Beam, BeamShare
+from .permissions import RoleResolver, get_role_resolver
+from .presence import InMemoryPresenceBackend
+from .ratelimit import BeamRateLimits, RateLimits, TokenBucket
+from .replay import InMemoryReplayBackend
+from .serializers import BeamShareRows, BeamShareSerializer
+from .tokens import issue_beam_token, verify_beam_token
+from .transfers import TransferError, TransferStore
+from .views import serve_clipboard_file
+from .writer import ClipboardWriter
 
-# Create your tests here.
+
+class BeamListQueryCountTests(TestCase):
+    """
+    The beam list endpoints cost the same number of queries however many
+    rows they return; a per-row query shows up as a count that grows.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.count = 0
+
+    def add_rows(self, count):
+        # Every row gets its own beam, owner and other user, each with a
+        # profile picture, so nothing is shared between rows.
+        for _ in range(count):
+            self.count += 1
+            other = User.objects.create_user(f'user{self.count}')
+            Profile.objects.filter(user=other).update(profile_picture=f'profile_images/{self.count}.png')
+            own = Beam.objects.create(beam_id=f'own{self.count}', beam_key='key', user=self.user)
+            theirs = Beam.objects.create(beam_id=f'theirs{self.count}', beam_key='key', user=other)
+            BeamShare.objects.create(beam=own, shared_by=self.user, shared_with=other, share_type='read')
+            BeamShare.objects.create(beam=theirs, shared_by=other, shared_with=self.user, share_type='write')
+
+    def assertConstantQueries(self, url, key, queries):
+        for rows in (1, 10):
+            self.add_rows(rows - self.count)
+            with self.subTest(rows=rows), self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()[key]), rows)
+
+    def test_user_beams(self):
+        self.assertConstantQueries('/api/beams/', 'beams', 1)
+
+    def test_shared_with_me(self):
+        self.assertConstantQueries('/api/beams/shared-with-me/', 'shared_beams', 1)
+
+    def test_my_shares(self):
+        self.assertConstantQueries('/api/beams/my-shares/', 'my_shared_beams', 1)
+
+    def test_pages_after_the_first(self):
+        self.add_rows(10)
+        response = self.client.get('/api/beams/my-shares/', {'page_size': 4})
+        cursor = response['X-Next-Cursor']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/beams/my-shares/', {'page_size': 4, 'cursor': cursor})
+        self.assertEqual(len(response.json()['my_shared_beams']), 4)
+
+
+class BinaryPayloadTests(SimpleTestCase):
+    """
+    msgpack clients can send bytes, which JSON clients and the replay
+    buffer receive as base64.
+    """
+    message = {"type": "rec_clipboard", "message": b"\x00\xffpaste", "extra": "text"}
+
+    def test_json_frames_carry_bytes_as_base64(self):
+        decoded = JsonCodec().decode(encode_frames(self.message)[JSON])
+        self.assertEqual(base64.b64decode(decoded["message"]), self.message["message"])
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_frames_carry_bytes_as_is(self):
+        self.assertEqual(MsgpackCodec().decode(encode_frames(self.message)[MSGPACK]), self.message)
+
+    def test_replay_keeps_bytes_messages(self):
+        replay = InMemoryReplayBackend()
+        async_to_sync(replay.append)("beam", self.message)
+        replayed = async_to_sync(replay.recent)("beam")
+        self.assertEqual(base64.b64decode(replayed[0]["message"]), self.message["message"])
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_extension_types_are_rejected(self):
+        frame = bytes([0]) + msgpack.packb({"type": "message", "message": msgpack.ExtType(5, b"x")})
+        with self.assertRaises(FrameError):
+            MsgpackCodec().decode(frame)
+
+
+class TransferStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.media = Path(temp.name) / 'media'
+        settings = override_settings(MEDIA_ROOT=str(self.media))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.store = TransferStore(Path(temp.name) / 'transfers', chunk_size=4)
+
+    def transfer(self, name, data, transfer_id='a' * 32):
+        self.store.start(1, transfer_id, len(data), name, 'application/octet-stream', 1)
+        for offset in range(0, len(data), 4):
+            self.store.write(1, transfer_id, offset, data[offset:offset + 4])
+        return self.store.finish(1, transfer_id)
+
+    def test_only_inert_extensions_are_kept(self):
+        self.assertTrue(self.transfer('photo.PNG', b'png bytes')['file'].endswith('.png'))
+        for name in ('page.html', 'image.svg', 'no extension'):
+            with self.subTest(name=name):
+                stored = self.transfer(name, name.encode())['file']
+                self.assertNotIn('.', Path(stored).name)
+
+    def test_concurrent_copies_of_a_chunk_are_stored_once(self):
+        self.store.start(1, 'b' * 32, 8, 'x.txt', 'text/plain', 1)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: self.store.write(1, 'b' * 32, 0, b'abcd'), range(32)))
+        self.assertEqual(self.store.load(1, 'b' * 32)['received'], 4)
+        self.assertEqual(self.store.write(1, 'b' * 32, 4, b'efgh')['received'], 8)
+
+    def test_finished_transfers_take_no_more_chunks(self):
+        self.transfer('x.txt', b'abcd', 'c' * 32)
+        with self.assertRaises(TransferError):
+            self.store.write(1, 'c' * 32, 0, b'abcd')
+        self.assertFalse((self.store.root / '1' / f"{'c' * 32}.part").exists())
+
+    def test_open_transfers_per_beam_are_capped(self):
+        store = TransferStore(self.store.root, max_open_per_beam=2)
+        for transfer_id in ('a' * 32, 'b' * 32):
+            store.start(1, transfer_id, 4, 'x.txt', 'text/plain', 1)
+        with self.assertRaises(TransferError):
+            store.start(1, 'c' * 32, 4, 'x.txt', 'text/plain', 1)
+        # Resuming one, or starting one in another beam, is fine.
+        self.assertEqual(store.start(1, 'a' * 32, 4, 'x.txt', 'text/plain', 1)['received'], 0)
+        store.start(2, 'c' * 32, 4, 'x.txt', 'text/plain', 1)
+        self.assertEqual(store.still_open(1, {'a' * 32, 'c' * 32}), {'a' * 32})
+
+    def test_stored_files_are_served_as_downloads(self):
+        stored = self.transfer('page.html', b'<script>alert(1)</script>')['file']
+        response = serve_clipboard_file(RequestFactory().get('/'), Path(stored).name)
+        response.close()
+        self.assertEqual(response['Content-Disposition'], 'attachment')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertNotIn('html', response['Content-Type'])
+
+
+class BeamTokenRoleTests(TestCase):
+    """
+    Beam tokens carry the current role of the user they are rendered for.
+    """
+
+    def setUp(self):
+        # Roles are cached per beam pk, which the test database reuses.
+        cache.clear()
+        get_role_resolver().clear_local()
+        self.owner = User.objects.create_user('owner')
+        self.user = User.objects.create_user('alice')
+        self.other = User.objects.create_user('bob')
+        self.beam = Beam.objects.create(beam_id='beam', beam_key='key', user=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def my_share_token(self):
+        share = self.client.get('/api/beams/my-shares/').json()['my_shared_beams'][0]
+        return share['beam']['beam_token'] and verify_beam_token(share['beam']['beam_token'], 'beam')
+
+    def test_tokens_follow_the_sharers_current_role(self):
+        own = BeamShare.objects.create(beam=self.beam, shared_by=self.owner, shared_with=self.user, share_type='admin')
+        BeamShare.objects.create(beam=self.beam, shared_by=self.user, shared_with=self.other, share_type='write')
+        self.assertEqual(self.my_share_token()['role'], 'write')
+        self.assertEqual(self.my_share_token()['issued_to'], self.user.pk)
+
+        own.share_type = 'read'
+        own.save()
+        self.assertEqual(self.my_share_token()['role'], 'read')
+
+        own.delete()
+        self.assertIsNone(self.my_share_token())
+
+    def test_shared_with_me_tokens_carry_the_share_type(self):
+        BeamShare.objects.create(beam=self.beam, shared_by=self.owner, shared_with=self.user, share_type='read')
+        share = self.client.get('/api/beams/shared-with-me/').json()['shared_beams'][0]
+        claims = verify_beam_token(share['beam']['beam_token'], 'beam')
+        self.assertEqual((claims['role'], claims['issued_to']), ('read', self.user.pk))
+
+    def test_default_lifetime_is_a_day(self):
+        claims = verify_beam_token(issue_beam_token('beam', self.beam.pk), 'beam')
+        self.assertAlmostEqual(claims['expires_at'] - time.time(), 24 * 3600, delta=60)
+
+
+class TokenSocket(BeamConsumer):
+    # Just enough of a socket to join and follow beam changes.
+
+    def __init__(self, beam_id):
+        super().__init__()
+        self.scope = {'user': AnonymousUser()}
+        self.beam_id = beam_id
+        self.token = None
+        self.closed = False
+
+    async def deny(self, res_type):
+        pass
+
+    async def close(self, code=None, reason=None):
+        self.closed = True
+
+
+# Share changes broadcast beam.changed once committed.
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class BeamTokenSocketTests(TransactionTestCase):
+    """
+    Sockets that joined with a token lose what its issuer loses.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_role_resolver().clear_local()
+        owner = User.objects.create_user('owner')
+        self.user = User.objects.create_user('alice')
+        self.beam = Beam.objects.create(beam_id='beam', beam_key='key', user=owner)
+        self.share = BeamShare.objects.create(beam=self.beam, shared_by=owner, shared_with=self.user, share_type='write')
+
+    def join(self, role='write'):
+        socket = TokenSocket('beam')
+        token = issue_beam_token('beam', self.beam.pk, role, self.user.pk)
+        self.assertTrue(async_to_sync(socket.auth_connection)(token))
+        return socket
+
+    def change_share(self, share_type=None):
+        if share_type is None:
+            self.share.delete()
+        else:
+            self.share.share_type = share_type
+            self.share.save()
+
+    def test_revoked_issuer_closes_the_socket(self):
+        socket = self.join()
+        self.change_share()
+        async_to_sync(socket.beam_changed)({'deleted': False})
+        self.assertTrue(socket.closed)
+
+    def test_demoted_issuer_makes_the_socket_read_only(self):
+        socket = self.join()
+        self.change_share('read')
+        async_to_sync(socket.beam_changed)({'deleted': False})
+        self.assertFalse(socket.closed)
+        self.assertEqual(socket.role, 'read')
+
+    def test_tokens_grant_no_more_than_they_carry(self):
+        self.change_share('admin')
+        self.assertEqual(self.join('read').role, 'read')
+
+    def test_revoked_issuers_tokens_cannot_join(self):
+        self.change_share()
+        token = issue_beam_token('beam', self.beam.pk, 'write', self.user.pk)
+        self.assertFalse(async_to_sync(TokenSocket('beam').auth_connection)(token))
+
+
+class HybridChannelLayerTests(SimpleTestCase):
+    """
+    Local members stay in their groups until they leave, whatever state
+    their receive buffers are in. The Redis half of group_send() is
+    patched out.
+    """
+
+    def send_twice(self, receiving):
+        async def run():
+            layer = HybridChannelLayer()
+            channel = await layer.new_channel()
+            await layer.group_add('beam', channel)
+            if receiving:
+                # A consumer on this loop took its last buffered message
+                # and is still handling it, so it has no buffer.
+                layer.receive_event_loop = asyncio.get_running_loop()
+            for _ in range(2):
+                await layer.group_send('beam', {'type': 'beam.frame'})
+            return layer, channel
+
+        with patch.object(RedisChannelLayer, 'group_add'), patch.object(RedisChannelLayer, 'group_send') as redis_send:
+            layer, channel = async_to_sync(run)()
+        self.assertEqual(set(layer.local_groups['beam']), {channel})
+        return layer.receive_buffer.get(channel), redis_send
+
+    def test_members_without_a_buffer_get_one(self):
+        buffer, _ = self.send_twice(receiving=True)
+        self.assertEqual(buffer.qsize(), 2)
+
+    def test_members_out_of_reach_are_sent_through_redis(self):
+        buffer, redis_send = self.send_twice(receiving=False)
+        self.assertIsNone(buffer)
+        self.assertEqual(redis_send.call_count, 2)
+
+    def test_members_with_messages_in_redis_get_the_next_ones_in_order(self):
+        async def run():
+            layer = HybridChannelLayer()
+            channel = await layer.new_channel()
+            await layer.group_add('beam', channel)
+            # Sent while the consumer wasn't receiving: through Redis.
+            await layer.group_send('beam', {'type': 'beam.frame', 'n': 1})
+            layer.receive_event_loop = asyncio.get_running_loop()
+            # Buffering this one would hand it over before the first.
+            await layer.group_send('beam', {'type': 'beam.frame', 'n': 2})
+            self.assertNotIn(channel, layer.receive_buffer)
+            for n in (1, 2):
+                with patch.object(RedisChannelLayer, 'receive_single', return_value=(channel, {'n': n})):
+                    await layer.receive_single(layer.non_local_name(channel))
+            # Both popped: back to memory.
+            await layer.group_send('beam', {'type': 'beam.frame', 'n': 3})
+            return layer.receive_buffer[channel].get_nowait()
+
+        with patch.object(RedisChannelLayer, 'group_add'), patch.object(RedisChannelLayer, 'group_send') as redis_send:
+            self.assertEqual(async_to_sync(run)()['n'], 3)
+        self.assertEqual(redis_send.call_count, 3)
+
+    def test_local_members_expire_with_the_group(self):
+        async def run():
+            layer = HybridChannelLayer(group_expiry=60)
+            channel = await layer.new_channel()
+            await layer.group_add('beam', channel)
+            layer.local_groups['beam'][channel] -= 61
+            layer.receive_event_loop = asyncio.get_running_loop()
+            await layer.group_send('beam', {'type': 'beam.frame'})
+            return layer, channel
+
+        with patch.object(RedisChannelLayer, 'group_add'), patch.object(RedisChannelLayer, 'group_send'):
+            layer, channel = async_to_sync(run)()
+        self.assertNotIn('beam', layer.local_groups)
+        self.assertNotIn(channel, layer.receive_buffer)
+
+
+class PresenceTests(SimpleTestCase):
+    """
+    Reads leave expired members out without removing them; only prune()
+    removes them and moves the version, for its caller to announce.
+    """
+
+    def test_reads_do_not_prune(self):
+        presence = InMemoryPresenceBackend(ttl=60)
+        async_to_sync(presence.join)('beam', 'gone', {'client_id': 'gone'})
+        version = async_to_sync(presence.join)('beam', 'here', {'client_id': 'here'})
+        member, _ = presence.beams['beam']['gone']
+        presence.beams['beam']['gone'] = (member, time.time() - 1)
+
+        self.assertEqual(async_to_sync(presence.snapshot)('beam'), ([{'client_id': 'here'}], version))
+        self.assertEqual(async_to_sync(presence.count)('beam'), 1)
+        self.assertEqual(async_to_sync(presence.prune)('beam'), [('gone', version + 1)])
+
+
+class RecordingWriter(ClipboardWriter):
+    # Records the batches it would save.
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append(batch)
+
+
+class ClipboardWriterQueueTests(SimpleTestCase):
+
+    def run_writer(self, writer, pastes, wait=0.05):
+        async def run():
+            for paste in pastes:
+                await writer.add(paste)
+            await asyncio.sleep(wait)
+            writer._task.cancel()
+        async_to_sync(run)()
+        return writer.batches
+
+    def test_full_batches_flush_at_once(self):
+        writer = RecordingWriter(flush_size=3, flush_interval=60)
+        # A flush drains the queue in batches of flush_size.
+        self.assertEqual(self.run_writer(writer, range(7)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_partial_batches_flush_after_the_interval(self):
+        writer = RecordingWriter(flush_size=50, flush_interval=0.01)
+        self.assertEqual(self.run_writer(writer, range(2)), [[0, 1]])
+
+    def test_a_full_backlog_flushes_inline(self):
+        writer = RecordingWriter(flush_size=50, flush_interval=60, max_backlog=2)
+        self.assertEqual(self.run_writer(writer, range(3), wait=0), [[0, 1]])
+        self.assertEqual(list(writer.pending), [2])
+
+    def test_flush_sync_saves_whatever_is_left(self):
+        writer = RecordingWriter(flush_size=2)
+        writer.pending.extend(range(3))
+        writer.flush_sync()
+        self.assertEqual(writer.batches, [[0, 1], [2]])
+
+
+class FlakyWriter(ClipboardWriter):
+    # Fails every save that includes a note titled "bad".
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.saves = 0
+
+    def save(self, batch):
+        self.saves += 1
+        if any(note.title == 'bad' for note in batch):
+            raise ValueError("bad note")
+        super().save(batch)
+
+
+class ClipboardWriterSaveTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.beam = Beam.objects.create(beam_id='beam', beam_key='key', user=self.user)
+
+    def paste(self, title):
+        return Note(user=self.user, beam=self.beam, title=title, content=title, note_type='text')
+
+    def test_a_failing_batch_is_retried_then_saved_note_by_note(self):
+        writer = FlakyWriter(retries=1)
+        with self.assertLogs('beam.writer', 'WARNING') as logs:
+            writer.write([self.paste('first'), self.paste('bad'), self.paste('last')])
+        # Two tries of the batch, then one per note.
+        self.assertEqual(writer.saves, 5)
+        self.assertEqual(sorted(Note.objects.values_list('title', flat=True)), ['first', 'last'])
+        self.assertEqual(sum(record.levelname == 'ERROR' for record in logs.records), 1)
+
+
+class RoleResolverLocalCacheTests(SimpleTestCase):
+
+    def test_forget_local_drops_one_beams_entries(self):
+        resolver = RoleResolver(local_size=100)
+        for beam_pk in (1, 2):
+            for user_id in range(3):
+                resolver.set_local(beam_pk, user_id, 'read')
+        resolver.forget_local(1)
+        self.assertEqual(resolver.get_local(1, 0), (False, None))
+        self.assertEqual(resolver.get_local(2, 0), (True, 'read'))
+        self.assertEqual(resolver.local_count, 3)
+
+    def test_least_recently_used_beams_are_evicted_whole(self):
+        resolver = RoleResolver(local_size=4)
+        for beam_pk in (1, 2, 3):
+            resolver.set_local(beam_pk, 1, 'read')
+            resolver.set_local(beam_pk, 2, 'read')
+        self.assertEqual(list(resolver.local), [2, 3])
+        self.assertEqual(resolver.local_count, 4)
+
+
+class PruneClipboardFilesTests(TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        settings = override_settings(MEDIA_ROOT=temp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = Path(temp.name) / 'clipboard'
+        self.directory.mkdir()
+
+    def stored(self, name, hours_old):
+        path = self.directory / name
+        path.write_bytes(b'x')
+        stamp = time.time() - hours_old * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_only_old_unreferenced_files_are_deleted(self):
+        user = User.objects.create_user('alice')
+        kept = self.stored('kept.png', 48)
+        Note.objects.create(user=user, title='kept', attachment='clipboard/kept.png', note_type='image')
+        orphan = self.stored('orphan.png', 48)
+        recent = self.stored('recent.png', 1)
+
+        call_command('prune_clipboard_files', hours=24, stdout=StringIO())
+
+        self.assertTrue(kept.exists())
+        self.assertFalse(orphan.exists())
+        self.assertTrue(recent.exists())
+
+
+class RateLimitTests(SimpleTestCase):
+
+    def test_buckets_allow_a_burst_then_refill_at_the_rate(self):
+        with patch('beam.ratelimit.time.monotonic', return_value=100.0) as clock:
+            bucket = TokenBucket(rate=2, burst=3)
+            self.assertEqual([bucket.take() for _ in range(4)], [True, True, True, False])
+            clock.return_value = 100.5
+            self.assertEqual([bucket.take() for _ in range(2)], [True, False])
+            # Refills never go past the burst.
+            clock.return_value = 200.0
+            self.assertEqual(sum(bucket.take() for _ in range(5)), 3)
+
+    def test_unlisted_types_share_the_default_bucket(self):
+        limits = RateLimits({"default": (0, 2), "share_clipboard": (0, 1)})
+        self.assertTrue(limits.allow("made_up"))
+        self.assertTrue(limits.allow("another_one"))
+        self.assertFalse(limits.allow("third"))
+        self.assertTrue(limits.allow("share_clipboard"))
+        self.assertFalse(limits.allow("share_clipboard"))
+
+    def test_without_a_default_unlisted_types_are_unlimited(self):
+        limits = RateLimits({"share_clipboard": (0, 1)})
+        self.assertTrue(all(limits.allow("ping") for _ in range(100)))
+
+    def test_beam_buckets_are_shared_and_evicted_least_recently_used(self):
+        limits = BeamRateLimits({"default": (0, 1)}, max_beams=2)
+        self.assertTrue(limits.allow("a", "ping"))
+        self.assertFalse(limits.allow("a", "pong"))
+        limits.allow("b", "ping")
+        limits.allow("c", "ping")
+        self.assertEqual(list(limits.beams), ["b", "c"])
+        # "a" was evicted, so it starts over with a full bucket.
+        self.assertTrue(limits.allow("a", "ping"))
+
+
+class FrameSocket(BeamConsumer):
+    # Records what beam_frame() would send.
+
+    def __init__(self):
+        super().__init__()
+        self.beam_id = 'beam'
+        self.client_id = 'me'
+        self.codec = JsonCodec()
+        self.max_lag = 2.0
+        self.presence_stale = False
+        self.rate_limits = RateLimits({"default": (0, 1)})
+        self.beam_rate_limits = BeamRateLimits({"share_clipboard": (0, 1)})
+        self.sent = []
+
+    async def send_frame(self, frame):
+        self.sent.append(frame)
+
+    async def send_presence_snapshot(self):
+        self.presence_stale = False
+        self.sent.append('snapshot')
+
+
+class BackpressureTests(SimpleTestCase):
+
+    def deliver(self, socket, kind, age, skip=None):
+        event = {"skip": skip, "kind": kind, "sent_at": time.time() - age, "frames": {JSON: kind}}
+        async_to_sync(socket.beam_frame)(event)
+
+    def test_lagging_sockets_drop_transient_frames_but_not_clipboards(self):
+        socket = FrameSocket()
+        self.deliver(socket, "mouse_move", age=5)
+        self.deliver(socket, "rec_clipboard", age=5)
+        self.deliver(socket, "mouse_move", age=0)
+        self.assertEqual(socket.sent, ["rec_clipboard", "mouse_move"])
+
+    def test_lagging_presence_is_coalesced_into_one_snapshot(self):
+        socket = FrameSocket()
+        self.deliver(socket, "presence_join", age=5)
+        self.deliver(socket, "presence_leave", age=5)
+        self.deliver(socket, "rec_clipboard", age=0)
+        self.deliver(socket, "presence_join", age=0)
+        self.assertEqual(socket.sent, ["snapshot", "rec_clipboard", "presence_join"])
+
+    def test_senders_skip_their_own_frames(self):
+        socket = FrameSocket()
+        self.deliver(socket, "rec_clipboard", age=0, skip='me')
+        self.assertEqual(socket.sent, [])
+
+    def test_allow_checks_the_socket_then_the_beam(self):
+        socket = FrameSocket()
+        self.assertTrue(socket.allow("share_clipboard"))
+        # The socket's default bucket is empty now.
+        self.assertFalse(socket.allow("ping"))
+        socket.rate_limits = RateLimits({})
+        # And the beam's share_clipboard bucket too.
+        self.assertFalse(socket.allow("share_clipboard"))
+        self.assertTrue(socket.allow("ping"))
+
+
+class RelaySocket(FrameSocket):
+    # A joined writer whose broadcasts are recorded instead of sent.
+
+    def __init__(self):
+        super().__init__()
+        self.role = 'write'
+        self.rate_limits = RateLimits({})
+        self.broadcasts = []
+
+    async def broadcast(self, message, skip=None):
+        self.broadcasts.append(message)
+
+
+class RelayTests(SimpleTestCase):
+
+    def test_clients_cannot_send_server_types(self):
+        socket = RelaySocket()
+        for res_type in ("rec_clipboard", "presence_join", "authed_users", "beam_deleted", "clipboard_replay"):
+            async_to_sync(socket.handle_message)({"type": res_type, "message": "forged"})
+        self.assertEqual(socket.broadcasts, [])
+        self.assertEqual(
+            [JsonCodec().decode(frame)["type"] for frame in socket.sent],
+            ["invalid_frame"] * 5
+        )
+
+    def test_other_types_are_relayed(self):
+        socket = RelaySocket()
+        async_to_sync(socket.handle_message)({"type": "cursor", "message": [1, 2]})
+        self.assertEqual(socket.broadcasts, [{"type": "cursor", "message": [1, 2], "extra": None}])
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    BEAM_RATE_LIMITS={},
+)
+class MultiplexTests(SimpleTestCase):
+    """
+    ws/beams/: one socket subscribed to several beams.
+    """
+
+    def setUp(self):
+        for name, backend in (('get_presence_backend', InMemoryPresenceBackend), ('get_replay_backend', InMemoryReplayBackend)):
+            patcher = patch(f'beam.consumers.{name}', return_value=backend())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(BeamMultiplexConsumer.as_asgi(), "/ws/beams/")
+        communicator.scope["user"] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def subscribe(self, communicator, beam_id, beam_pk):
+        await communicator.send_json_to({"type": "subscribe", "beam": beam_id, "message": issue_beam_token(beam_id, beam_pk)})
+        return await self.receive_until(communicator, ("auth_success", "auth_failed", "unsubscribed"))
+
+    async def receive_until(self, communicator, types):
+        while True:
+            message = await communicator.receive_json_from(timeout=1)
+            if message["type"] in types:
+                return message
+
+    async def test_frames_reach_only_the_beam_they_name(self):
+        sender, listener = await self.connect(), await self.connect()
+        await self.subscribe(sender, "a", 1)
+        await self.subscribe(sender, "b", 2)
+        await self.subscribe(listener, "b", 2)
+
+        await sender.send_json_to({"type": "share_clipboard", "beam": "a", "message": "for a", "extra": "text"})
+        await sender.send_json_to({"type": "share_clipboard", "beam": "b", "message": "for b", "extra": "text"})
+        message = await self.receive_until(listener, ("rec_clipboard",))
+        self.assertEqual((message["beam"], message["message"]), ("b", "for b"))
+        await sender.disconnect()
+        await listener.disconnect()
+
+    async def test_unsubscribed_beams_refuse_frames(self):
+        communicator = await self.connect()
+        await self.subscribe(communicator, "a", 1)
+        await communicator.send_json_to({"type": "unsubscribe", "beam": "a", "message": None})
+        await self.receive_until(communicator, ("unsubscribed",))
+        await communicator.send_json_to({"type": "share_clipboard", "beam": "a", "message": "late", "extra": "text"})
+        message = await self.receive_until(communicator, ("permission_denied",))
+        self.assertEqual(message["beam"], "a")
+        await communicator.disconnect()
+
+    @override_settings(BEAM_RATE_LIMITS={"connection": {"auth": (0, 1)}})
+    async def test_subscriptions_that_never_joined_are_dropped(self):
+        communicator = await self.connect()
+        self.assertEqual((await self.subscribe(communicator, "a", 1))["type"], "auth_success")
+        # Rate limited: the auth never ran, so the slot is given back.
+        self.assertEqual(await self.subscribe(communicator, "b", 2), {"type": "unsubscribed", "beam": "b"})
+        await communicator.send_json_to({"type": "share_clipboard", "beam": "b", "message": "x", "extra": "text"})
+        self.assertEqual((await self.receive_until(communicator, ("permission_denied",)))["beam"], "b")
+        await communicator.disconnect()
+
+
+@patch('time.time', return_value=1700000000.0)
+class BeamShareRowsTests(TestCase):
+    """
+    BeamShareRows renders exactly what BeamShareSerializer does, tokens
+    included (the clock is fixed so they are signed alike).
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_role_resolver().clear_local()
+        self.owner = User.objects.create_user('owner', first_name='Olive')
+        Profile.objects.filter(user=self.owner).update(profile_picture='profile_images/owner.png')
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        for i, share_type in enumerate(('read', 'write', 'admin')):
+            beam = Beam.objects.create(beam_id=f'rows{i}', beam_key='key', beam_name=f'Beam {i}', user=self.owner)
+            BeamShare.objects.create(beam=beam, shared_by=self.owner, shared_with=self.alice, share_type=share_type)
+        # Shared onwards by alice, who administers it.
+        BeamShare.objects.create(beam=beam, shared_by=self.alice, shared_with=self.bob, share_type='read')
+
+    def rendered(self, user, queryset, **kwargs):
+        request = RequestFactory().get('/api/beams/')
+        request.user = user
+        queryset = queryset.order_by('created_at')
+        shares = queryset.annotate(requester_role=BeamShareRows.requester_role(user))
+        rows = BeamShareRows(request, **kwargs).render_many(shares.values(*BeamShareRows.columns, 'requester_role'))
+        serializer = BeamShareSerializer(
+            queryset.select_related('beam__user__profile', 'shared_by__profile', 'shared_with__profile'),
+            many=True, context={'request': request}
+        )
+        return rows, serializer.data
+
+    def test_shared_with_me(self, _):
+        rows, data = self.rendered(self.alice, BeamShare.objects.filter(shared_with=self.alice), shared_with=True)
+        self.assertEqual(rows, data)
+        self.assertTrue(all(share['beam']['beam_token'] for share in rows))
+
+    def test_my_shares(self, _):
+        for user in (self.owner, self.alice):
+            rows, data = self.rendered(user, BeamShare.objects.filter(shared_by=user))
+            self.assertEqual(rows, data)
@@ -0,0 +1,69 @@
+import time
+from django.conf import settings
+from django.core import signing
+
+SALT = 'beam.tokens'
+# Roles a token can carry; ownership and share management are always
+# checked against the database.
+TOKEN_ROLES = ('write', 'read')
+
+
+class BeamTokenError(Exception):
+    pass
+
+
+def get_token_keys():
+    """
+    Signing keys, newest first. New tokens are signed with the first key
+    and tokens signed with any of them verify, so a key is rotated by
+    prepending its replacement and dropped once the longest-lived token
+    it signed has expired. Defaults to SECRET_KEY and
+    SECRET_KEY_FALLBACKS.
+    """
+    keys = getattr(settings, "BEAM_TOKENS", {}).get("keys")
+    return keys or [settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+
+
+def token_role(role):
+    # Shares' admin and the owner post like write; read stays read.
+    return 'read' if role == 'read' else 'write'
+
+
+def issue_beam_token(beam_id, beam_pk, role='write', issued_to=None, ttl=None):
+    """
+    A signed, expiring token granting `role` in a beam to whoever holds
+    it, e.g. a device that scans the beam's QR code.
+
+    `issued_to` is the user the token was minted for: it never grants
+    more than that user's current role, which BeamConsumer rechecks when
+    a socket joins and whenever the beam's shares change. Tokens without
+    one, like those for ownerless beams, last until they expire.
+    """
+    if ttl is None:
+        ttl = getattr(settings, "BEAM_TOKENS", {}).get("ttl", 24 * 3600)
+    keys = get_token_keys()
+    return signing.dumps(
+        {"b": beam_id, "p": beam_pk, "r": token_role(role), "u": issued_to, "e": int(time.time() + ttl)},
+        key=keys[0], salt=SALT
+    )
+
+
+def verify_beam_token(token, beam_id):
+    """
+    The claims of a token for `beam_id`: {"beam_pk", "role", "issued_to",
+    "expires_at"}.
+    Checking it is CPU-only; raises BeamTokenError when the token is
+    malformed, forged, expired or for another beam.
+    """
+    if not isinstance(token, str) or not token:
+        raise BeamTokenError("No beam token.")
+    keys = get_token_keys()
+    try:
+        claims = signing.loads(token, key=keys[0], fallback_keys=keys[1:], salt=SALT)
+    except signing.BadSignature:
+        raise BeamTokenError("Invalid beam token.")
+    if claims.get("b") != beam_id or claims.get("r") not in TOKEN_ROLES:
+        raise BeamTokenError("Token is for another beam.")
+    if claims.get("e", 0) < time.time():
+        raise BeamTokenError("Beam token expired.")
+    return {"beam_pk": claims["p"], "role": claims["r"], "issued_to": claims.get("u"), "expires_at": claims["e"]}
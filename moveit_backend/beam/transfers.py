@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TRANSFER_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Extensions a stored transfer keeps: media and documents browsers do not
+# run. Anything else, e.g. .html or .svg, is stored without an extension
+# so it can never be served as a page on the site's origin.
+SAFE_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.ico', '.heic', '.avif',
+    '.mp3', '.wav', '.ogg', '.oga', '.m4a', '.aac', '.flac', '.opus',
+    '.mp4', '.webm', '.mov', '.mkv', '.avi', '.ogv',
+    '.txt', '.md', '.csv', '.pdf', '.zip', '.gz', '.tar', '.7z',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp',
+}
+
+
+def stored_extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return extension if extension in SAFE_EXTENSIONS else ''
+
+
+class TransferError(Exception):
+    pass
+
+
+class TransferStore:
+    """
+    On-disk state of chunked clipboard transfers (see BeamConsumer).
+
+    Every transfer is a `<id>.part` file holding the bytes received so far
+    and a `<id>.json` file describing it, under `root/<beam pk>/`. The
+    part file's size is the resume offset, so a client that reconnects,
+    even to another worker sharing `root`, continues where it stopped.
+    Transfers idle for longer than `max_age` seconds are discarded.
+
+    A beam has at most `max_open_per_beam` transfers in progress, and
+    BeamConsumer lets each socket run `max_open_per_socket` of them, so
+    partial uploads can't fill the disk.
+    """
+
+    def __init__(self, root, max_size=50 * 1024 * 1024, chunk_size=256 * 1024, window=4, max_age=3600,
+                 max_open_per_beam=8, max_open_per_socket=2):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.window = window
+        self.max_age = max_age
+        self.max_open_per_beam = max_open_per_beam
+        self.max_open_per_socket = max_open_per_socket
+        # Serializes writes where fcntl is missing; see lock().
+        self.write_lock = threading.Lock()
+
+    def paths(self, beam_pk, transfer_id):
+        if not TRANSFER_ID.match(transfer_id or ''):
+            raise TransferError("transfer_id must be 32 lowercase hex digits.")
+        directory = self.root / str(beam_pk)
+        return directory / f"{transfer_id}.part", directory / f"{transfer_id}.json"
+
+    def load(self, beam_pk, transfer_id):
+        part, meta = self.paths(beam_pk, transfer_id)
+        try:
+            info = json.loads(meta.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        info['received'] = part.stat().st_size if part.exists() else 0
+        return info
+
+    def start(self, beam_pk, transfer_id, size, name, content_type, user_id):
+        """
+        Open a transfer, or return the existing one with the same id so
+        its client can resume.
+        """
+        self.prune(beam_pk)
+
+        info = self.load(beam_pk, transfer_id)
+        if info is not None:
+            if info['user_id'] != user_id or info['size'] != size:
+                raise TransferError("A different transfer already uses this id.")
+            return info
+
+        if not isinstance(size, int) or size <= 0:
+            raise TransferError("size must be a positive number of bytes.")
+        if size > self.max_size:
+            raise TransferError(f"Transfers are limited to {self.max_size} bytes.")
+
+        try:
+            name = get_valid_filename(os.path.basename(str(name or transfer_id)))[:200]
+        except SuspiciousFileOperation:
+            name = transfer_id
+
+        part, meta = self.paths(beam_pk, transfer_id)
+        if len(list(part.parent.glob('*.part'))) >= self.max_open_per_beam:
+            raise TransferError("This beam has too many transfers in progress.")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        part.touch()
+        info = {
+            'size': size,
+            'name': name,
+            'content_type': content_type,
+            'user_id': user_id,
+        }
+        meta.write_text(json.dumps(info))
+        info['received'] = 0
+        return info
+
+    @contextmanager
+    def lock(self, f):
+        """
+        Exclusive lock on an open part file: with fcntl it also holds off
+        other processes sharing `root`, without it other threads only.
+        """
+        if fcntl is None:
+            with self.write_lock:
+                yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    def open_part(self, part, mode):
+        # Never creates the file: a finished or pruned transfer stays gone.
+        try:
+            fd = os.open(part, (os.O_WRONLY | os.O_APPEND) if mode == 'ab' else os.O_RDONLY)
+        except FileNotFoundError:
+            raise TransferError("Unknown transfer.")
+        return os.fdopen(fd, mode, buffering=0)
+
+    def write(self, beam_pk, transfer_id, offset, data):
+        """
+        Append `data` at `offset` and return the transfer's info with the
+        updated `received` count.
+
+        Chunks must arrive in order. A chunk that was already stored, e.g.
+        resent after a reconnect, is acknowledged without being written.
+        The offset is checked against the part file's size under lock(),
+        so two sockets sending the same chunk cannot both append it.
+        """
+        info = self.load(beam_pk, transfer_id)
+        if info is None:
+            raise TransferError("Unknown transfer.")
+
+        part, meta = self.paths(beam_pk, transfer_id)
+        with self.open_part(part, 'ab') as f, self.lock(f):
+            received = os.fstat(f.fileno()).st_size
+            if offset + len(data) <= received:
+                info['received'] = received
+                return info
+            if offset != received:
+                raise TransferError(f"Expected the chunk at offset {received}.")
+            if received + len(data) > info['size']:
+                raise TransferError("Chunk goes past the declared size.")
+            f.write(data)
+        # Keeps an active transfer from being pruned as idle.
+        os.utime(meta)
+        info['received'] = received + len(data)
+        return info
+
+    def finish(self, beam_pk, transfer_id):
+        """
+        Move a complete transfer into default storage and return its
+        info with the stored file name.
+
+        Files are stored under the sha256 of their bytes, so pasting the
+        same file again reuses the stored copy.
+        """
+        info = self.load(beam_pk, transfer_id)
+        if info is None or info['received'] != info['size']:
+            raise TransferError("Transfer is not complete.")
+
+        part, meta = self.paths(beam_pk, transfer_id)
+        with self.open_part(part, 'rb') as f, self.lock(f):
+            if os.fstat(f.fileno()).st_nlink == 0:
+                # Another socket finished it while we waited for the lock.
+                raise TransferError("Transfer is not complete.")
+            digest = hashlib.sha256()
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+            name = f"clipboard/{digest.hexdigest()}{stored_extension(info['name'])}"
+            if default_storage.exists(name):
+                info['file'] = name
+            else:
+                f.seek(0)
+                info['file'] = default_storage.save(name, File(f))
+            part.unlink()
+            meta.unlink()
+        return info
+
+    def still_open(self, beam_pk, transfer_ids):
+        return {transfer_id for transfer_id in transfer_ids if self.paths(beam_pk, transfer_id)[0].exists()}
+
+    def prune(self, beam_pk):
+        directory = self.root / str(beam_pk)
+        if not directory.is_dir():
+            return
+        cutoff = time.time() - self.max_age
+        for path in directory.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+
+
+def get_transfer_store():
+    global _store
+    if _store is None:
+        _store = TransferStore(**settings.BEAM_TRANSFERS)
+    return _store
@@ -3,6 +3,8 @@ from .views import (
     GenerateBeamView,
     ZeroXZeroUploadView,
     get_user_beams_view,
+    beam_presence_view,
+    beam_metrics_view,
     share_beam_view,
     get_shared_beams_view,
     get_my_shared_beams_view,
@@ -14,6 +16,8 @@ urlpatterns = [
     path('create/', GenerateBeamView.as_view(), name='create_beam'),
     path('upload/', ZeroXZeroUploadView.as_view(), name='upload_file'),
     path('', get_user_beams_view, name='get_user_beams'),
+    path('presence/<str:beam_id>/', beam_presence_view, name='beam_presence'),
+    path('metrics/', beam_metrics_view, name='beam_metrics'),
     path('share/', share_beam_view, name='share_beam'),
     path('shared-with-me/', get_shared_beams_view, name='get_shared_beams'),
     path('my-shares/', get_my_shared_beams_view, name='get_my_shared_beams'),
@@ -1,26 +1,38 @@
-import time
+import asyncio
 import uuid
 import secrets
+import weakref
+from pathlib import Path
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authentication import SessionAuthentication
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from .models import Beam, BeamShare
-from .serializers import BeamSerializer, BeamShareSerializer, CreateBeamShareSerializer
+from .serializers import BeamSerializer, BeamShareSerializer, BeamShareRows, CreateBeamShareSerializer
+from note.pagination import CreatedKeysetPagination
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.http import JsonResponse, HttpResponse, Http404
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.views import APIView
-from rest_framework.response import Response
+from django.conf import settings
+from django.views import View
+from django.views.static import serve
 from rest_framework import status
+from asgiref.sync import async_to_sync, sync_to_async
+from django.utils.http import parse_header_parameters
+from .permissions import OWNER, MANAGE_ROLES, get_beam_role
+from .presence import get_presence_backend
+from .metrics import metrics
 import httpx
 
 # Create your views here.
 
+# Everything BeamShareSerializer renders, joined in one query.
+SHARE_RELATED = ('beam__user__profile', 'shared_by__profile', 'shared_with__profile')
+
 @method_decorator(csrf_exempt, name='dispatch')
 class GenerateBeamView(APIView):
     authentication_classes = []
@@ -36,120 +48,217 @@ class GenerateBeamView(APIView):
 
         return Response(serializer.data)
 
+_upload_clients = weakref.WeakKeyDictionary()
+
+def get_upload_client():
+    # One pooled client per event loop; under Daphne that is one per worker.
+    loop = asyncio.get_running_loop()
+    if loop not in _upload_clients:
+        _upload_clients[loop] = httpx.AsyncClient(
+            headers={'User-Agent': 'FriendlyUploader'},
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=5)
+        )
+    return _upload_clients[loop]
+
 @method_decorator(csrf_exempt, name='dispatch')
-class ZeroXZeroUploadView(APIView):
-    parser_classes = [MultiPartParser, FormParser]
-    
+class ZeroXZeroUploadView(View):
+    """
+    Proxies a multipart upload to 0x0.st without re-encoding it.
+
+    Under ASGI, Django spools the whole request body to a temporary file
+    (in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE) before the view runs,
+    so nothing is forwarded until the client has finished sending. The
+    view then reads that file in CHUNK_SIZE pieces in a worker thread,
+    up to the headers of the "file" part first, and forwards it as-is;
+    memory use does not depend on the file size and the event loop stays
+    free while the body is read or the upstream is slow.
+    """
+
     # FS limit (200MB)
     MAX_FILE_SIZE = 200 * 1024 * 1024
-    
-    def post(self, request):        
-        if 'file' not in request.FILES:
-            return Response({
+    CHUNK_SIZE = 1024 * 1024
+    # Form fields allowed before the "file" part.
+    MAX_PREAMBLE = 1024 * 1024
+    MAX_RETRIES = 2
+
+    async def post(self, request):
+        content_type = request.META.get('CONTENT_TYPE', '')
+        if not content_type.startswith('multipart/form-data'):
+            return JsonResponse({
                 'error': 'No file provided'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        uploaded_file = request.FILES['file']
-        file_size = uploaded_file.size
-        
+
+        try:
+            file_size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            file_size = 0
+        if not file_size:
+            return JsonResponse({
+                'error': 'No file provided'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         if file_size > self.MAX_FILE_SIZE:
-            return Response({
+            return JsonResponse({
                 'error': 'File too large',
                 'details': f'File size {self.human_readable_size(file_size)} exceeds maximum allowed size of {self.human_readable_size(self.MAX_FILE_SIZE)}',
                 'max_size': self.human_readable_size(self.MAX_FILE_SIZE)
             }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
-        
+
         timeout_seconds = max(120, 120 + (file_size // (1024 * 1024)) * 30)
-        
-        max_retries = 2
-        retry_count = 0
-        
         client_timeout = httpx.Timeout(
             connect=30.0,
             read=timeout_seconds,
             write=timeout_seconds,
             pool=60.0
         )
-        
-        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
-        
-        while retry_count <= max_retries:
+
+        read = sync_to_async(request.read, thread_sensitive=False)
+        preamble = await self.read_to_file_part(read, content_type)
+        if preamble is None:
+            return JsonResponse({
+                'error': 'No file provided'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        sent = 0
+
+        async def body():
+            nonlocal sent
+            chunk = preamble
+            while chunk:
+                sent += len(chunk)
+                yield chunk
+                chunk = await read(self.CHUNK_SIZE)
+
+        retry_count = 0
+        while True:
             try:
-                uploaded_file.seek(0)
-                
-                with httpx.Client(timeout=client_timeout, limits=limits) as client:
-                    files = {
-                        'file': (
-                            uploaded_file.name,
-                            uploaded_file,
-                            uploaded_file.content_type
-                        )
-                    }
-                    headers = {'User-Agent': 'FriendlyUploader'}
-                    
-                    response = client.post(
-                        'https://0x0.st',
-                        files=files,
-                        headers=headers
-                    )
-                
+                response = await get_upload_client().post(
+                    settings.ZEROXZERO_UPLOAD_URL,
+                    content=body(),
+                    headers={
+                        'Content-Type': content_type,
+                        'Content-Length': str(file_size)
+                    },
+                    timeout=client_timeout
+                )
                 break
-                
-            except (httpx.TimeoutException, httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout) as e:
+
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # The body can only be replayed if none of it was sent yet.
                 retry_count += 1
-                if retry_count > max_retries:
-                    raise e
-                time.sleep(2 ** retry_count)
-                continue
+                if retry_count > self.MAX_RETRIES or sent:
+                    return JsonResponse({
+                        'error': 'Connection error',
+                        'details': f'Could not connect to 0x0.st after {retry_count} attempts. The service might be temporarily unavailable.',
+                        'suggestion': 'Please try again in a few minutes'
+                    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                await asyncio.sleep(2 ** retry_count)
 
-        try:
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get('Content-Type', 'text/plain')
-            )
-            
-        except (httpx.TimeoutException, httpx.ReadTimeout, httpx.WriteTimeout):
-            return Response({
-                'error': 'Upload timeout',
-                'details': f'Upload to 0x0.st timed out after {max_retries + 1} attempts. File size: {self.human_readable_size(file_size)}',
-                'suggestion': 'Try uploading a smaller file or try again later',
-                'timeout_used': timeout_seconds
-            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
-        except (httpx.ConnectError, httpx.NetworkError):
-            return Response({
-                'error': 'Connection error',
-                'details': f'Could not connect to 0x0.st after {max_retries + 1} attempts. The service might be temporarily unavailable.',
-                'suggestion': 'Please try again in a few minutes'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        except httpx.HTTPError as e:
-            return Response({
-                'error': 'Failed to upload to external service',
-                'details': str(e),
-                'file_size': self.human_readable_size(file_size)
-            }, status=status.HTTP_502_BAD_GATEWAY)
-        except Exception as e:
-            return Response({
-                'error': 'Upload failed',
-                'details': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            except httpx.TimeoutException:
+                return JsonResponse({
+                    'error': 'Upload timeout',
+                    'details': f'Upload to 0x0.st timed out. File size: {self.human_readable_size(file_size)}',
+                    'suggestion': 'Try uploading a smaller file or try again later',
+                    'timeout_used': timeout_seconds
+                }, status=status.HTTP_504_GATEWAY_TIMEOUT)
+            except httpx.HTTPError as e:
+                return JsonResponse({
+                    'error': 'Failed to upload to external service',
+                    'details': str(e),
+                    'file_size': self.human_readable_size(file_size)
+                }, status=status.HTTP_502_BAD_GATEWAY)
+
+        return HttpResponse(
+            response.content,
+            status=response.status_code,
+            content_type=response.headers.get('Content-Type', 'text/plain')
+        )
+
+    async def read_to_file_part(self, read, content_type):
+        """
+        Read the body up to and including the headers of its "file" part.
+        Returns the bytes read, or None when the first MAX_PREAMBLE bytes
+        hold no such part.
+        """
+        boundary = parse_header_parameters(content_type)[1].get('boundary')
+        if not boundary:
+            return None
+        delimiter = b'--' + boundary.encode('latin1')
+
+        preamble = b''
+        while len(preamble) < self.MAX_PREAMBLE:
+            chunk = await read(self.CHUNK_SIZE)
+            if not chunk:
+                return None
+            preamble += chunk
+            start = preamble.find(delimiter)
+            while start != -1:
+                end = preamble.find(b'\r\n\r\n', start)
+                if end == -1:
+                    break
+                for line in preamble[start:end].split(b'\r\n')[1:]:
+                    name, _, value = line.decode('latin1').partition(':')
+                    if name.strip().lower() == 'content-disposition':
+                        params = parse_header_parameters(value)[1]
+                        if params.get('name') == 'file' and 'filename' in params:
+                            return preamble
+                start = preamble.find(delimiter, end)
+        return None
+
+    @staticmethod
+    def human_readable_size(size):
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024 or unit == 'GB':
+                return f"{size:.1f} {unit}" if unit != 'B' else f"{size} {unit}"
+            size /= 1024
+
+def serve_clipboard_file(request, path):
+    """
+    Development server for MEDIA_ROOT/clipboard, where pasted files are
+    stored. They are sent as downloads that browsers must not sniff, so
+    an uploaded page never renders on the site's origin; see "Serving
+    clipboard files" in the README for production.
+    """
+    response = serve(request, path, document_root=Path(settings.MEDIA_ROOT) / 'clipboard')
+    response['Content-Disposition'] = 'attachment'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_beams_view(request):
     try:
-        beams = Beam.objects.filter(user=request.user).order_by('-created_at')
+        paginator = CreatedKeysetPagination()
+        beams = paginator.paginate_queryset(
+            Beam.objects.filter(user=request.user).select_related('user__profile'),
+            request
+        )
         serializer = BeamSerializer(beams, many=True, context={'request': request})
         
-        return Response({
+        return paginator.get_paginated_response({
             'beams': serializer.data
         })
         
+    except NotFound:
+        raise
     except Exception as e:
         return Response({
             'detail': 'An error occurred while fetching your beams.'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def beam_presence_view(request, beam_id):
+    return Response({
+        'beam_id': beam_id,
+        'members': async_to_sync(get_presence_backend().count)(beam_id)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def beam_metrics_view(request):
+    return Response(metrics.snapshot())
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def share_beam_view(request):
@@ -170,11 +279,10 @@ def share_beam_view(request):
                 'detail': 'Beam not found.'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        if beam.user != request.user:
-            if not BeamShare.objects.filter(beam=beam, shared_with=request.user, share_type='admin').exists():
-                return Response({
-                    'detail': 'You do not have permission to share this beam.'
-                }, status=status.HTTP_403_FORBIDDEN)
+        if get_beam_role(request.user.id, beam.pk) not in MANAGE_ROLES:
+            return Response({
+                'detail': 'You do not have permission to share this beam.'
+            }, status=status.HTTP_403_FORBIDDEN)
         
         try:
             shared_with_user = User.objects.get(username=username)
@@ -208,13 +316,18 @@ def share_beam_view(request):
 @permission_classes([IsAuthenticated])
 def get_shared_beams_view(request):
     try:
-        shares = BeamShare.objects.filter(shared_with=request.user).select_related('beam', 'shared_by')
-        serializer = BeamShareSerializer(shares, many=True, context={'request': request})
+        paginator = CreatedKeysetPagination()
+        shares = paginator.paginate_queryset(
+            BeamShare.objects.filter(shared_with=request.user).values(*BeamShareRows.columns),
+            request
+        )
         
-        return Response({
-            'shared_beams': serializer.data
+        return paginator.get_paginated_response({
+            'shared_beams': BeamShareRows(request, shared_with=True).render_many(shares)
         })
         
+    except NotFound:
+        raise
     except Exception as e:
         return Response({
             'detail': 'An error occurred while fetching shared beams.'
@@ -224,13 +337,20 @@ def get_shared_beams_view(request):
 @permission_classes([IsAuthenticated])
 def get_my_shared_beams_view(request):
     try:
-        shares = BeamShare.objects.filter(shared_by=request.user).select_related('beam', 'shared_with')
-        serializer = BeamShareSerializer(shares, many=True, context={'request': request})
+        paginator = CreatedKeysetPagination()
+        shares = paginator.paginate_queryset(
+            BeamShare.objects.filter(shared_by=request.user).annotate(
+                requester_role=BeamShareRows.requester_role(request.user)
+            ).values(*BeamShareRows.columns, 'requester_role'),
+            request
+        )
         
-        return Response({
-            'my_shared_beams': serializer.data
+        return paginator.get_paginated_response({
+            'my_shared_beams': BeamShareRows(request).render_many(shares)
         })
         
+    except NotFound:
+        raise
     except Exception as e:
         return Response({
             'detail': 'An error occurred while fetching your shared beams.'
@@ -242,7 +362,7 @@ def unshare_beam_view(request, share_id):
     try:
         share = get_object_or_404(BeamShare, id=share_id)
         
-        if share.shared_by != request.user and share.beam.user != request.user:
+        if share.shared_by_id != request.user.id and get_beam_role(request.user.id, share.beam_id) != OWNER:
             return Response({
                 'detail': 'You do not have permission to remove this share.'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -262,7 +382,7 @@ def unshare_beam_view(request, share_id):
 @permission_classes([IsAuthenticated])
 def update_share_permissions_view(request, share_id):
     try:
-        share = get_object_or_404(BeamShare, id=share_id)
+        share = get_object_or_404(BeamShare.objects.select_related(*SHARE_RELATED), id=share_id)
         new_share_type = request.data.get('share_type')
         
         if not new_share_type or new_share_type not in ['read', 'write', 'admin']:
@@ -270,13 +390,13 @@ def update_share_permissions_view(request, share_id):
                 'detail': 'Valid share type is required (read, write, admin).'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        if share.shared_by != request.user and share.beam.user != request.user:
+        if share.shared_by_id != request.user.id and get_beam_role(request.user.id, share.beam_id) != OWNER:
             return Response({
                 'detail': 'You do not have permission to update this share.'
             }, status=status.HTTP_403_FORBIDDEN)
         
         share.share_type = new_share_type
-        share.save()
+        share.save(update_fields=['share_type'])
         
         return Response({
             'detail': 'Share permissions updated successfully.',
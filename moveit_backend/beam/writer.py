@@ -0,0 +1,144 @@
+import asyncio
+import atexit
+import logging
+import time
+from collections import deque
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .metrics import metrics
+from .models import Beam
+from note.dedup import collapse_repeats, hash_note
+from note.models import Note
+from note.search import prepare_note, index_notes
+from note.stats import invalidate_note_stats
+
+logger = logging.getLogger(__name__)
+
+
+class ClipboardWriter:
+    """
+    Write-behind queue for notes created from beam pastes.
+
+    Consumers broadcast a paste first and hand the unsaved Note to add();
+    a background task persists queued notes with bulk_create once
+    `flush_size` notes are waiting or `flush_interval` seconds have passed.
+    When `max_backlog` notes are pending, add() flushes inline, which slows
+    down the sending socket rather than growing the queue without bound.
+
+    A paste identical to one the same user made in the same beam less
+    than `dedup_window` seconds ago is not inserted again; the earlier
+    note's updated_at is bumped instead.
+
+    A batch that fails to save is tried again `retries` times, then note
+    by note, so a bad paste only loses itself.
+    """
+
+    def __init__(self, flush_size=50, flush_interval=0.5, max_backlog=5000, dedup_window=600, retries=1):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.dedup_window = dedup_window
+        self.retries = retries
+        self.pending = deque()
+        self._task = None
+        self._lock = None
+        self._wakeup = None
+        self._full = None
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self.run())
+
+    async def add(self, note):
+        self._ensure_running()
+        if len(self.pending) >= self.max_backlog:
+            metrics.incr("clipboard_writer.backpressure")
+            await self.flush()
+
+        self.pending.append(note)
+        metrics.gauge("clipboard_writer.queue_depth", len(self.pending))
+        self._wakeup.set()
+        if len(self.pending) >= self.flush_size:
+            self._full.set()
+
+    async def run(self):
+        while True:
+            await self._wakeup.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(self.flush_size, len(self.pending)))]
+                await database_sync_to_async(self.write)(batch)
+                metrics.gauge("clipboard_writer.queue_depth", len(self.pending))
+
+    def write(self, batch):
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                self.save(batch)
+                break
+            except Exception:
+                logger.warning("Failed to save %d clipboard notes (attempt %d).", len(batch), attempt + 1, exc_info=True)
+        else:
+            for note in batch:
+                try:
+                    self.save([note])
+                except Exception:
+                    logger.exception("Dropped clipboard note %s of user %s in beam %s.", note.pk, note.user_id, note.beam_id)
+                    metrics.incr("clipboard_writer.failed")
+        metrics.observe("clipboard_writer.flush_seconds", time.monotonic() - started)
+
+    def save(self, batch):
+        # Atomic, so a failed attempt leaves nothing behind to retry over.
+        with transaction.atomic():
+            # Skip notes whose beam was deleted while they were queued.
+            beam_pks = set(Beam.objects.filter(
+                pk__in={note.beam_id for note in batch}
+            ).values_list('pk', flat=True))
+            notes = [note for note in batch if note.beam_id in beam_pks]
+            dropped = len(batch) - len(notes)
+            # bulk_create() skips the model signals that keep search and
+            # content hashes current.
+            for note in notes:
+                hash_note(note)
+            notes, repeated = collapse_repeats(notes, self.dedup_window)
+            for note in notes:
+                prepare_note(note)
+            Note.objects.bulk_create(notes)
+            if repeated:
+                Note.objects.filter(pk__in=repeated).update(updated_at=timezone.now())
+            index_notes(notes)
+        invalidate_note_stats(*[note.user_id for note in notes])
+        metrics.incr("clipboard_writer.written", len(notes))
+        metrics.incr("clipboard_writer.deduplicated", len(batch) - dropped - len(notes))
+        metrics.incr("clipboard_writer.dropped", dropped)
+
+    def flush_sync(self):
+        # Runs at interpreter exit, after the event loop has stopped.
+        while self.pending:
+            self.write([self.pending.popleft() for _ in range(min(self.flush_size, len(self.pending)))])
+
+
+_writer = None
+
+
+def get_clipboard_writer():
+    global _writer
+    if _writer is None:
+        _writer = ClipboardWriter(**getattr(settings, "BEAM_CLIPBOARD_WRITER", {}))
+        atexit.register(_writer.flush_sync)
+    return _writer
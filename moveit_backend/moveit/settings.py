@@ -124,15 +124,137 @@ SIMPLE_JWT = {
 
 WSGI_APPLICATION = 'moveit.wsgi.application'
 ASGI_APPLICATION = "moveit.asgi.application"
+REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "beam.layers.HybridChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
+            # Per-socket queue bound: events for a socket that already has
+            # this many waiting are dropped instead of piling up in Redis.
+            "capacity": 100,
+            "expiry": 60,
         },
     },
 }
 
+# Token buckets, (events per second, burst), for what each socket may send
+# and what each beam may carry on one worker; see beam.ratelimit. Event
+# types without an entry share "default".
+BEAM_RATE_LIMITS = {
+    "connection": {
+        "default": (10, 20),
+        "share_clipboard": (5, 10),
+        "presence_sync": (1, 3),
+        # One per beam a ws/beams/ socket subscribes to.
+        "auth": (10, 50),
+        # A transfer's window of chunks arrives at once.
+        "transfer_chunk": (50, 100),
+    },
+    "beam": {
+        "default": (50, 100),
+        "share_clipboard": (20, 40),
+        "transfer_chunk": (200, 400),
+    },
+}
+
+# Sockets more than `max_lag` seconds behind on beam broadcasts skip
+# transient frames and get presence as one snapshot; see
+# BeamConsumer.beam_frame.
+BEAM_BACKPRESSURE = {
+    "max_lag": 2.0,
+}
+
+# Who is connected to which beam. Shared through Redis so every Daphne
+# worker sees the same member list; stale members expire after "ttl" seconds
+# without a heartbeat.
+BEAM_PRESENCE = {
+    "BACKEND": "beam.presence.RedisPresenceBackend",
+    "CONFIG": {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "ttl": 60,
+    },
+}
+
+# The last `size` clipboards pasted into each beam, replayed to sockets as
+# they join; see beam.replay. Entries older than `max_age` seconds are not
+# replayed and pastes over `max_bytes` are not kept.
+BEAM_REPLAY = {
+    "BACKEND": "beam.replay.RedisReplayBackend",
+    "CONFIG": {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "size": 50,
+        "max_age": 24 * 3600,
+        "max_bytes": 64 * 1024,
+    },
+}
+
+# Notes pasted into beams are persisted in batches after they have been
+# broadcast; see beam.writer.ClipboardWriter. Repeats of a paste within
+# `dedup_window` seconds (0 disables) are folded into the first note. A
+# failed batch is retried `retries` times, then saved note by note.
+BEAM_CLIPBOARD_WRITER = {
+    "flush_size": 50,
+    "flush_interval": 0.5,
+    "max_backlog": 5000,
+    "dedup_window": 600,
+    "retries": 1,
+}
+
+# Binary frames for sockets that negotiate the moveit.msgpack subprotocol;
+# see beam.codecs.MsgpackCodec. "zstd" needs the zstandard package.
+BEAM_MSGPACK_FRAMES = {
+    "compression": "deflate",
+    "compress_threshold": 1024,
+    "max_frame_size": 16 * 1024 * 1024,
+}
+
+# Chunked clipboard transfers; see beam.transfers.TransferStore. `root`
+# holds partial uploads, so keep it outside MEDIA_ROOT and shared by every
+# worker for transfers to resume across them.
+BEAM_TRANSFERS = {
+    "root": BASE_DIR / "transfers",
+    "max_size": 50 * 1024 * 1024,
+    "chunk_size": 256 * 1024,
+    "window": 4,
+    "max_age": 3600,
+    "max_open_per_beam": 8,
+    "max_open_per_socket": 2,
+}
+
+# Stored clipboard files no note refers to, e.g. pasted by anonymous token
+# holders, are deleted by `manage.py prune_clipboard_files` once this many
+# hours old; run it periodically.
+BEAM_CLIPBOARD_FILE_RETENTION_HOURS = 24
+
+# ws/beams/ sockets subscribe to several beams at once; see
+# beam.consumers.BeamMultiplexConsumer.
+BEAM_MULTIPLEX = {
+    "max_beams": 50,
+}
+
+# Signed beam tokens that let a socket join a beam without the beam's key;
+# see beam.tokens. `keys` are tried newest first (default:
+# SECRET_KEY and SECRET_KEY_FALLBACKS); rotate by prepending a new key and
+# drop the old one after `ttl` seconds.
+BEAM_TOKENS = {
+    "keys": [key for key in os.getenv("BEAM_TOKEN_KEYS", "").split(",") if key],
+    "ttl": 24 * 3600,
+}
+
+# (user, beam) -> role lookups; see beam.permissions.RoleResolver. Entries
+# live `ttl` seconds in the shared cache and `local_ttl` seconds in each
+# process, which bounds how long another process may serve a stale role.
+BEAM_ROLE_CACHE = {
+    "ttl": 300,
+    "local_ttl": 5,
+    "local_size": 10000,
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -156,6 +278,41 @@ else:
     }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        }
+    }
+
+# Seconds a JWT's user snapshot is reused before the user is reloaded
+AUTH_USER_CACHE_TTL = 60
+
+# Seconds a user's note counters are served from cache (0 disables it)
+NOTE_STATS_CACHE_TTL = 300
+
+# Note sync (note.sync): seconds each sync re-reads before its cursor, to
+# absorb app-server clock skew and transactions that committed late, and
+# days deleted-note tombstones are kept before compact_note_tombstones
+# drops them. Older cursors must resync from scratch.
+NOTE_SYNC_OVERLAP = 5
+NOTE_TOMBSTONE_RETENTION_DAYS = 30
+
+# Upstream of beam.views.ZeroXZeroUploadView; point it at a local stand-in
+# server for testing.
+ZEROXZERO_UPLOAD_URL = os.getenv('ZEROXZERO_UPLOAD_URL', 'https://0x0.st')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -205,6 +362,7 @@ CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'http://localhost:5173'
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -14,12 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from beam.views import GenerateBeamView, ZeroXZeroUploadView
+from beam.views import GenerateBeamView, ZeroXZeroUploadView, serve_clipboard_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,4 +30,8 @@ urlpatterns = [
     path('api/', include('note.urls')),
 ]
 
+if settings.DEBUG:
+    # Ahead of static(), which would serve pasted files inline.
+    urlpatterns.append(re_path(r'^%sclipboard/(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_clipboard_file))
+
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from .cache import get_cached_user
 
 class JWTAuthenticationFromCookie(JWTAuthentication):
     def authenticate(self, request):
@@ -6,4 +7,7 @@ class JWTAuthenticationFromCookie(JWTAuthentication):
         if raw_token is None:
             return None
         validated_token = self.get_validated_token(raw_token)
-        return self.get_user(validated_token), validated_token
\ No newline at end of file
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        return get_cached_user(validated_token, super().get_user)
@@ -0,0 +1,97 @@
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.settings import api_settings
+from .models import Profile
+
+USER_FIELDS = ['id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser']
+PROFILE_FIELDS = ['id', 'user_id', 'profile_picture']
+
+
+def token_key(jti):
+    return f"auth:token:{jti}"
+
+
+def generation_key(user_id):
+    return f"auth:user_generation:{user_id}"
+
+
+def snapshot_user(user, generation):
+    snapshot = {field: getattr(user, field) for field in USER_FIELDS}
+    snapshot['generation'] = generation
+    profile = getattr(user, 'profile', None)
+    if profile is not None:
+        snapshot['profile'] = {field: getattr(profile, field) for field in PROFILE_FIELDS}
+        # Cache the file's name rather than its FieldFile.
+        snapshot['profile']['profile_picture'] = profile.profile_picture.name or None
+    return snapshot
+
+
+def instance_from_values(model, values):
+    # from_db() expects the loaded values in the model's field order.
+    field_names = [
+        field.attname for field in model._meta.concrete_fields if field.attname in values
+    ]
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def user_from_snapshot(snapshot):
+    """
+    Rebuild a User, with its profile, from a cached snapshot without
+    touching the database.
+
+    Fields missing from the snapshot (password, last_login, ...) are
+    deferred like with .only(): reading one loads it on demand, and save()
+    writes only the fields that were loaded.
+    """
+    user = instance_from_values(User, snapshot)
+    if 'profile' in snapshot:
+        profile = instance_from_values(Profile, snapshot['profile'])
+        User.profile.related.set_cached_value(user, profile)
+        Profile.user.field.set_cached_value(profile, user)
+    return user
+
+
+def get_cached_user(validated_token, load_user):
+    """
+    Return the user a validated access token belongs to.
+
+    Snapshots are cached per token jti for AUTH_USER_CACHE_TTL seconds and
+    tagged with the user's cache generation, which invalidate_user() bumps
+    whenever the user or their profile changes. On a miss the user is
+    loaded with `load_user(validated_token)`.
+    """
+    jti = validated_token.get(api_settings.JTI_CLAIM)
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    if jti is None or user_id is None:
+        return load_user(validated_token)
+
+    cached = cache.get_many([token_key(jti), generation_key(user_id)])
+    generation = cached.get(generation_key(user_id), 0)
+    snapshot = cached.get(token_key(jti))
+    if snapshot is not None and snapshot['generation'] == generation:
+        return user_from_snapshot(snapshot)
+
+    user = load_user(validated_token)
+
+    ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+    expires_in = validated_token.get('exp', 0) - int(time.time())
+    if expires_in > 0:
+        cache.set(token_key(jti), snapshot_user(user, generation), min(ttl, expires_in))
+    return user
+
+
+def invalidate_token(jti):
+    cache.delete(token_key(jti))
+
+
+def invalidate_user(user_id):
+    key = generation_key(user_id)
+    # add() is a no-op when the key exists, so incr() never misses it.
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
@@ -1,15 +1,17 @@
 from urllib.parse import parse_qs
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth.models import AnonymousUser
+from .authentication import JWTAuthenticationFromCookie
+
+jwt_authentication = JWTAuthenticationFromCookie()
 
 
 @database_sync_to_async
 def get_user_from_token(token):
     try:
-        validated_token = JWTAuthentication().get_validated_token(token)
-        user = JWTAuthentication().get_user(validated_token)
+        validated_token = jwt_authentication.get_validated_token(token)
+        user = jwt_authentication.get_user(validated_token)
         return user
     except Exception:
         return AnonymousUser()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .models import Profile
+
+USER_ROW_FIELDS = ['id', 'username', 'first_name', 'last_name', 'email']
 
 class RegisterModelSerializer(serializers.ModelSerializer):
     password      = serializers.CharField(write_only=True, required=True)
@@ -31,4 +34,47 @@ class RegisterModelSerializer(serializers.ModelSerializer):
             profile.profile_picture = profile_picture
         profile.save()
 
-        return user
\ No newline at end of file
+        return user
+
+
+def row_datetime_field():
+    # DateTimeField looks up the active timezone for every value unless it
+    # is given one; row renderers resolve it once per response.
+    return serializers.DateTimeField(default_timezone=serializers.DateTimeField().default_timezone())
+
+
+class UserRows:
+    """
+    Renders the user block of the note and beam UserSerializers from
+    .values() rows, for read-only list endpoints.
+
+    A row holds the user's columns under a prefix (see columns()). Each
+    user is rendered once, absolute profile picture URL included, and the
+    block is reused for every later row of the same user.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.blocks = {}
+        self.storage = Profile._meta.get_field('profile_picture').storage
+
+    @staticmethod
+    def columns(prefix):
+        return [prefix + field for field in USER_ROW_FIELDS] + [prefix + 'profile__profile_picture']
+
+    def picture_url(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request else url
+
+    def render(self, row, prefix):
+        user_id = row[prefix + 'id']
+        if user_id is None:
+            return None
+        block = self.blocks.get(user_id)
+        if block is None:
+            block = {field: row[prefix + field] for field in USER_ROW_FIELDS}
+            block['profile_picture'] = self.picture_url(row[prefix + 'profile__profile_picture'])
+            self.blocks[user_id] = block
+        return block
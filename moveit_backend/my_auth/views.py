@@ -6,6 +6,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenRefreshView
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from datetime import timedelta
@@ -14,6 +15,7 @@ from django.core.files.base import ContentFile
 from rest_framework.parsers import MultiPartParser, FormParser
 
 from .serializers import RegisterModelSerializer
+from .cache import invalidate_token
 
 # Create your views here.
 
@@ -321,6 +323,9 @@ def update_profile_picture_view(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def logout_view(request):
+    if request.auth is not None:
+        invalidate_token(request.auth.get(api_settings.JTI_CLAIM))
+
     response = Response({'detail': 'Logged out successfully.'})
 
     response.delete_cookie(
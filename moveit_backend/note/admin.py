@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Note
+from .models import Note, NoteTombstone
 
 
 @admin.register(Note)
@@ -31,3 +31,11 @@ class NoteAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'beam')
+
+
+@admin.register(NoteTombstone)
+class NoteTombstoneAdmin(admin.ModelAdmin):
+    list_display = ('note_id', 'user_id', 'deleted_at')
+    search_fields = ('note_id',)
+    readonly_fields = ('note_id', 'user_id', 'deleted_at')
+    ordering = ('-deleted_at',)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.utils import timezone
+
+
+def content_digest(note_type, title, content, json_content, attachment=''):
+    """
+    sha256 hex digest of a note's title and body. Attachments are stored
+    under their own digest (see beam.transfers), so their name stands in
+    for the bytes.
+
+    The title counts: lexi notes and attachments with the same body but
+    different titles are different notes.
+    """
+    body = json.dumps(
+        [note_type, title or '', content, json_content, attachment or ''],
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def hash_note(note):
+    note.content_hash = content_digest(
+        note.note_type, note.title, note.content, note.json_content,
+        note.attachment.name if note.attachment else ''
+    )
+
+
+def collapse_repeats(notes, window):
+    """
+    Split hashed, unsaved `notes` into the ones to insert and the pks of
+    notes they repeat: same user, beam and content, created less than
+    `window` seconds ago (or earlier in `notes`).
+    """
+    from .models import Note
+
+    if not window or not notes:
+        return notes, set()
+
+    recent = {
+        (beam_id, user_id, digest): pk
+        for beam_id, user_id, digest, pk in Note.objects.filter(
+            beam_id__in={note.beam_id for note in notes},
+            user_id__in={note.user_id for note in notes},
+            content_hash__in={note.content_hash for note in notes},
+            created_at__gte=timezone.now() - timedelta(seconds=window),
+            archived_at=None,
+        ).values_list('beam_id', 'user_id', 'content_hash', 'pk')
+    }
+
+    fresh, repeated = [], set()
+    for note in notes:
+        key = (note.beam_id, note.user_id, note.content_hash)
+        if key in recent:
+            repeated.add(recent[key])
+        else:
+            recent[key] = note.pk
+            fresh.append(note)
+    return fresh, repeated
@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from note.models import NoteTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete note tombstones older than the sync retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'NOTE_TOMBSTONE_RETENTION_DAYS', 30),
+            help='Keep tombstones from the last DAYS days (default: NOTE_TOMBSTONE_RETENTION_DAYS).'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = NoteTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} note tombstones older than {cutoff.isoformat()}.")
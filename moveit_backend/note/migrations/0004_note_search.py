@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+from note.search import FTS_TABLE, SEARCH_CONFIG, extract_lexical_text
+
+
+def create_search_index(apps, schema_editor):
+    Note = apps.get_model('note', 'Note')
+
+    for note in Note.objects.exclude(json_content=None).only('id', 'json_content').iterator():
+        Note.objects.filter(pk=note.pk).update(json_text=extract_lexical_text(note.json_content))
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX note_note_search_vector_gin ON note_note USING gin (search_vector)'
+        )
+        Note.objects.update(
+            search_vector=(
+                SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+                SearchVector('content', weight='B', config=SEARCH_CONFIG) +
+                SearchVector('json_text', weight='B', config=SEARCH_CONFIG)
+            )
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"note_id UNINDEXED, title, body, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (note_id, title, body) "
+            f"SELECT id, COALESCE(title, ''), COALESCE(content, '') || char(10) || json_text "
+            f"FROM note_note"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS note_note_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0003_note_archived_at_note_beam'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='json_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0006_note_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='attachment',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='clipboard/'),
+        ),
+    ]
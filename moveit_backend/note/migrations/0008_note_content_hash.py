@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+from note.dedup import content_digest
+
+
+def hash_existing_notes(apps, schema_editor):
+    Note = apps.get_model('note', 'Note')
+
+    batch = []
+    for note in Note.objects.only('id', 'note_type', 'title', 'content', 'json_content', 'attachment').iterator(chunk_size=1000):
+        note.content_hash = content_digest(
+            note.note_type, note.title, note.content, note.json_content, note.attachment.name
+        )
+        batch.append(note)
+        if len(batch) == 1000:
+            Note.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Note.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beam', '0004_beamshare'),
+        ('note', '0007_note_attachment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['beam', 'user', 'content_hash'], name='note_beam_user_hash'),
+        ),
+        migrations.RunPython(hash_existing_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+import uuid
+from django.db import migrations
+
+from note.search import FTS_TABLE, fts_rowid
+
+
+def key_fts_rows_by_note(apps, schema_editor):
+    # Rows indexed so far carry SQLite's own rowids; move each to the one
+    # note.search derives from its note id.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid, note_id FROM {FTS_TABLE}')
+        rows = cursor.fetchall()
+        cursor.executemany(
+            f'UPDATE {FTS_TABLE} SET rowid = %s WHERE rowid = %s',
+            [(fts_rowid(uuid.UUID(note_id)), rowid) for rowid, note_id in rows]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0008_note_content_hash'),
+    ]
+
+    operations = [
+        # Older code never looks at rowids, so there is nothing to undo.
+        migrations.RunPython(key_fts_rows_by_note, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from beam.models import Beam
 # Create your models here.
@@ -12,6 +13,16 @@ NOTE_TYPES = (
     ("video", "Video"),
 )
 
+class NoteQuerySet(models.QuerySet):
+
+    def delete(self):
+        from .signals import forget_notes
+
+        with transaction.atomic():
+            forget_notes(self)
+            return super().delete()
+
+
 class Note(models.Model):
     id              = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     beam            = models.ForeignKey(Beam, on_delete=models.CASCADE, null=True, blank=True)
@@ -19,10 +30,60 @@ class Note(models.Model):
     title           = models.CharField(max_length=255, null=True, blank=True)
     content         = models.TextField(max_length=5000, null=True, blank=True)
     json_content    = models.JSONField(blank=True, null=True)
+    # Large clipboard pastes, assembled by beam.transfers
+    attachment      = models.FileField(upload_to='clipboard/', max_length=255, null=True, blank=True)
     note_type       = models.CharField(choices=NOTE_TYPES, max_length=30)
     archived_at     = models.DateTimeField(null=True, blank=True)
     created_at      = models.DateTimeField(auto_now_add=True)
     updated_at      = models.DateTimeField(auto_now=True)
 
+    # Search index; maintained by note.search, see note/signals.py
+    json_text       = models.TextField(blank=True, default='', editable=False)
+    search_vector   = SearchVectorField(null=True, editable=False)
+
+    # sha256 of the title and body, maintained by note.dedup; see note/signals.py
+    content_hash    = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    objects = NoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves beam_notes: one beam, live or archived, newest first.
+            models.Index(fields=['beam', 'archived_at', 'created_at'], name='note_beam_archived_created'),
+            # Serves note sync: one user's notes changed since a cursor.
+            models.Index(fields=['user', 'updated_at'], name='note_user_updated'),
+            # Serves the clipboard writer's check for repeated pastes.
+            models.Index(fields=['beam', 'user', 'content_hash'], name='note_beam_user_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.title or 'Untitled'} - {self.note_type}"
+
+    def delete(self, *args, **kwargs):
+        # Tombstones, search index and attachments; see note.signals.
+        from .signals import forget_notes
+
+        with transaction.atomic():
+            forget_notes(Note.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
+
+
+class NoteTombstone(models.Model):
+    """
+    Record of a deleted note, so note sync can tell clients to drop it.
+
+    user_id is a plain column rather than a foreign key: tombstones are
+    written while a user's notes are being cascade-deleted along with the
+    user. compact_note_tombstones removes old rows.
+    """
+    note_id         = models.UUIDField()
+    user_id         = models.IntegerField()
+    deleted_at      = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at'], name='note_tombstone_user_deleted'),
+        ]
+
     def __str__(self):
-        return f"{self.title or 'Untitled'} - {self.note_type}"
\ No newline at end of file
+        return f"{self.note_id} deleted at {self.deleted_at}"
\ No newline at end of file
@@ -0,0 +1,84 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over (ordering_field, id), newest first.
+
+    Each page is one indexed range scan no matter how deep the client has
+    paged. The response body stays a plain list so existing clients keep
+    working; the opaque cursor for the next page is returned in the
+    X-Next-Cursor header and is absent on the last page.
+    """
+    ordering_field = 'updated_at'
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    next_cursor_header = 'X-Next-Cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, row):
+        if isinstance(row, dict):
+            value, pk = row[self.ordering_field], row['id']
+        else:
+            value, pk = getattr(row, self.ordering_field), row.pk
+        return base64.urlsafe_b64encode(json.dumps([value.isoformat(), str(pk)]).encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        # Cursors come back from clients, so anything that is not a
+        # timestamp and a valid pk of `model` is rejected here rather than
+        # failing when the query runs.
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(value, str) or not isinstance(pk, str):
+                raise ValueError
+            value = parse_datetime(value)
+            pk = model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError):
+            value = None
+        if value is None:
+            raise NotFound('Invalid cursor.')
+        return value, pk
+
+    def filter_after_cursor(self, queryset, cursor):
+        value, pk = self.decode_cursor(cursor, queryset.model)
+        return queryset.filter(
+            Q(**{f'{self.ordering_field}__lt': value}) |
+            Q(**{self.ordering_field: value, 'id__lt': pk})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(f'-{self.ordering_field}', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.filter_after_cursor(queryset, cursor)
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        if self.next_cursor:
+            response[self.next_cursor_header] = self.next_cursor
+        return response
+
+
+class CreatedKeysetPagination(KeysetPagination):
+    ordering_field = 'created_at'
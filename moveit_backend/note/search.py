@@ -0,0 +1,178 @@
+import uuid
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection, models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Concat
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'note_note_fts'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+# Lexical block nodes; their text is separated by a newline when extracted.
+LEXICAL_BLOCK_TYPES = {'paragraph', 'heading', 'quote', 'listitem', 'code', 'root'}
+
+
+def extract_lexical_text(tree):
+    """
+    Plain text of a serialized Lexical editor state (json_content of
+    'lexi_note' notes), for indexing.
+    """
+    if not isinstance(tree, dict):
+        return ''
+
+    blocks = []
+
+    def walk(node, parts):
+        if not isinstance(node, dict):
+            return
+        if isinstance(node.get('text'), str):
+            parts.append(node['text'])
+        for child in node.get('children') or []:
+            if isinstance(child, dict) and child.get('type') in LEXICAL_BLOCK_TYPES:
+                child_parts = []
+                walk(child, child_parts)
+                if child_parts:
+                    blocks.append(''.join(child_parts))
+            else:
+                walk(child, parts)
+
+    root = tree.get('root', tree)
+    parts = []
+    walk(root, parts)
+    if parts:
+        blocks.append(''.join(parts))
+    return '\n'.join(blocks)
+
+
+def fts_rowid(note_id):
+    # SQLite FTS rows are keyed by a rowid taken from the note's UUID, so
+    # replacing or removing a note's row is a rowid lookup; note_id is an
+    # unindexed FTS column and filtering on it scans the whole table.
+    return int.from_bytes(note_id.bytes[:8], 'big', signed=True)
+
+
+def prepare_note(note):
+    note.json_text = extract_lexical_text(note.json_content) if note.json_content else ''
+
+
+def index_notes(notes):
+    """
+    Refresh the search index for already-saved notes.
+
+    PostgreSQL keeps a weighted tsvector in Note.search_vector (GIN
+    indexed); SQLite, used in DEBUG, keeps rows in an FTS5 table.
+    """
+    from .models import Note
+
+    if not notes:
+        return
+
+    if connection.vendor == 'postgresql':
+        Note.objects.filter(pk__in=[note.pk for note in notes]).update(
+            search_vector=(
+                SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+                SearchVector('content', weight='B', config=SEARCH_CONFIG) +
+                SearchVector('json_text', weight='B', config=SEARCH_CONFIG)
+            )
+        )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(fts_rowid(note.pk),) for note in notes]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, note_id, title, body) VALUES (%s, %s, %s, %s)',
+                [
+                    (fts_rowid(note.pk), note.pk.hex, note.title or '', '\n'.join(filter(None, [note.content, note.json_text])))
+                    for note in notes
+                ]
+            )
+
+
+def unindex_notes(note_ids):
+    if connection.vendor == 'sqlite' and note_ids:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(fts_rowid(note_id),) for note_id in note_ids]
+            )
+
+
+def fts_query(query):
+    # Quote every term so user input can't inject FTS5 syntax; the last
+    # term is a prefix match to support search-as-you-type.
+    terms = ['"{}"'.format(term.replace('"', '')) for term in query.split() if term.replace('"', '')]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_notes(queryset, query, limit):
+    """
+    Up to `limit` notes of `queryset` matching `query`, best match first.
+
+    Each returned note carries `rank` (higher is better) and `highlight`,
+    a snippet with matches wrapped in <mark> tags.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        document = Concat(
+            Coalesce('title', Value('')), Value('\n'),
+            Coalesce('content', Value('')), Value('\n'),
+            'json_text',
+            output_field=models.TextField()
+        )
+        return list(
+            queryset.filter(search_vector=search_query).annotate(
+                rank=SearchRank(F('search_vector'), search_query),
+                highlight=SearchHeadline(
+                    document,
+                    search_query,
+                    config=SEARCH_CONFIG,
+                    start_sel=HIGHLIGHT_START,
+                    stop_sel=HIGHLIGHT_STOP
+                )
+            ).order_by('-rank', '-updated_at')[:limit]
+        )
+
+    if connection.vendor == 'sqlite':
+        match = fts_query(query)
+        if not match:
+            return []
+        # The FTS table is joined into `queryset` so matches are ranked,
+        # filtered and cut to `limit` in one query: a common word costs a
+        # sort of its matches, not loading every matching note. Snippets
+        # are only built for the notes returned.
+        table = queryset.model._meta.db_table
+        notes = list(queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.note_id = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'bm25': f'bm25({FTS_TABLE}, 0, 10.0, 1.0)'}
+        ).order_by('bm25', '-updated_at')[:limit])
+        if not notes:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT note_id, snippet({FTS_TABLE}, -1, %s, %s, '...', 24) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND note_id IN ({', '.join(['%s'] * len(notes))})",
+                [HIGHLIGHT_START, HIGHLIGHT_STOP, match, *[note.pk.hex for note in notes]]
+            )
+            snippets = {uuid.UUID(note_id): snippet for note_id, snippet in cursor.fetchall()}
+        for note in notes:
+            # bm25() is lower-is-better; flip it so rank means the same
+            # thing on both backends.
+            note.rank, note.highlight = -note.bm25, snippets.get(note.pk)
+        return notes
+
+    notes = list(queryset.filter(
+        models.Q(title__icontains=query) |
+        models.Q(content__icontains=query) |
+        models.Q(json_text__icontains=query)
+    )[:limit])
+    for note in notes:
+        note.rank, note.highlight = None, None
+    return notes
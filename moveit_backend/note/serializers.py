@@ -3,6 +3,7 @@ from .models import Note
 from django.contrib.auth.models import User
 from beam.models import Beam
 from my_auth.models import Profile
+from my_auth.serializers import UserRows, row_datetime_field
 
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
@@ -37,9 +38,9 @@ class NoteSerializer(serializers.ModelSerializer):
         model = Note
         fields = [
             'id', 'user', 'user_id', 'beam', 'beam_id', 'title', 'content', 
-            'json_content', 'note_type', 'archived_at', 'created_at', 'updated_at'
+            'json_content', 'attachment', 'note_type', 'archived_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'attachment', 'created_at', 'updated_at']
     
     def validate_note_type(self, value):
         valid_types = ['text', 'lexi_note', 'image', 'audio', 'video']
@@ -77,8 +78,99 @@ class NoteListSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Note
-        fields = ['id', 'user', 'beam', 'title', 'content', 'json_content', 'note_type', 'archived_at', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'beam', 'title', 'content', 'json_content', 'attachment', 'note_type', 'archived_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'attachment', 'created_at', 'updated_at']
+
+    def __init__(self, *args, **kwargs):
+        # Optional subset of Meta.fields to render, e.g. from ?fields=
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+class NoteListRows:
+    """
+    Read-only fast path for NoteListSerializer on list endpoints.
+
+    Renders the same output from .values(*columns()) rows, so a page is
+    one query with its user, profile and beam joined in, and each user
+    and beam block is built once per response.
+    """
+    beam_fields = ['beam_id', 'beam_key', 'created_at']
+
+    def __init__(self, request=None, fields=None):
+        # Keep NoteListSerializer's field order whatever ?fields= says.
+        self.fields = [
+            field for field in NoteListSerializer.Meta.fields
+            if fields is None or field in fields
+        ]
+        self.request = request
+        self.users = UserRows(request)
+        self.beams = {}
+        self.datetime = row_datetime_field()
+        self.storage = Note._meta.get_field('attachment').storage
+
+    def columns(self):
+        # id and the timestamps are always loaded for keyset cursors.
+        columns = ['id', 'created_at', 'updated_at']
+        for field in self.fields:
+            if field == 'user':
+                columns += UserRows.columns('user__')
+            elif field == 'beam':
+                columns += ['beam__' + beam_field for beam_field in self.beam_fields]
+            elif field not in columns:
+                columns.append(field)
+        return columns
+
+    def render_beam(self, row):
+        beam_id = row['beam__beam_id']
+        if beam_id is None:
+            return None
+        block = self.beams.get(beam_id)
+        if block is None:
+            block = {
+                'beam_id': beam_id,
+                'beam_key': row['beam__beam_key'],
+                'created_at': self.datetime.to_representation(row['beam__created_at']),
+            }
+            self.beams[beam_id] = block
+        return block
+
+    def render_attachment(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request else url
+
+    def render(self, row):
+        item = {}
+        for field in self.fields:
+            if field == 'id':
+                item['id'] = str(row['id'])
+            elif field == 'user':
+                item['user'] = self.users.render(row, 'user__')
+            elif field == 'beam':
+                item['beam'] = self.render_beam(row)
+            elif field == 'attachment':
+                item['attachment'] = self.render_attachment(row['attachment'])
+            elif field in ('archived_at', 'created_at', 'updated_at'):
+                item[field] = self.datetime.to_representation(row[field])
+            else:
+                item[field] = row[field]
+        return item
+
+    def render_many(self, rows):
+        return [self.render(row) for row in rows]
+
+class NoteSummarySerializer(serializers.ModelSerializer):
+    beam = BeamSerializer(read_only=True)
+    preview = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Note
+        fields = ['id', 'beam', 'title', 'preview', 'note_type', 'archived_at', 'created_at', 'updated_at']
+        read_only_fields = fields
 
 class NoteCreateSerializer(serializers.ModelSerializer):
     class Meta:
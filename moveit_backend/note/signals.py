@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete
+from django.dispatch import receiver
+from beam.models import Beam
+from .dedup import hash_note
+from .models import Note, NoteTombstone
+from .search import prepare_note, index_notes, unindex_notes
+from .stats import invalidate_note_stats
+
+SEARCHABLE_FIELDS = {'title', 'content', 'json_content'}
+
+
+def touches_search(update_fields):
+    return update_fields is None or bool(SEARCHABLE_FIELDS & set(update_fields))
+
+
+@receiver(pre_save, sender=Note)
+def prepare_note_for_search(sender, instance, update_fields=None, **kwargs):
+    if touches_search(update_fields):
+        prepare_note(instance)
+
+
+@receiver(pre_save, sender=Note)
+def hash_note_content(sender, instance, update_fields=None, **kwargs):
+    # Saves limited to update_fields never change the title or body.
+    if update_fields is None:
+        hash_note(instance)
+
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, update_fields=None, **kwargs):
+    if touches_search(update_fields):
+        index_notes([instance])
+    invalidate_note_stats(instance.user_id)
+
+
+def forget_notes(notes):
+    """
+    Bookkeeping for the notes of queryset `notes`, which are about to be
+    deleted, in the same few queries however many there are: tombstones
+    for note sync, search index rows, cached stats and, once committed,
+    attachment files no remaining note uses.
+
+    Note.delete() and NoteQuerySet.delete() call it, and so do Beam and
+    User deletes for the notes they cascade to; Note has no delete
+    signal receivers, so those cascades stay a single DELETE.
+    """
+    rows = list(notes.values_list('pk', 'user_id', 'attachment'))
+    if not rows:
+        return
+    NoteTombstone.objects.bulk_create([
+        NoteTombstone(note_id=pk, user_id=user_id) for pk, user_id, _ in rows
+    ])
+    unindex_notes([pk for pk, _, _ in rows])
+    invalidate_note_stats(*[user_id for _, user_id, _ in rows])
+
+    names = {name for _, _, name in rows if name}
+    if names:
+        storage = Note._meta.get_field('attachment').storage
+
+        # Attachment files are content-addressed and may be shared by
+        # several notes; the last one to go removes the file.
+        def delete_unreferenced():
+            kept = set(Note.objects.filter(attachment__in=names).values_list('attachment', flat=True))
+            for name in names - kept:
+                storage.delete(name)
+
+        transaction.on_commit(delete_unreferenced)
+
+
+@receiver(pre_delete, sender=Beam)
+def forget_beam_notes(sender, instance, **kwargs):
+    forget_notes(Note.objects.filter(beam=instance))
+
+
+@receiver(pre_delete, sender=User)
+def forget_user_notes(sender, instance, **kwargs):
+    # Notes in the user's own beams go with those beams, above.
+    forget_notes(Note.objects.filter(user=instance).exclude(beam__user=instance))
@@ -0,0 +1,77 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+from .models import Note, NOTE_TYPES
+
+RECENT_DAYS = 7
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+}
+
+
+def stats_key(user_id):
+    return f"note_stats:{user_id}"
+
+
+def compute_note_stats(user_id):
+    """
+    Every counter of NoteViewSet.stats in a single conditional-aggregation
+    query.
+    """
+    recent_since = timezone.now() - timedelta(days=RECENT_DAYS)
+    counts = Note.objects.filter(user_id=user_id).aggregate(
+        total_notes=Count('id'),
+        recent_notes=Count('id', filter=Q(updated_at__gte=recent_since)),
+        archived_notes=Count('id', filter=Q(archived_at__isnull=False)),
+        shared_notes=Count('id', filter=Q(beam__isnull=False)),
+        **{
+            f'type_{note_type}': Count('id', filter=Q(note_type=note_type))
+            for note_type, _ in NOTE_TYPES
+        }
+    )
+    return {
+        'total_notes': counts['total_notes'],
+        'notes_by_type': {note_type: counts[f'type_{note_type}'] for note_type, _ in NOTE_TYPES},
+        'recent_notes': counts['recent_notes'],
+        'archived_notes': counts['archived_notes'],
+        'shared_notes': counts['shared_notes'],
+    }
+
+
+def get_note_stats(user_id):
+    """
+    compute_note_stats(), served from the per-user cache for up to
+    NOTE_STATS_CACHE_TTL seconds (0 disables it). Note signals drop the
+    cached entry whenever one of the user's notes is written or deleted.
+    """
+    ttl = getattr(settings, 'NOTE_STATS_CACHE_TTL', 0)
+    if not ttl:
+        return compute_note_stats(user_id)
+
+    stats = cache.get(stats_key(user_id))
+    if stats is None:
+        stats = compute_note_stats(user_id)
+        cache.set(stats_key(user_id), stats, ttl)
+    return stats
+
+
+def invalidate_note_stats(*user_ids):
+    cache.delete_many([stats_key(user_id) for user_id in set(user_ids)])
+
+
+def bucket_note_counts(user_id, bucket, days):
+    """
+    Notes created per day or week over the last `days` days, oldest first.
+    """
+    since = timezone.now() - timedelta(days=days)
+    rows = Note.objects.filter(
+        user_id=user_id,
+        created_at__gte=since
+    ).annotate(
+        period=BUCKETS[bucket]('created_at')
+    ).values('period').annotate(count=Count('id')).order_by('period')
+    return [{'period': row['period'].date().isoformat(), 'count': row['count']} for row in rows]
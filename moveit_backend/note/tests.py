@@ -1,3 +1,374 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from beam.models import Beam, BeamShare
+from beam.permissions import get_role_resolver
+from my_auth.models import Profile
+from .dedup import collapse_repeats, hash_note
+from .models import Note, NoteTombstone
+from .serializers import NoteListRows, NoteListSerializer
+from .sync import encode_sync_cursor
 
-# Create your tests here.
+SYNC_URL = '/api/notes/sync/'
+BULK_URL = '/api/note-detail/bulk/'
+
+
+@override_settings(NOTE_SYNC_OVERLAP=5)
+class NoteSyncTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_note(self, title, updated_at=None):
+        note = Note.objects.create(user=self.user, title=title, content=title, note_type='text')
+        if updated_at is not None:
+            # update() skips auto_now, so the timestamp sticks.
+            Note.objects.filter(pk=note.pk).update(updated_at=updated_at)
+            note.refresh_from_db()
+        return note
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(SYNC_URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def sync_all(self, cursor=None, **params):
+        # Pages until has_more is false, as clients do.
+        pages = []
+        while True:
+            page = self.sync(cursor, **params)
+            pages.append(page)
+            cursor = page['cursor']
+            if not page['has_more']:
+                return pages, cursor
+
+    def titles(self, page):
+        return [note['title'] for note in page['notes']]
+
+    def test_first_sync_returns_every_note(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        self.create_note('old', hour_ago)
+        self.create_note('new')
+        Note.objects.create(user=User.objects.create_user('bob'), title='not mine', note_type='text')
+
+        page = self.sync()
+
+        self.assertEqual(self.titles(page), ['old', 'new'])
+        self.assertEqual(page['deleted'], [])
+        self.assertFalse(page['has_more'])
+
+    def test_since_cursor_returns_only_later_changes(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        untouched = self.create_note('untouched', hour_ago)
+        edited = self.create_note('edited', hour_ago)
+        cursor = self.sync()['cursor']
+
+        edited.title = 'edited again'
+        edited.save()
+        self.create_note('created')
+
+        page = self.sync(cursor)
+
+        self.assertEqual(self.titles(page), ['edited again', 'created'])
+        self.assertFalse(page['has_more'])
+        # Nothing changed since, apart from the overlap's repeats.
+        later = self.sync(page['cursor'])
+        self.assertNotIn('untouched', self.titles(later))
+
+    def test_deleted_notes_come_back_as_tombstones(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        kept = self.create_note('kept', hour_ago)
+        gone = self.create_note('gone', hour_ago)
+        cursor = self.sync()['cursor']
+
+        gone_id = gone.pk
+        gone.delete()
+
+        page = self.sync(cursor)
+        self.assertEqual(page['deleted'], [str(gone_id)])
+        self.assertEqual(page['notes'], [])
+        self.assertTrue(NoteTombstone.objects.filter(note_id=gone_id, user_id=self.user.pk).exists())
+        self.assertTrue(Note.objects.filter(pk=kept.pk).exists())
+
+    def test_other_users_deletes_are_not_reported(self):
+        cursor = self.sync()['cursor']
+        other = Note.objects.create(user=User.objects.create_user('bob'), title='bob', note_type='text')
+        other.delete()
+
+        self.assertEqual(self.sync(cursor)['deleted'], [])
+
+    def test_pages_order_equal_timestamps_by_id(self):
+        # Notes written in one bulk operation share an updated_at; paging
+        # on (updated_at, id) must neither skip nor repeat any of them.
+        stamp = timezone.now() - timedelta(hours=1)
+        notes = [self.create_note(f'note {i}', stamp) for i in range(7)]
+
+        pages, _ = self.sync_all(page_size=3)
+
+        self.assertEqual([len(page['notes']) for page in pages], [3, 3, 1])
+        ids = [note['id'] for page in pages for note in page['notes']]
+        self.assertEqual(ids, sorted(str(note.pk) for note in notes))
+        self.assertEqual(pages[0]['deleted'], [])
+
+    def test_write_during_paging_is_caught_by_next_sync(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for i in range(4):
+            self.create_note(f'note {i}', hour_ago)
+        first = self.sync(page_size=2)
+        self.assertTrue(first['has_more'])
+
+        # Lands after the session started: it may show up on a later page,
+        # and the session's last cursor still starts before it.
+        self.create_note('concurrent')
+        pages, cursor = self.sync_all(first['cursor'], page_size=2)
+        session = self.titles(first) + [title for page in pages for title in self.titles(page)]
+        self.assertEqual(sorted(session), ['concurrent', 'note 0', 'note 1', 'note 2', 'note 3'])
+
+        self.assertIn('concurrent', self.titles(self.sync(cursor)))
+
+    def test_overlap_catches_writes_stamped_behind_the_cursor(self):
+        cursor = self.sync()['cursor']
+        # A server whose clock lags stamps its write before our cursor.
+        self.create_note('skewed', timezone.now() - timedelta(seconds=3))
+        self.create_note('too old', timezone.now() - timedelta(seconds=30))
+
+        self.assertEqual(self.titles(self.sync(cursor)), ['skewed'])
+
+    def test_expired_cursor_is_gone(self):
+        cursor = encode_sync_cursor(timezone.now() - timedelta(days=31))
+        response = self.client.get(SYNC_URL, {'cursor': cursor})
+        self.assertEqual(response.status_code, 410)
+
+    def test_malformed_cursors_are_rejected(self):
+        now = timezone.now().isoformat()
+        tampered = [
+            'not base64 at all',
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            base64.urlsafe_b64encode(json.dumps({'since': now, 'as_of': now, 'after': [now, 'nope']}).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps({'since': now, 'as_of': now, 'after': ['yesterday', 'x']}).encode()).decode(),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(SYNC_URL, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class BulkMoveTests(TestCase):
+
+    def setUp(self):
+        # Roles are cached per beam pk, which the test database reuses.
+        cache.clear()
+        get_role_resolver().clear_local()
+        self.owner = User.objects.create_user('owner')
+        self.user = User.objects.create_user('alice')
+        self.beam = Beam.objects.create(beam_id='beam', beam_key='key', user=self.owner)
+        self.note = Note.objects.create(user=self.user, title='note', note_type='text')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def move(self, beam_id):
+        return self.client.post(BULK_URL, {'operation': 'move', 'ids': [str(self.note.pk)], 'beam_id': beam_id}, format='json')
+
+    def test_move_needs_write_access_to_the_beam(self):
+        for share_type in (None, 'read'):
+            with self.subTest(share_type=share_type):
+                if share_type:
+                    BeamShare.objects.create(beam=self.beam, shared_by=self.owner, shared_with=self.user, share_type=share_type)
+                    get_role_resolver().invalidate(self.beam.pk)
+                response = self.move('beam')
+                self.assertEqual(response.status_code, 403)
+                self.note.refresh_from_db()
+                self.assertIsNone(self.note.beam_id)
+
+    def test_writers_and_owners_can_move(self):
+        BeamShare.objects.create(beam=self.beam, shared_by=self.owner, shared_with=self.user, share_type='write')
+        response = self.move('beam')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], {str(self.note.pk): 'ok'})
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.beam_id, self.beam.pk)
+
+        own = Beam.objects.create(beam_id='own', beam_key='key', user=self.user)
+        self.assertEqual(self.move('own').status_code, 200)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.beam_id, own.pk)
+
+    def test_moving_out_of_a_beam_needs_no_role(self):
+        Note.objects.filter(pk=self.note.pk).update(beam=self.beam)
+        self.assertEqual(self.move(None).status_code, 200)
+        self.note.refresh_from_db()
+        self.assertIsNone(self.note.beam_id)
+
+
+class NoteStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Note.objects.create(user=self.user, title='note', note_type='text')
+
+    def test_days_are_clamped_to_a_year(self):
+        for days in ('-9999999999', '0', '99999999999'):
+            with self.subTest(days=days):
+                response = self.client.get('/api/notes/stats/', {'bucket': 'day', 'days': days})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sum(row['count'] for row in response.json()['created_by_period']), 1)
+
+    def test_days_must_be_a_number(self):
+        response = self.client.get('/api/notes/stats/', {'bucket': 'day', 'days': 'week'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BeamNotesTests(TestCase):
+
+    def test_bad_since_is_rejected(self):
+        Beam.objects.create(beam_id='beam', beam_key='key')
+        for since in ('yesterday', '2024-13-45T00:00'):
+            with self.subTest(since=since):
+                response = self.client.get('/api/notes/beam_notes/', {'beam_id': 'beam', 'since': since})
+                self.assertEqual(response.status_code, 400)
+
+
+class NoteDeleteTests(TestCase):
+    """
+    Deleting notes costs the same queries however many there are, and
+    still records their tombstones and drops them from search.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.beam = Beam.objects.create(beam_id='beam', beam_key='key', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_notes(self, count):
+        return [
+            Note.objects.create(user=self.user, beam=self.beam, title=f'findme {i}', note_type='text').pk
+            for i in range(count)
+        ]
+
+    def assertForgotten(self, ids):
+        self.assertFalse(Note.objects.filter(pk__in=ids).exists())
+        self.assertEqual(set(NoteTombstone.objects.values_list('note_id', flat=True)), set(ids))
+        self.assertEqual(self.client.get('/api/notes/my_notes/', {'search': 'findme'}).json(), [])
+
+    def test_bulk_delete(self):
+        queries = []
+        for count in (1, 20):
+            NoteTombstone.objects.all().delete()
+            ids = self.create_notes(count)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(BULK_URL, {'operation': 'delete', 'ids': [str(pk) for pk in ids]}, format='json')
+            self.assertEqual(response.json()['count'], count)
+            self.assertForgotten(ids)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_beam_cascade(self):
+        queries = []
+        for count in (1, 20):
+            NoteTombstone.objects.all().delete()
+            self.beam = Beam.objects.create(beam_id=f'beam{count}', beam_key='key', user=self.user)
+            ids = self.create_notes(count)
+            with CaptureQueriesContext(connection) as captured:
+                self.beam.delete()
+            self.assertForgotten(ids)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_user_cascade_records_each_note_once(self):
+        ids = self.create_notes(2)
+        ids.append(Note.objects.create(user=self.user, title='findme loose', note_type='text').pk)
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertEqual(sorted(NoteTombstone.objects.values_list('note_id', flat=True)), sorted(ids))
+        self.assertEqual(set(NoteTombstone.objects.values_list('user_id', flat=True)), {user_id})
+
+
+class DedupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.beam = Beam.objects.create(beam_id='dedup', beam_key='dedup', user=self.user)
+
+    def pasted(self, title, content='{"root": {}}', note_type='lexi'):
+        note = Note(user=self.user, beam=self.beam, title=title, content=content, note_type=note_type)
+        hash_note(note)
+        return note
+
+    def saved(self, title, age=0):
+        note = self.pasted(title)
+        note.save()
+        Note.objects.filter(pk=note.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        return note
+
+    def test_titles_are_part_of_the_hash(self):
+        self.assertNotEqual(self.pasted('Monday').content_hash, self.pasted('Tuesday').content_hash)
+        self.assertEqual(self.pasted('Monday').content_hash, self.pasted('Monday').content_hash)
+
+    def test_repeats_within_the_window_collapse_into_the_earlier_note(self):
+        earlier = self.saved('Monday', age=60)
+        fresh, repeated = collapse_repeats([self.pasted('Monday'), self.pasted('Tuesday')], window=600)
+        self.assertEqual([note.title for note in fresh], ['Tuesday'])
+        self.assertEqual(repeated, {earlier.pk})
+
+    def test_notes_older_than_the_window_are_not_repeated(self):
+        self.saved('Monday', age=601)
+        fresh, repeated = collapse_repeats([self.pasted('Monday')], window=600)
+        self.assertEqual(len(fresh), 1)
+        self.assertEqual(repeated, set())
+
+    def test_repeats_within_one_batch_are_inserted_once(self):
+        fresh, repeated = collapse_repeats([self.pasted('Monday'), self.pasted('Monday')], window=600)
+        self.assertEqual(len(fresh), 1)
+        self.assertEqual(repeated, {fresh[0].pk})
+
+    def test_no_window_keeps_every_note(self):
+        self.saved('Monday')
+        notes = [self.pasted('Monday'), self.pasted('Monday')]
+        self.assertEqual(collapse_repeats(notes, window=0), (notes, set()))
+
+
+class NoteListRowsTests(TestCase):
+    """
+    NoteListRows renders exactly what NoteListSerializer does.
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', first_name='Alice')
+        Profile.objects.filter(user=self.alice).update(profile_picture='profile_images/alice.png')
+        bob = User.objects.create_user('bob')
+        beam = Beam.objects.create(beam_id='rows', beam_key='key', user=self.alice)
+        Note.objects.create(user=self.alice, beam=beam, title='Text', content='hello', note_type='text')
+        Note.objects.create(user=bob, beam=beam, title='Lexi', json_content={'root': {'children': []}}, note_type='lexi_note')
+        Note.objects.create(user=bob, content='no beam', attachment='clipboard/abc.bin', note_type='image')
+        Note.objects.create(user=self.alice, content='old', note_type='text', archived_at=timezone.now())
+        self.request = RequestFactory().get('/api/notes/')
+
+    def assertRendersLikeTheSerializer(self, fields=None):
+        queryset = Note.objects.order_by('created_at')
+        rows = NoteListRows(self.request, fields)
+        serializer = NoteListSerializer(
+            queryset.select_related('user__profile', 'beam'), many=True,
+            context={'request': self.request}, fields=fields
+        )
+        self.assertEqual(rows.render_many(queryset.values(*rows.columns())), serializer.data)
+
+    def test_all_fields(self):
+        self.assertRendersLikeTheSerializer()
+
+    def test_some_fields(self):
+        self.assertRendersLikeTheSerializer(['title', 'user', 'created_at'])
@@ -1,20 +1,90 @@
+import uuid
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError, NotFound
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db.models.functions import Substr
 from .models import Note
-from .serializers import NoteSerializer, NoteListSerializer, NoteCreateSerializer
+from .pagination import KeysetPagination, CreatedKeysetPagination
+from .search import search_notes
+from .sync import sync_notes
+from .stats import BUCKETS, get_note_stats, bucket_note_counts, invalidate_note_stats
+from .serializers import NoteSerializer, NoteListSerializer, NoteListRows, NoteSummarySerializer, NoteCreateSerializer
 from beam.models import Beam
-from django.db import models
+from beam.permissions import WRITE_ROLES, get_beam_role
+
+SUMMARY_PREVIEW_LENGTH = 200
+BULK_OPERATIONS = ('archive', 'unarchive', 'delete', 'move')
+MAX_BULK_NOTES = 500
 
 class NoteViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NoteSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         return Note.objects.filter(user=self.request.user).select_related('beam').order_by('-updated_at')
+
+    def list_notes(self, queryset, search=None):
+        """
+        Paginated list response honouring ?mode=summary and ?fields=.
+
+        Heavy columns the client did not ask for are deferred so they are
+        never read from the database. With `search`, the best-ranked
+        page of matches is returned instead, each with `rank` and
+        `highlight`.
+        """
+        request = self.request
+        mode = request.query_params.get('mode')
+        fields = request.query_params.get('fields')
+
+        if mode == 'summary':
+            queryset = queryset.defer('content', 'json_content').annotate(
+                preview=Substr('content', 1, SUMMARY_PREVIEW_LENGTH)
+            )
+            return self.list_page(queryset, NoteSummarySerializer, search)
+
+        if fields:
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+            unknown = set(fields) - set(NoteListSerializer.Meta.fields)
+            if unknown:
+                raise ParseError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        else:
+            fields = NoteListSerializer.Meta.fields
+
+        if not search:
+            rows = NoteListRows(request, fields)
+            page = self.paginate_queryset(queryset.values(*rows.columns()))
+            return self.get_paginated_response(rows.render_many(page))
+
+        deferred = [field for field in ('content', 'json_content') if field not in fields]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        if 'user' in fields:
+            queryset = queryset.select_related('user__profile')
+
+        return self.list_page(queryset, NoteListSerializer, search, fields=fields)
+
+    def list_page(self, queryset, serializer_class, search=None, **kwargs):
+        if search:
+            notes = search_notes(queryset, search, self.paginator.get_page_size(self.request))
+            data = serializer_class(notes, many=True, context={'request': self.request}, **kwargs).data
+            for item, note in zip(data, notes):
+                item['rank'] = note.rank
+                item['highlight'] = note.highlight
+            return Response(data)
+
+        page = self.paginate_queryset(queryset)
+        serializer = serializer_class(page, many=True, context={'request': self.request}, **kwargs)
+        return self.get_paginated_response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_notes(self.filter_queryset(self.get_queryset()))
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -49,15 +119,29 @@ class NoteViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(beam__beam_id=beam_id)
         
         search = request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                models.Q(title__icontains=search) | 
-                models.Q(content__icontains=search)
-            )
         
-        serializer = NoteListSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.list_notes(queryset, search=search)
     
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Changes since ?cursor=: notes created, updated or archived, and
+        ids of deleted notes. See note.sync.sync_notes.
+        """
+        notes, deleted, cursor, has_more = sync_notes(
+            self.get_queryset().select_related('user__profile'),
+            request.user.id,
+            request.query_params.get('cursor'),
+            self.paginator.get_page_size(request)
+        )
+        serializer = NoteListSerializer(notes, many=True, context={'request': request})
+        return Response({
+            'notes': serializer.data,
+            'deleted': deleted,
+            'cursor': cursor,
+            'has_more': has_more,
+        })
+
     @action(detail=False, methods=['get'])
     def beam_notes(self, request):
         beam_id = request.query_params.get('beam_id', None)
@@ -66,21 +150,44 @@ class NoteViewSet(viewsets.ModelViewSet):
             return Response({
                 'detail': 'beam_id parameter is required.'
             }, status=status.HTTP_400_BAD_REQUEST)
+
+        since = request.query_params.get('since', None)
+        if since:
+            try:
+                # None when malformed, ValueError for impossible dates.
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({
+                    'detail': 'since must be an ISO 8601 datetime.'
+                }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            queryset = Note.objects.filter(
-                beam__beam_id=beam_id
-            ).select_related('user', 'beam').order_by('-created_at')
+            # Resolve the beam once so the notes query filters on the
+            # indexed foreign key instead of joining through Beam.
+            beam_pk = Beam.objects.filter(beam_id=beam_id).values_list('pk', flat=True).first()
+            if beam_pk is None:
+                return Response([])
+
+            queryset = Note.objects.filter(beam_id=beam_pk)
             
             archived = request.query_params.get('archived', 'false')
             if archived.lower() == 'false':
                 queryset = queryset.filter(archived_at__isnull=True)
             elif archived.lower() == 'true':
                 queryset = queryset.filter(archived_at__isnull=False)
+
+            if since:
+                queryset = queryset.filter(created_at__gt=since)
             
-            serializer = NoteListSerializer(queryset, many=True, context={'request': request})
-            return Response(serializer.data)
+            rows = NoteListRows(request)
+            paginator = CreatedKeysetPagination()
+            page = paginator.paginate_queryset(queryset.values(*rows.columns()), request, view=self)
+            return paginator.get_paginated_response(rows.render_many(page))
             
+        except NotFound:
+            raise
         except Exception as e:
             return Response({
                 'detail': 'An error occurred while fetching beam notes.'
@@ -99,6 +206,7 @@ class NoteViewSet(viewsets.ModelViewSet):
             title=f"{note.title} (Copy)" if note.title else "Untitled (Copy)",
             content=note.content,
             json_content=note.json_content,
+            attachment=note.attachment.name or None,
             note_type=note.note_type
         )
         serializer = self.get_serializer(new_note)
@@ -117,18 +225,21 @@ class NoteViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        queryset = self.get_queryset()
-        
-        stats = {
-            'total_notes': queryset.count(),
-            'notes_by_type': {},
-            'recent_notes': queryset[:5].count(),
-            'archived_notes': queryset.filter(archived_at__isnull=False).count(),
-            'shared_notes': queryset.filter(beam__isnull=False).count(),
-        }
-        
-        for note_type in ['text', 'lexi_note', 'image', 'audio', 'video']:
-            stats['notes_by_type'][note_type] = queryset.filter(note_type=note_type).count()
+        stats = dict(get_note_stats(request.user.id))
+
+        bucket = request.query_params.get('bucket')
+        if bucket:
+            if bucket not in BUCKETS:
+                return Response({
+                    'detail': f"bucket must be one of: {', '.join(BUCKETS)}."
+                }, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+            except ValueError:
+                return Response({
+                    'detail': 'days must be a number.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            stats['created_by_period'] = bucket_note_counts(request.user.id, bucket, days)
         
         return Response(stats)
 
@@ -143,14 +254,14 @@ class NoteDetailView(viewsets.ModelViewSet):
     def archive(self, request, pk=None):
         note = self.get_object()
         note.archived_at = timezone.now()
-        note.save()
+        note.save(update_fields=['archived_at', 'updated_at'])
         return Response({'message': 'Note archived successfully'})
     
     @action(detail=True, methods=['post'])
     def unarchive(self, request, pk=None):
         note = self.get_object()
         note.archived_at = None
-        note.save()
+        note.save(update_fields=['archived_at', 'updated_at'])
         return Response({'message': 'Note unarchived successfully'})
     
     @action(detail=True, methods=['post'])
@@ -162,9 +273,76 @@ class NoteDetailView(viewsets.ModelViewSet):
             try:
                 beam = Beam.objects.get(beam_id=beam_id)
                 note.beam = beam
-                note.save()
+                note.save(update_fields=['beam', 'updated_at'])
                 return Response({'message': 'Note shared successfully'})
             except Beam.DoesNotExist:
                 return Response({'error': 'Beam not found'}, status=status.HTTP_404_NOT_FOUND)
         else:
-            return Response({'error': 'beam_id is required'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({'error': 'beam_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply one operation to many of the user's notes in a single
+        transaction.
+
+        Body: {"operation": "archive" | "unarchive" | "delete" | "move",
+        "ids": [...], "beam_id": ...}; "move" needs beam_id and write access
+        to that beam, null takes the notes out of their beam. Every id gets a result: "ok", "not_found"
+        (no such note of this user) or "invalid_id".
+        """
+        operation = request.data.get('operation')
+        ids = request.data.get('ids')
+
+        if operation not in BULK_OPERATIONS:
+            return Response({'error': f"operation must be one of: {', '.join(BULK_OPERATIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BULK_NOTES:
+            return Response({'error': f'At most {MAX_BULK_NOTES} notes per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        if operation == 'archive':
+            changes = {'archived_at': now}
+        elif operation == 'unarchive':
+            changes = {'archived_at': None}
+        elif operation == 'move':
+            if 'beam_id' not in request.data:
+                return Response({'error': 'beam_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+            beam = None
+            if request.data['beam_id']:
+                beam = Beam.objects.filter(beam_id=request.data['beam_id']).first()
+                if beam is None:
+                    return Response({'error': 'Beam not found'}, status=status.HTTP_404_NOT_FOUND)
+                if get_beam_role(request.user.id, beam.pk) not in WRITE_ROLES:
+                    return Response({'error': 'You do not have permission to post to this beam'}, status=status.HTTP_403_FORBIDDEN)
+            changes = {'beam': beam}
+
+        parsed = []
+        for note_id in ids:
+            try:
+                parsed.append((note_id, uuid.UUID(str(note_id))))
+            except ValueError:
+                parsed.append((note_id, None))
+
+        with transaction.atomic():
+            found = set(self.get_queryset().filter(
+                pk__in=[pk for _, pk in parsed if pk is not None]
+            ).values_list('pk', flat=True))
+            if found:
+                notes = Note.objects.filter(pk__in=found)
+                if operation == 'delete':
+                    # Records tombstones and unindexes the notes in one
+                    # batch; see note.signals.forget_notes.
+                    notes.delete()
+                else:
+                    # update() skips auto_now and signals: stamp updated_at
+                    # for note sync and drop the cached counters by hand.
+                    notes.update(updated_at=now, **changes)
+                    invalidate_note_stats(request.user.id)
+
+        results = {
+            str(note_id): 'invalid_id' if pk is None else 'ok' if pk in found else 'not_found'
+            for note_id, pk in parsed
+        }
+        return Response({'operation': operation, 'count': len(found), 'results': results})
@@ -0,0 +1,108 @@
+"""
+JWT authentication benchmark: REST requests and WebSocket handshakes.
+
+Signs a user in with an access-token cookie and measures --requests
+GET api/auth/me/ calls and --requests handshakes through
+my_auth.middleware.JWTAuthMiddleware (with a no-op inner app), reporting
+latency and database queries per request.
+
+Run it from moveit_backend; it uses a throwaway SQLite database and
+works on older checkouts too, so before/after numbers come from running
+it in each:
+
+    python scripts/bench_auth.py --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-" * 4)
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.ALLOWED_HOSTS = ["*"]
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.backends.utils import CursorWrapper
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from my_auth.middleware import JWTAuthMiddleware
+from my_auth.models import Profile
+
+queries = 0
+execute = CursorWrapper.execute
+
+
+def counting_execute(self, *args, **kwargs):
+    # Counts queries from every thread, including database_sync_to_async's.
+    global queries
+    queries += 1
+    return execute(self, *args, **kwargs)
+
+
+CursorWrapper.execute = counting_execute
+
+
+def report(name, timings, query_count):
+    timings.sort()
+    print(
+        f"{name:20} mean {statistics.mean(timings):7.3f} ms   p99 {timings[int(len(timings) * 0.99) - 1]:7.3f} ms"
+        f"   {query_count / len(timings):.2f} queries/request"
+    )
+
+
+def bench_rest(token, requests):
+    global queries
+    client = Client()
+    client.cookies["access_token"] = token
+    client.get("/api/auth/me/")
+    timings, queries = [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get("/api/auth/me/")
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    report("GET api/auth/me/", timings, queries)
+
+
+async def bench_handshake(token, requests):
+    global queries
+
+    async def app(scope, receive, send):
+        assert scope["user"].is_authenticated
+
+    middleware = JWTAuthMiddleware(app)
+    scope = {"type": "websocket", "headers": [(b"cookie", f"access_token={token}".encode())], "query_string": b""}
+    await middleware(dict(scope), None, None)
+    timings, queries = [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        await middleware(dict(scope), None, None)
+        timings.append((time.perf_counter() - started) * 1000)
+    report("WebSocket handshake", timings, queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    user = User.objects.create_user("bench", "bench@example.com", "bench-password")
+    Profile.objects.get_or_create(user=user)
+    token = str(RefreshToken.for_user(user).access_token)
+
+    bench_rest(token, args.requests)
+    asyncio.run(bench_handshake(token, args.requests))
@@ -0,0 +1,117 @@
+"""
+beam_notes benchmark.
+
+Creates --notes notes in one beam, pasted by --users users with profile
+pictures, then times GET api/notes/beam_notes/: the first response a
+joining client gets, every page of the beam (following X-Next-Cursor
+where the endpoint paginates) and a since= catch-up covering the last
+--recent notes.
+
+Run it from moveit_backend; it uses a throwaway SQLite database and
+works on older checkouts too, so before/after numbers come from running
+it in each:
+
+    python scripts/bench_beam_notes.py --notes 50000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-" * 4)
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.ALLOWED_HOSTS = ["*"]
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from django.utils import timezone
+
+from beam.models import Beam
+from my_auth.models import Profile
+from note.models import Note
+
+BATCH = 5000
+
+
+def create_notes(beam, users, count):
+    # Oldest first, a second apart, so since= can pick the newest ones.
+    start = timezone.now() - timedelta(seconds=count)
+    for offset in range(0, count, BATCH):
+        notes = [
+            Note(user=users[i % len(users)], beam=beam, title=f"paste {i}", content=f"clipboard text {i} " * 8, note_type="text")
+            for i in range(offset, min(offset + BATCH, count))
+        ]
+        Note.objects.bulk_create(notes)
+        for i, note in enumerate(notes, offset):
+            note.created_at = start + timedelta(seconds=i)
+        Note.objects.bulk_update(notes, ["created_at"])
+    return start
+
+
+def fetch(client, params):
+    # Returns (notes, requests), following X-Next-Cursor when present.
+    notes, requests = [], 0
+    cursor = None
+    while True:
+        response = client.get("/api/notes/beam_notes/", {**params, "cursor": cursor} if cursor else params)
+        assert response.status_code == 200, response.status_code
+        notes.extend(response.json())
+        requests += 1
+        cursor = response.get("X-Next-Cursor")
+        if not cursor:
+            return notes, requests
+
+
+def timed(repeat, call):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--recent", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    users = [User.objects.create_user(f"bench{i}") for i in range(args.users)]
+    for user in users:
+        Profile.objects.filter(user=user).update(profile_picture=f"profile_images/{user.pk}.png")
+    beam = Beam.objects.create(beam_id="bench", beam_key="bench", user=users[0])
+    started = time.perf_counter()
+    start = create_notes(beam, users, args.notes)
+    print(f"{args.notes} notes created in {time.perf_counter() - started:.1f} s")
+
+    client = Client()
+    params = {"beam_id": beam.beam_id}
+
+    def first_response():
+        response = client.get("/api/notes/beam_notes/", params)
+        assert response.status_code == 200
+        return len(response.json())
+
+    median, rows = timed(args.repeat, first_response)
+    print(f"first response   median {median:9.1f} ms   {rows} notes")
+    median, (notes, requests) = timed(args.repeat, lambda: fetch(client, params))
+    print(f"whole beam       median {median:9.1f} ms   {len(notes)} notes in {requests} requests")
+    since = (start + timedelta(seconds=args.notes - args.recent) - timedelta(milliseconds=500)).isoformat()
+    median, (notes, requests) = timed(args.repeat, lambda: fetch(client, {**params, "since": since}))
+    print(f"since= catch-up  median {median:9.1f} ms   {len(notes)} notes in {requests} requests")
@@ -0,0 +1,122 @@
+"""
+Broadcast load benchmark for BeamConsumer.
+
+Connects --clients sockets to one beam over channels' in-memory layer,
+then has one of them send --messages share_clipboard frames, first one
+at a time (fan-out latency: send until the last member has the frame)
+and then all at once (delivered messages per second).
+
+Run it from moveit_backend; it uses a throwaway SQLite database and
+works on older checkouts too, so before/after numbers come from running
+it in each:
+
+    python scripts/bench_broadcast.py --clients 50 --messages 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": 100000}}}
+settings.BEAM_PRESENCE = {"BACKEND": "beam.presence.InMemoryPresenceBackend"}
+settings.BEAM_REPLAY = {"BACKEND": "beam.replay.InMemoryReplayBackend"}
+settings.BEAM_RATE_LIMITS = {}
+settings.BEAM_BACKPRESSURE = {"max_lag": 3600}
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+
+from beam.models import Beam
+from beam.routing import websocket_urlpatterns
+
+try:
+    from beam.tokens import issue_beam_token
+except ImportError:
+    # Checkouts from before beam tokens let anyone join by beam id.
+    issue_beam_token = None
+
+
+async def join(app, beam):
+    communicator = WebsocketCommunicator(app, f"/ws/beam/{beam.beam_id}/")
+    communicator.scope["user"] = AnonymousUser()
+    connected, _ = await communicator.connect()
+    assert connected
+    token = issue_beam_token(beam.beam_id, beam.pk) if issue_beam_token else beam.beam_key
+    await communicator.send_json_to({"type": "auth", "message": token})
+    while (await communicator.receive_json_from(timeout=5))["type"] != "auth_success":
+        pass
+    return communicator
+
+
+async def collect(communicator, arrivals, expected):
+    while len(arrivals) < expected:
+        message = await communicator.receive_json_from(timeout=30)
+        if message["type"] == "rec_clipboard":
+            arrivals.append((int(message["message"].split(":")[0]), time.perf_counter()))
+
+
+async def run(clients, messages, size):
+    await sync_to_async(call_command)("migrate", verbosity=0)
+    beam = await sync_to_async(Beam.objects.create)(beam_id="bench", beam_key="bench")
+    app = URLRouter(websocket_urlpatterns)
+    members = [await join(app, beam) for _ in range(clients)]
+    sender = members[0]
+    padding = "x" * size
+
+    async def phase(first, count, wait_each):
+        arrivals = [[] for _ in members]
+        collectors = [
+            asyncio.create_task(collect(member, received, count))
+            for member, received in zip(members, arrivals)
+        ]
+        sent_at = {}
+        started = time.perf_counter()
+        for i in range(first, first + count):
+            sent_at[i] = time.perf_counter()
+            await sender.send_json_to({"type": "share_clipboard", "message": f"{i}:{padding}", "extra": "text"})
+            if wait_each:
+                while any(len(received) < i - first + 1 for received in arrivals):
+                    await asyncio.sleep(0)
+        await asyncio.gather(*collectors)
+        elapsed = time.perf_counter() - started
+        last = {}
+        for received in arrivals:
+            for i, at in received:
+                last[i] = max(last.get(i, 0), at)
+        latencies = sorted((last[i] - sent_at[i]) * 1000 for i in sent_at)
+        return elapsed, latencies
+
+    _, latencies = await phase(0, messages, wait_each=True)
+    elapsed, _ = await phase(messages, messages, wait_each=False)
+
+    for member in members:
+        await member.disconnect()
+
+    print(f"{clients} clients, {messages} messages of {size} bytes")
+    print(f"fan-out latency   p50 {statistics.median(latencies):7.2f} ms   p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms")
+    print(f"burst throughput  {messages * clients / elapsed:9.0f} messages delivered/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--size", type=int, default=200, help="clipboard payload bytes")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.messages, args.size))
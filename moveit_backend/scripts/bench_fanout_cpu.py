@@ -0,0 +1,144 @@
+"""
+Fan-out CPU benchmark for BeamConsumer.
+
+Connects --clients sockets to one beam over channels' in-memory layer,
+speaking --codec (moveit.json or moveit.msgpack), then has one of them
+send --messages broadcasts of --kind: image or text clipboards of
+--size bytes, or short chat messages. Reports the process CPU time per
+member per broadcast and, for clipboards, per MB fanned out to every
+member; both cover decoding the frame, encoding the broadcast and
+forwarding it.
+
+Run it from moveit_backend; it uses a throwaway SQLite database and
+works on older checkouts too (those without msgpack are measured with
+JSON), so before/after numbers come from running it in each:
+
+    python scripts/bench_fanout_cpu.py --clients 50 --size 1000000
+    python scripts/bench_fanout_cpu.py --clients 50 --size 1000000 --codec msgpack
+    python scripts/bench_fanout_cpu.py --clients 50 --kind text --size 20000 --messages 200
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": 100000}}}
+settings.BEAM_PRESENCE = {"BACKEND": "beam.presence.InMemoryPresenceBackend"}
+settings.BEAM_REPLAY = {"BACKEND": "beam.replay.InMemoryReplayBackend"}
+settings.BEAM_RATE_LIMITS = {}
+settings.BEAM_BACKPRESSURE = {"max_lag": 3600}
+
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+
+from beam.models import Beam
+from beam.routing import websocket_urlpatterns
+
+try:
+    from beam.tokens import issue_beam_token
+except ImportError:
+    # Checkouts from before beam tokens let anyone join by beam id.
+    issue_beam_token = None
+
+SUBPROTOCOLS = {"json": "moveit.json", "msgpack": "moveit.msgpack"}
+KINDS = ("image", "text", "message")
+
+
+class Member:
+    def __init__(self, communicator, binary):
+        self.communicator = communicator
+        self.binary = binary
+
+    async def send(self, message):
+        if self.binary:
+            # Flag byte 0: an uncompressed msgpack frame.
+            await self.communicator.send_to(bytes_data=b"\0" + msgpack.packb(message))
+        else:
+            await self.communicator.send_json_to(message)
+
+    async def receive_raw(self):
+        return await self.communicator.receive_output(timeout=30)
+
+
+async def join(app, beam, codec):
+    communicator = WebsocketCommunicator(app, f"/ws/beam/{beam.beam_id}/", subprotocols=[SUBPROTOCOLS[codec]])
+    communicator.scope["user"] = AnonymousUser()
+    connected, subprotocol = await communicator.connect()
+    assert connected
+    member = Member(communicator, subprotocol == SUBPROTOCOLS["msgpack"])
+    token = issue_beam_token(beam.beam_id, beam.pk) if issue_beam_token else beam.beam_key
+    await member.send({"type": "auth", "message": token})
+    # auth_success, the member list and (where there is one) the replay.
+    while not await communicator.receive_nothing(timeout=0.2):
+        await communicator.receive_output()
+    return member
+
+
+def outbound(kind, size):
+    if kind == "image":
+        image = "data:image/png;base64," + base64.b64encode(os.urandom(size * 3 // 4)).decode()
+        return {"type": "share_clipboard", "message": image, "extra": "image"}, len(image)
+    if kind == "text":
+        return {"type": "share_clipboard", "message": "x" * size, "extra": "text"}, size
+    return {"type": "message", "message": "hello there " * 5}, None
+
+
+async def run(clients, messages, size, codec, kind):
+    await sync_to_async(call_command)("migrate", verbosity=0)
+    beam = await sync_to_async(Beam.objects.create)(beam_id="bench", beam_key="bench")
+    app = URLRouter(websocket_urlpatterns)
+    members = [await join(app, beam, codec) for _ in range(clients)]
+    for member in members:
+        # Join announcements sent to earlier members.
+        while not await member.communicator.receive_nothing(timeout=0.05):
+            await member.communicator.receive_output()
+    sender = members[0]
+    message, payload = outbound(kind, size)
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    for _ in range(messages):
+        await sender.send(message)
+        # Every member, the sender included, gets the broadcast.
+        for member in members:
+            await member.receive_raw()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+
+    for member in members:
+        await member.communicator.disconnect()
+
+    used = "msgpack" if sender.binary else "json"
+    print(f"{clients} clients on {used}, {messages} {kind} broadcasts" + (f" of {payload} bytes" if payload else ""))
+    print(f"CPU per member         {cpu * 1e6 / (messages * clients):8.1f} us")
+    if payload:
+        megabytes = messages * payload / 1e6
+        print(f"CPU per MB fanned out  {cpu * 1000 / megabytes:8.1f} ms   ({wall * 1000 / megabytes:.1f} ms wall)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--size", type=int, default=1000000, help="clipboard payload bytes")
+    parser.add_argument("--codec", choices=sorted(SUBPROTOCOLS), default="json")
+    parser.add_argument("--kind", choices=KINDS, default="image")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.messages, args.size, args.codec, args.kind))
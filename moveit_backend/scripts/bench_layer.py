@@ -0,0 +1,141 @@
+"""
+Channel layer benchmark: HybridChannelLayer against RedisChannelLayer.
+
+Puts --members channels in one group, split between two layer
+instances standing in for two workers, then group_send()s --messages
+beam frames from the first one, each after the last was delivered.
+Reports the fan-out latency (send until every member has it) and the
+Redis commands per broadcast, for every local/remote split.
+
+Needs a Redis at --host/--port; without one, a fakeredis server is
+started in-process if fakeredis is installed (its blocking pops wake
+slowly, so only the command counts carry over to real Redis). Run it
+from moveit_backend:
+
+    python scripts/bench_layer.py --members 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django
+
+django.setup()
+
+import redis
+import redis.asyncio.client
+from channels_redis.core import RedisChannelLayer
+
+try:
+    from beam.layers import HybridChannelLayer
+except ImportError:
+    # Checkouts from before the hybrid layer only have the stock one.
+    HybridChannelLayer = None
+
+commands = 0
+
+
+def count_commands():
+    # Every command the layers send, pipelined ones included.
+    execute_command = redis.asyncio.client.Redis.execute_command
+    execute_pipeline = redis.asyncio.client.Pipeline.execute
+
+    async def counted_command(self, *args, **kwargs):
+        global commands
+        commands += 1
+        return await execute_command(self, *args, **kwargs)
+
+    async def counted_pipeline(self, *args, **kwargs):
+        global commands
+        commands += len(self.command_stack)
+        return await execute_pipeline(self, *args, **kwargs)
+
+    redis.asyncio.client.Redis.execute_command = counted_command
+    redis.asyncio.client.Pipeline.execute = counted_pipeline
+
+
+def ensure_redis(host, port):
+    try:
+        redis.Redis(host=host, port=port).ping()
+        return
+    except redis.ConnectionError:
+        pass
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer((host, port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"no Redis at {host}:{port}; using fakeredis")
+
+
+async def broadcast(layer_class, hosts, local, remote, messages):
+    global commands
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    sender, other = layer_class(hosts=hosts, prefix=prefix), layer_class(hosts=hosts, prefix=prefix)
+    group = "beam_bench"
+    members = []
+    for layer, count in ((sender, local), (other, remote)):
+        for _ in range(count):
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            members.append((layer, channel))
+
+    arrivals = {}
+
+    async def receive(layer, channel):
+        while True:
+            message = await layer.receive(channel)
+            arrivals.setdefault(message["n"], []).append(time.perf_counter())
+
+    receivers = [asyncio.create_task(receive(layer, channel)) for layer, channel in members]
+    await asyncio.sleep(0.2)
+    commands = 0
+    latencies = []
+    for n in range(messages):
+        started = time.perf_counter()
+        await sender.group_send(group, {"type": "beam.frame", "n": n, "frames": {"moveit.json": "x" * 200}})
+        while len(arrivals.get(n, ())) < len(members):
+            await asyncio.sleep(0)
+        latencies.append((max(arrivals[n]) - started) * 1000)
+    per_broadcast = commands / messages
+
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*receivers, return_exceptions=True)
+    for layer in (sender, other):
+        await layer.flush()
+        await layer.close_pools()
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], per_broadcast
+
+
+async def run(hosts, members, messages):
+    layers = [("stock", RedisChannelLayer)]
+    if HybridChannelLayer is not None:
+        layers.append(("hybrid", HybridChannelLayer))
+    print(f"{members} members, {messages} broadcasts")
+    print("local/remote  layer     p50         p99        cmds/broadcast")
+    for local in (members, members // 2, 0):
+        for name, layer_class in layers:
+            p50, p99, per_broadcast = await broadcast(layer_class, hosts, local, members - local, messages)
+            print(f"{local:5d}/{members - local:<6d}  {name:7}  {p50:7.2f} ms  {p99:7.2f} ms  {per_broadcast:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--members", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    ensure_redis(args.host, args.port)
+    count_commands()
+    asyncio.run(run([(args.host, args.port)], args.members, args.messages))
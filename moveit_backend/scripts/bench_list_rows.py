@@ -0,0 +1,131 @@
+"""
+List rendering benchmark: values() rows against the serializers.
+
+Creates --rows notes (pasted by --users users with profile pictures
+into --beams beams) and --rows beam shares, then renders each list both
+ways: NoteListSerializer against NoteListRows, and BeamShareSerializer
+against BeamShareRows. Times the query and render together and the
+render alone, and checks that both produce the same output.
+
+Run it from moveit_backend; it uses a throwaway SQLite database:
+
+    python scripts/bench_list_rows.py --rows 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-" * 4)
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.ALLOWED_HOSTS = ["*"]
+# Every share renders a beam token; the serializer looks the role up.
+settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from beam.models import Beam, BeamShare
+from beam.serializers import BeamShareRows, BeamShareSerializer
+from my_auth.models import Profile
+from note.models import Note
+from note.serializers import NoteListRows, NoteListSerializer
+
+BATCH = 5000
+
+
+def create_rows(rows, users, beams):
+    users = [User.objects.create_user(f"bench{i}", f"bench{i}@example.com", first_name=f"Bench {i}") for i in range(users)]
+    for user in users:
+        Profile.objects.filter(user=user).update(profile_picture=f"profile_images/{user.pk}.png")
+    reader = User.objects.create_user("reader")
+    note_beams = Beam.objects.bulk_create(
+        Beam(beam_id=f"notes{i}", beam_key="bench", user=users[i % len(users)]) for i in range(beams)
+    )
+    for offset in range(0, rows, BATCH):
+        Note.objects.bulk_create(
+            Note(user=users[i % len(users)], beam=note_beams[i % len(note_beams)], title=f"paste {i}",
+                 content=f"clipboard text {i} " * 8, note_type="text")
+            for i in range(offset, min(offset + BATCH, rows))
+        )
+    # Shares need a beam each: the reader holds one share per beam.
+    share_beams = Beam.objects.bulk_create(
+        Beam(beam_id=f"shared{i}", beam_key="bench", beam_name=f"Beam {i}", user=users[i % len(users)]) for i in range(rows)
+    )
+    BeamShare.objects.bulk_create(
+        BeamShare(beam=beam, shared_by=beam.user, shared_with=reader, share_type=("read", "write", "admin")[i % 3])
+        for i, beam in enumerate(share_beams)
+    )
+    return reader
+
+
+def timed(repeat, call):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def compare(name, repeat, instances, serialize, values, render):
+    # Timed from the querysets (.all() skips their result cache), then
+    # again from already fetched rows for the render alone.
+    serializer_total, expected = timed(repeat, lambda: serialize(instances.all()))
+    rows_total, rendered = timed(repeat, lambda: render(values.all()))
+    assert rendered == expected, f"{name}: rows differ from the serializer"
+    instances, values = list(instances), list(values)
+    serializer_render, _ = timed(repeat, lambda: serialize(instances))
+    rows_render, _ = timed(repeat, lambda: render(values))
+    print(f"{name} ({len(rendered)} rows, identical output)")
+    print(f"  query + render  serializer {serializer_total:8.1f} ms   rows {rows_total:7.1f} ms   {serializer_total / rows_total:4.1f}x")
+    print(f"  render only     serializer {serializer_render:8.1f} ms   rows {rows_render:7.1f} ms   {serializer_render / rows_render:4.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--beams", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    started = time.perf_counter()
+    reader = create_rows(args.rows, args.users, args.beams)
+    print(f"{args.rows} notes and shares created in {time.perf_counter() - started:.1f} s")
+
+    request = RequestFactory().get("/api/notes/")
+    request.user = reader
+    notes = Note.objects.order_by("-created_at", "-id")
+    shares = BeamShare.objects.filter(shared_with=reader).order_by("-created_at", "-id")
+
+    compare(
+        "notes", args.repeat,
+        notes.select_related("user__profile", "beam"),
+        lambda page: NoteListSerializer(page, many=True, context={"request": request}).data,
+        notes.values(*NoteListRows(request).columns()),
+        lambda page: NoteListRows(request).render_many(page),
+    )
+    # Tokens are signed with the time; fix it so both sides match.
+    with patch("time.time", return_value=time.time()):
+        compare(
+            "beam shares", args.repeat,
+            shares.select_related("beam__user__profile", "shared_by__profile", "shared_with__profile"),
+            lambda page: BeamShareSerializer(page, many=True, context={"request": request}).data,
+            shares.values(*BeamShareRows.columns),
+            lambda page: BeamShareRows(request, shared_with=True).render_many(page),
+        )
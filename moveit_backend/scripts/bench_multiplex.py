@@ -0,0 +1,118 @@
+"""
+Multiplexing benchmark: one socket per beam against ws/beams/.
+
+Joins --beams beams as an anonymous token holder, first with a
+ws/beam/<id>/ socket per beam and then with one ws/beams/ socket
+subscribed to all of them, over channels' in-memory layer. Reports the
+time to join, the sockets and asyncio tasks held open, and the memory
+they hold (tracemalloc).
+
+Run it from moveit_backend; it uses a throwaway SQLite database. On
+checkouts without ws/beams/ only the first half runs:
+
+    python scripts/bench_multiplex.py --beams 50
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+settings.BEAM_PRESENCE = {"BACKEND": "beam.presence.InMemoryPresenceBackend"}
+settings.BEAM_REPLAY = {"BACKEND": "beam.replay.InMemoryReplayBackend"}
+settings.BEAM_RATE_LIMITS = {}
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+
+from beam import consumers
+from beam.models import Beam
+from beam.routing import websocket_urlpatterns
+from beam.tokens import issue_beam_token
+
+# Frames a member gets on joining: auth_success, authed_users and the
+# clipboard replay.
+JOIN_FRAMES = 3
+
+
+async def connect(app, path):
+    communicator = WebsocketCommunicator(app, path)
+    communicator.scope["user"] = AnonymousUser()
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def socket_per_beam(app, tokens):
+    sockets = []
+    for beam_id, token in tokens:
+        communicator = await connect(app, f"/ws/beam/{beam_id}/")
+        await communicator.send_json_to({"type": "auth", "message": token})
+        sockets.append(communicator)
+    for communicator in sockets:
+        for _ in range(JOIN_FRAMES):
+            await communicator.receive_json_from(timeout=5)
+    return sockets
+
+
+async def one_socket(app, tokens):
+    communicator = await connect(app, "/ws/beams/")
+    for beam_id, token in tokens:
+        await communicator.send_json_to({"type": "subscribe", "beam": beam_id, "message": token})
+    for _ in range(JOIN_FRAMES * len(tokens)):
+        message = await communicator.receive_json_from(timeout=5)
+        assert message["type"] not in ("auth_failed", "unsubscribed"), message
+    return [communicator]
+
+
+async def measure(label, join, app, tokens):
+    gc.collect()
+    tracemalloc.start()
+    tasks = len(asyncio.all_tasks())
+    started = time.perf_counter()
+    sockets = await join(app, tokens)
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tasks = len(asyncio.all_tasks()) - tasks
+    tracemalloc.stop()
+    for communicator in sockets:
+        await communicator.disconnect()
+    print(f"{label:16} {len(sockets):4d} sockets  {tasks:5d} tasks  {memory / 1024:8.0f} KiB  {elapsed * 1000:7.0f} ms to join")
+
+
+async def run(beams):
+    await sync_to_async(call_command)("migrate", verbosity=0)
+    created = await sync_to_async(lambda: [
+        Beam.objects.create(beam_id=f"bench{i}", beam_key="bench") for i in range(beams)
+    ])()
+    tokens = [(beam.beam_id, issue_beam_token(beam.beam_id, beam.pk)) for beam in created]
+    app = URLRouter(websocket_urlpatterns)
+
+    print(f"{beams} beams")
+    await measure("socket per beam", socket_per_beam, app, tokens)
+    if hasattr(consumers, "BeamMultiplexConsumer"):
+        await measure("multiplexed", one_socket, app, tokens)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--beams", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.beams))
@@ -0,0 +1,97 @@
+"""
+Note search benchmark.
+
+Creates --notes notes for one user, with text drawn from a synthetic
+vocabulary, then times GET api/notes/my_notes/?search= for a common
+word, a rare word and a word prefix.
+
+Run it from moveit_backend; it uses a throwaway SQLite database and
+works on older checkouts too, so before/after numbers come from running
+it in each:
+
+    python scripts/bench_search.py --notes 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-" * 4)
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+settings.ALLOWED_HOSTS = ["*"]
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from note.models import Note
+
+try:
+    from note.search import index_notes, prepare_note
+except ImportError:
+    # Checkouts from before the search index searched with icontains.
+    index_notes = prepare_note = None
+
+BATCH = 5000
+
+
+def word(rank):
+    return "w{}x".format(rank)
+
+
+def create_notes(user, count):
+    rng = random.Random(0)
+    # Zipf-like: low ranks are common words, high ranks rare ones.
+    weights = [1 / rank for rank in range(1, 20001)]
+    ranks = list(range(1, 20001))
+    for start in range(0, count, BATCH):
+        notes = []
+        for i in range(start, min(start + BATCH, count)):
+            words = [word(rank) for rank in rng.choices(ranks, weights, k=60)]
+            note = Note(user=user, title=" ".join(words[:4]), content=" ".join(words[4:]), note_type="text")
+            if prepare_note:
+                prepare_note(note)
+            notes.append(note)
+        Note.objects.bulk_create(notes)
+        if index_notes:
+            index_notes(notes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    user = User.objects.create_user("bench", "bench@example.com", "bench-password")
+    started = time.perf_counter()
+    create_notes(user, args.notes)
+    print(f"{args.notes} notes created in {time.perf_counter() - started:.1f} s")
+
+    client = Client()
+    client.cookies["access_token"] = str(RefreshToken.for_user(user).access_token)
+    for name, term in (("common word", word(3)), ("rare word", word(15000)), ("prefix", "w1500")):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.get("/api/notes/my_notes/", {"search": term})
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200
+        timings.sort()
+        print(
+            f"{name:12} {term!r:9} median {statistics.median(timings):8.1f} ms   max {timings[-1]:8.1f} ms"
+            f"   {len(response.json())} results"
+        )
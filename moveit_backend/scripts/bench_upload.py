@@ -0,0 +1,151 @@
+"""
+Upload proxy benchmark for api/upload/.
+
+Sends --uploads concurrent multipart uploads of --size MiB through
+Django's ASGI handler to a local stand-in for 0x0.st, and reports the
+wall time, how late a 5 ms ticker on the event loop ran while they
+ran (p99 and worst), and the process's peak RSS, which includes the
+benchmark's own copy of the upload body.
+
+Run it from moveit_backend; it works on older checkouts too, so
+before/after numbers come from running it in each:
+
+    python scripts/bench_upload.py --uploads 8 --size 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moveit.settings")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-" * 4)
+
+
+class StandIn(BaseHTTPRequestHandler):
+    # Reads and discards the upload, then answers like 0x0.st.
+    def do_POST(self):
+        remaining = int(self.headers["Content-Length"])
+        while remaining:
+            remaining -= len(self.rfile.read(min(65536, remaining)))
+        body = b"https://stand.in/file\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(ports):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+# In its own process, so its threads don't compete with the event loop
+# for the GIL.
+ports = multiprocessing.Queue()
+multiprocessing.Process(target=serve, args=(ports,), daemon=True).start()
+os.environ["ZEROXZERO_UPLOAD_URL"] = f"http://127.0.0.1:{ports.get()}/"
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.ALLOWED_HOSTS = ["*"]
+settings.ZEROXZERO_UPLOAD_URL = os.environ["ZEROXZERO_UPLOAD_URL"]
+
+import beam.views
+import httpx
+from django.core.asgi import get_asgi_application
+
+if not hasattr(beam.views, "get_upload_client"):
+    # Checkouts from before ZEROXZERO_UPLOAD_URL posted to 0x0.st itself.
+    real_post = httpx.Client.post
+    httpx.Client.post = lambda self, url, *args, **kwargs: real_post(self, settings.ZEROXZERO_UPLOAD_URL, *args, **kwargs)
+
+BOUNDARY = "benchboundary"
+CHUNK = 64 * 1024
+
+
+def multipart(size):
+    head = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.bin\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    return head + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def upload(app, body):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/upload/", "raw_path": b"/api/upload/", "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    offsets = iter(range(0, len(body), CHUNK))
+    statuses = []
+
+    async def receive():
+        offset = next(offsets, None)
+        if offset is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(0)
+        return {"type": "http.request", "body": body[offset:offset + CHUNK], "more_body": offset + CHUNK < len(body)}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await app(scope, receive, send)
+    return statuses[0]
+
+
+async def run(uploads, size):
+    app = get_asgi_application()
+    # Warm up: the first request imports modules and loads the URLconf,
+    # and one larger than FILE_UPLOAD_MAX_MEMORY_SIZE is spooled to disk.
+    await upload(app, multipart(4 * 1024 * 1024))
+    body = multipart(size * 1024 * 1024)
+    stalls = []
+    done = False
+
+    async def ticker():
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            stalls.append((time.perf_counter() - started - 0.005) * 1000)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*[upload(app, body) for _ in range(uploads)])
+    elapsed = time.perf_counter() - started
+    done = True
+    await ticking
+
+    assert statuses == [200] * uploads, statuses
+    print(f"{uploads} uploads of {size} MiB")
+    print(f"wall time          {elapsed:7.2f} s")
+    stalls.sort()
+    print(f"loop stall         p99 {stalls[int(len(stalls) * 0.99) - 1]:6.1f} ms   worst {stalls[-1]:6.1f} ms")
+    print(f"peak RSS           {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:7.0f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--size", type=int, default=50, help="MiB per upload")
+    args = parser.parse_args()
+    asyncio.run(run(args.uploads, args.size))
@@ -3,6 +3,29 @@ import { api } from '../consts';
 
 const SessionContext = createContext(null);
 
+// Beam tokens are Django signing tokens: "<payload>:<timestamp>:<signature>"
+// with a base64url JSON payload whose "e" claim is the expiry in seconds.
+// Compressed payloads start with "." and aren't decoded here.
+const tokenExpiresAt = (token) => {
+  try {
+    const payload = token.split(':')[0];
+    if (payload.startsWith('.')) {
+      return null;
+    }
+    const base64 = payload.replace(/-/g, '+').replace(/_/g, '/');
+    const claims = JSON.parse(atob(base64 + '='.repeat((4 - base64.length % 4) % 4)));
+    return typeof claims.e === 'number' ? claims.e * 1000 : null;
+  } catch {
+    return null;
+  }
+};
+
+const sessionExpired = (session) => {
+  const expiresAt = tokenExpiresAt(session.beam_token) ?? Date.parse(session.expiresAt);
+  // Sessions without a readable expiry are treated as expired.
+  return !(expiresAt > Date.now());
+};
+
 export const useSession = () => {
   const context = useContext(SessionContext);
   if (!context) {
@@ -17,7 +40,7 @@ export const SessionProvider = ({ children }) => {
   const checkBeamHasNotes = async (beamId) => {
     try {
       const response = await api.get('/notes/beam_notes/', {
-        params: { beam_id: beamId },
+        params: { beam_id: beamId, page_size: 1 },
         withCredentials: true
       });
       return response.data && response.data.length > 0;
@@ -47,6 +70,18 @@ export const SessionProvider = ({ children }) => {
       let savedBeamSession = localStorage.getItem("session");
       if (savedBeamSession != null) {
         const parsedSession = JSON.parse(savedBeamSession);
+
+        if (!parsedSession.beam_token) {
+          // Saved before beams needed a token to join
+          newSession();
+          return;
+        }
+
+        if (sessionExpired(parsedSession)) {
+          // The server would turn the expired token away
+          newSession();
+          return;
+        }
         
         checkBeamHasNotes(parsedSession.beam_id).then(hasNotes => {
           if (hasNotes) {
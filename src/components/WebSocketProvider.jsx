@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, useEffect } from 'react'
+import { createContext, useContext, useState, useEffect, useRef } from 'react'
 import useWebSocket from 'react-use-websocket'
 import { api } from '../consts'
 import toast from 'react-hot-toast'
@@ -13,6 +13,11 @@ export const useWebSocketContext = () => {
   return context
 }
 
+// Identifies a paste across the replay buffer and saved beam notes, which
+// give lexi notes as {title, content} and as their title respectively.
+const clipboardKey = (extra, content) =>
+  `${extra}:${typeof content === 'string' ? content : content?.title}`
+
 export const WebSocketProvider = ({ children, session }) => {
   const [isConnected, setIsConnected] = useState(false)
   const [shouldConnect, setShouldConnect] = useState(null)
@@ -20,45 +25,53 @@ export const WebSocketProvider = ({ children, session }) => {
   const [sharedClipboards, setSharedClipboards] = useState([])
   const [beamNotes, setBeamNotes] = useState([])
   const [isLoadingNotes, setIsLoadingNotes] = useState(false)
+  const presenceVersion = useRef(0)
 
   const auth = () => {
-    sendJsonMessage({ type: 'auth', message: session?.beam_key })
+    sendJsonMessage({ type: 'auth', message: session?.beam_token })
   }
 
   const loadBeamNotes = async (beamId, caller = 'unknown') => {
-    setSharedClipboards([])
-    
     if (!beamId) {
+      setSharedClipboards([])
       return;
     }
     
     setIsLoadingNotes(true);
     
     try {
-      const response = await api.get('/notes/beam_notes/', {
-        params: { beam_id: beamId },
-        withCredentials: true
-      });
-      
-      if (response.data) {
-        const convertedNotes = response.data.map((note, index) => ({
-          id: note.id,
-          content: note.content || note.title || 'Untitled Note',
-          extra: note.note_type,
-          worldX: Math.random() * (window.innerWidth - 300),
-          worldY: Math.random() * (window.innerHeight - 200),
-          isBeamNote: true,
-          noteData: note,
-          user: note.user, // Include user information from the API response
-          index: index
-        }));
-        
-        setSharedClipboards(prev => {
-          const nonBeamNotes = prev.filter(item => !item.isBeamNote);
-          const newClipboards = [...nonBeamNotes, ...convertedNotes];
-          return newClipboards;
+      // beam_notes is paginated; follow X-Next-Cursor to the last page.
+      const notes = [];
+      let cursor = null;
+      do {
+        const response = await api.get('/notes/beam_notes/', {
+          params: cursor ? { beam_id: beamId, cursor } : { beam_id: beamId },
+          withCredentials: true
         });
-      }
+        notes.push(...(response.data || []));
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      
+      const convertedNotes = notes.map((note, index) => ({
+        id: note.id,
+        content: note.attachment || note.content || note.title || 'Untitled Note',
+        extra: note.note_type,
+        worldX: Math.random() * (window.innerWidth - 300),
+        worldY: Math.random() * (window.innerHeight - 200),
+        isBeamNote: true,
+        noteData: note,
+        user: note.user, // Include user information from the API response
+        index: index
+      }));
+      
+      setSharedClipboards(prev => {
+        // Live and replayed pastes that have been saved meanwhile come
+        // back as beam notes; keep only the ones that have not.
+        const saved = new Set(convertedNotes.map(note => clipboardKey(note.extra, note.content)));
+        const nonBeamNotes = prev.filter(item => !item.isBeamNote && !saved.has(clipboardKey(item.extra, item.content)));
+        const newClipboards = [...nonBeamNotes, ...convertedNotes];
+        return newClipboards;
+      });
     } catch (error) {
       console.error('Failed to load beam notes:', error);
       if (error.response?.status !== 401) {
@@ -98,11 +111,40 @@ export const WebSocketProvider = ({ children, session }) => {
     if (lastJsonMessage != null) {
       if (lastJsonMessage.type === 'auth_success' || lastJsonMessage.type === 'auth_sucess') {
         setIsConnected(true)
+      } else if (lastJsonMessage.type == 'clipboard_replay') {
+        // Recent pastes, sent right after auth_success, show at once; the
+        // saved notes load behind them and replace the replayed pastes
+        // they already hold.
+        const replayed = lastJsonMessage.message ?? []
+        setSharedClipboards(replayed.map((clipboard, index) => ({
+          id: `replay-${index}`,
+          content: clipboard.message,
+          extra: clipboard.extra,
+          ...(clipboard.user ? { user: clipboard.user } : {})
+        })))
         if (session?.beam_id) {
-          loadBeamNotes(session.beam_id, 'auth_success')
+          loadBeamNotes(session.beam_id, 'clipboard_replay')
         }
       } else if (lastJsonMessage.type == 'authed_users') {
+        presenceVersion.current = lastJsonMessage.version ?? 0
         setConnectedDevices(lastJsonMessage.users)
+      } else if (lastJsonMessage.type == 'presence_join' || lastJsonMessage.type == 'presence_leave') {
+        const version = lastJsonMessage.version
+        if (version <= presenceVersion.current) {
+          // Already covered by the last snapshot
+        } else if (version != presenceVersion.current + 1) {
+          sendJsonMessage({ type: 'presence_sync', message: presenceVersion.current })
+        } else {
+          presenceVersion.current = version
+          if (lastJsonMessage.type == 'presence_join') {
+            setConnectedDevices(prev => [
+              ...prev.filter((device) => device.client_id != lastJsonMessage.member.client_id),
+              lastJsonMessage.member
+            ])
+          } else {
+            setConnectedDevices(prev => prev.filter((device) => device.client_id != lastJsonMessage.client_id))
+          }
+        }
       } else if (lastJsonMessage.type == 'rec_clipboard') {
         const newClipboard = {
           id: Date.now(), 
@@ -126,6 +168,12 @@ export const WebSocketProvider = ({ children, session }) => {
         if (session?.beam_id) {
           loadBeamNotes(session.beam_id, 'delete_note')
         }
+      } else if (lastJsonMessage.type == 'permission_denied') {
+        toast.error("You don't have permission to do that in this beam")
+      } else if (lastJsonMessage.type == 'rate_limited') {
+        toast.error("Slow down! That was sent too quickly, try again in a moment")
+      } else if (lastJsonMessage.type == 'invalid_frame') {
+        console.error('Beam rejected a message:', lastJsonMessage.message)
       } else if (lastJsonMessage.type == 'beam_notes_loaded') {
       } else {
       }
@@ -133,9 +181,7 @@ export const WebSocketProvider = ({ children, session }) => {
   }, [lastJsonMessage, session?.beam_id])
 
   useEffect(() => {
-    if (session?.beam_id && isConnected) {
-      loadBeamNotes(session.beam_id, 'session_connected')
-    } else {
+    if (!(session?.beam_id && isConnected)) {
       setSharedClipboards(prev => prev.filter(item => !item.isBeamNote))
     }
   }, [session?.beam_id, isConnected])
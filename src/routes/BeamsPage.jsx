@@ -22,6 +22,16 @@ import { useNavigate } from "react-router-dom";
 import toast from "react-hot-toast";
 import { api } from "../consts";
 
+// Beams without a token (e.g. the server couldn't mint one) are joined by
+// id alone, as the signed-in user.
+const beamUrl = (beamId, beamToken) => {
+  const params = new URLSearchParams({ beam_id: beamId });
+  if (beamToken) {
+    params.set("beam_token", beamToken);
+  }
+  return `/?${params}`;
+};
+
 const BeamsPage = () => {
   const navigate = useNavigate();
   const { user } = useAuth();
@@ -43,23 +53,32 @@ const BeamsPage = () => {
     fetchBeams();
   }, []);
 
-  const fetchBeams = async () => {
-    setIsLoading(true);
-    try {
-      const beamsResponse = await api.get("beams/", {
-        withCredentials: true,
-      });
-      setBeams(beamsResponse.data.beams || []);
-
-      const sharedResponse = await api.get("beams/shared-with-me/", {
+  // List endpoints are paginated; follow X-Next-Cursor to the last page.
+  const fetchAllPages = async (url, key) => {
+    const items = [];
+    let cursor = null;
+    do {
+      const response = await api.get(url, {
+        params: cursor ? { cursor } : {},
         withCredentials: true,
       });
-      setSharedBeams(sharedResponse.data.shared_beams || []);
+      items.push(...(response.data[key] || []));
+      cursor = response.headers["x-next-cursor"];
+    } while (cursor);
+    return items;
+  };
 
-      const mySharesResponse = await api.get("beams/my-shares/", {
-        withCredentials: true,
-      });
-      setMyShares(mySharesResponse.data.my_shared_beams || []);
+  const fetchBeams = async () => {
+    setIsLoading(true);
+    try {
+      const [ownBeams, shared, myOwnShares] = await Promise.all([
+        fetchAllPages("beams/", "beams"),
+        fetchAllPages("beams/shared-with-me/", "shared_beams"),
+        fetchAllPages("beams/my-shares/", "my_shared_beams"),
+      ]);
+      setBeams(ownBeams);
+      setSharedBeams(shared);
+      setMyShares(myOwnShares);
     } catch (error) {
       toast.error("Failed to fetch beams");
       console.error("Error fetching beams:", error);
@@ -199,7 +218,7 @@ const BeamsPage = () => {
 
       <div className="flex items-center gap-3">
         <button
-          onClick={() => navigate(`/?beam_id=${beam.beam_id}`)}
+          onClick={() => navigate(beamUrl(beam.beam_id, beam.beam_token))}
           className="flex-1 bg-gradient-to-r from-purple-500 to-indigo-500 text-white py-2 px-4 rounded-xl font-medium transition-all duration-300 hover:shadow-lg hover:shadow-purple-500/25"
         >
           Open Beam
@@ -254,7 +273,7 @@ const BeamsPage = () => {
 
       <div className="flex items-center gap-3">
         <button
-          onClick={() => navigate(`/?beam_id=${share.beam.beam_id}`)}
+          onClick={() => navigate(beamUrl(share.beam.beam_id, share.beam.beam_token))}
           className="flex-1 bg-gradient-to-r from-purple-500 to-indigo-500 text-white py-2 px-4 rounded-xl font-medium transition-all duration-300 hover:shadow-lg hover:shadow-purple-500/25"
         >
           Open Beam
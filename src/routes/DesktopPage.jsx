@@ -11,6 +11,7 @@ import { motion, AnimatePresence } from "framer-motion";
 import { CloseButton } from "../components/closeBtn";
 import NoteForm from "../components/NoteForm";
 import { useAuth } from "../contexts/AuthContext";
+import { beamUrl } from "../utils";
 
 const KnowMoreButton = () => {
   const [isOpen, setIsOpen] = useState(false);
@@ -163,6 +164,7 @@ const DesktopPage = () => {
   const { isConnected, connectedDevices, lastJsonMessage, sharedClipboards, shareClipBoard, setShouldConnect, saveBeam } = useWebSocketContext();
   const queryParams = new URLSearchParams(window.location.search);
   const queryBeamId = queryParams.get('beam_id');
+  const queryBeamToken = queryParams.get('beam_token');
   const { user, isAuthenticated, logout, isLoading } = useAuth();
   
   const [isToolbarExpanded, setIsToolbarExpanded] = useState(false);
@@ -176,10 +178,11 @@ const DesktopPage = () => {
       console.log("Setting session from URL beam_id:", queryBeamId)
       setSession({
         beam_id: queryBeamId,
-        beam_key: null,
+        beam_token: queryBeamToken,
         beam_name: 'Untitled Beam'
       })
       const url = new URL(window.location.href)
+      url.searchParams.delete('beam_token')
       window.history.replaceState({}, '', url)
     }
   }, [queryBeamId, session?.beam_id])
@@ -246,7 +249,7 @@ const DesktopPage = () => {
         await navigator.share({
           title: "Moveit Beam",
           text: `Join my Beam on Moveit!`,
-          url: `${window.location.origin}?beam_id=${session.beam_id}`,
+          url: beamUrl(session.beam_id, session.beam_token),
         });
         console.log("Shared successfully");
       } catch (error) {
@@ -289,7 +292,7 @@ const DesktopPage = () => {
                 toast("Failed to copy beam ID!");
               });
             }}>
-              <QRCodeDisplay session={`${window.location.origin}?beam_id=${session.beam_id}`} size={100} className="group" />
+              <QRCodeDisplay session={beamUrl(session.beam_id, session.beam_token)} size={100} className="group" />
               <div className="absolute inset-0 bg-purple-400/70 z-[9999] rounded-md flex justify-center items-center transition-all duration-300 opacity-0 group-hover:opacity-100">
                 <span className="font-bold text-white pointer-events-none">Copy</span>
               </div>
@@ -298,7 +301,7 @@ const DesktopPage = () => {
         </div>
 
         {connectedDevices.length <= 1 && session && (
-          <QRCodeDisplay session={`${window.location.origin}?beam_id=${session.beam_id}`} size={300} className="mb-10 transition-all duration-300 hover:scale-125" />
+          <QRCodeDisplay session={beamUrl(session.beam_id, session.beam_token)} size={300} className="mb-10 transition-all duration-300 hover:scale-125" />
         )}
         {sharedClipboards.length == 0 && <h1 className="text-3xl">
           {connectedDevices.length > 1? "Start Sharing" : "Scan the QR Code with your mobile phone to start sharing."}
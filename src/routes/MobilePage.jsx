@@ -7,7 +7,7 @@ import Logo from "../components/Logo";
 import { FiClipboard, FiCopy, FiGrid, FiHome, FiUpload } from "react-icons/fi";
 import UploadButton from "../components/UploadBtn";
 import Footer from "../components/Footer";
-import { uploadToUguu } from "../utils";
+import { parseBeamUrl, uploadToUguu } from "../utils";
 
 
 const MobilePage = () => {
@@ -16,17 +16,19 @@ const MobilePage = () => {
   const { isConnected, lastJsonMessage, shareClipBoard, sharedClipboards, setShouldConnect } = useWebSocketContext();
   const queryParams = new URLSearchParams(window.location.search);
   const queryBeamId = queryParams.get('beam_id');
+  const queryBeamToken = queryParams.get('beam_token');
 
   useState(() => {
     if (queryBeamId != null) {
       setScanning(false)
       setSession({
         beam_id: queryBeamId,
-        beam_key: null
+        beam_token: queryBeamToken
       })
       setShouldConnect('auto')
       const url = new URL(window.location.href)
       url.searchParams.delete('beam_id')
+      url.searchParams.delete('beam_token')
       window.history.replaceState({}, '', url)
     }
   }, [queryBeamId])
@@ -68,10 +70,7 @@ const MobilePage = () => {
               <Scanner
                 onScan={(result) => {
                   setScanning(false)
-                  setSession({
-                    beam_id: result[0].rawValue.split('?beam_id=')[1],
-                  beam_key: null,
-                  })
+                  setSession(parseBeamUrl(result[0].rawValue))
                   setShouldConnect('auto')
                 }}
                 sound={false}
@@ -9,7 +9,7 @@ import Footer from "../components/Footer";
 import toast from "react-hot-toast";
 import { motion, AnimatePresence } from "framer-motion";
 import useDeviceType from "../hooks/deviceType"
-import { isValidUUIDv4 } from "../utils";
+import { beamUrl, isValidUUIDv4 } from "../utils";
 import StaticStickyNote from "../components/StaticStickyNote";
 import { Outlet, useNavigate } from "react-router-dom";
 import SpaceMenuPage from "./SpaceMenuPage";
@@ -40,7 +40,7 @@ const SpacePage = () => {
         await navigator.share({
           title: "Moveit Beam",
           text: `Join my Beam on Moveit!`,
-          url: `${window.location.origin}?beam_id=${session.beam_id}`,
+          url: beamUrl(session.beam_id, session.beam_token),
         });
         console.log("Shared successfully");
       } catch (error) {
@@ -78,12 +78,12 @@ const SpacePage = () => {
       >
         {/* <div className="fixed top-0 right-0 mt-8 mr-8 bg-white rounded-md">
           {connectedDevices.length > 1 && session && (
-            <QRCodeDisplay session={`${window.location.origin}?beam_id=${session.beam_id}`} size={100} />
+            <QRCodeDisplay session={beamUrl(session.beam_id, session.beam_token)} size={100} />
           )}
         </div> */}
 
         {connectedDevices.length <= 1 && session && (
-          <QRCodeDisplay session={`${window.location.origin}?beam_id=${session.beam_id}`} size={200} className="mb-10" />
+          <QRCodeDisplay session={beamUrl(session.beam_id, session.beam_token)} size={200} className="mb-10" />
         )}
 
         {['mobile', 'tablet'].includes(deviceType) && sharedClipboards.length == 0? <>
@@ -179,7 +179,7 @@ const SpacePage = () => {
                     if (isValidUUIDv4(value.target.value)) {
                         setSession({
                             beam_id: value.target.value,
-                            beam_key: null
+                            beam_token: null
                         })
                         setShouldConnect('auto')
                         setIsSetJoinBeamOpen(false)
@@ -5,6 +5,25 @@ export const isValidUUIDv4 = (uuid) => {
   return uuidV4Regex.test(uuid);
 }
 
+// Link (and QR code) that joins a beam; the signed token is what lets
+// devices that aren't signed in connect.
+export const beamUrl = (beamId, beamToken) => {
+  const url = new URL(window.location.origin)
+  url.searchParams.set('beam_id', beamId)
+  if (beamToken) {
+    url.searchParams.set('beam_token', beamToken)
+  }
+  return url.toString()
+}
+
+export const parseBeamUrl = (value) => {
+  try {
+    const params = new URL(value).searchParams
+    return { beam_id: params.get('beam_id'), beam_token: params.get('beam_token') }
+  } catch {
+    return { beam_id: null, beam_token: null }
+  }
+}
 
 export const uploadToUguu = async (file) => {
   const formData = new FormData();